@@ -0,0 +1,133 @@
+"""
+Benchmark: in-process app server vs. the usual app.run() deployment.
+
+The same small WSGI app (a bit of CPU work plus a short blocking wait,
+like a database call) is served four ways, each in its own process:
+
+- dev:            ``app.run()`` (Flask's threaded development server if
+                  Flask is installed, otherwise a threaded wsgiref server)
+- dev+proxy:      ``app.run()`` behind hostify's local proxy, i.e. what
+                  ``Host(port=...)`` with a proxy stage looks like
+- hostify:        ``AppServer(app, threads=T)``, as used by ``Host(app=...)``
+- hostify-workers ``AppServer(app, workers=N, threads=T)``
+
+Worker processes only pay off with more than one CPU core.
+
+Usage:
+    python benchmarks/bench_appserver.py [--duration 3] [--concurrency 32] [--workers 4] [--threads 8]
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from common import free_port, run_load, stop_processes, wait_for_port  # noqa: E402
+
+
+def make_app(wait: float):
+    def app(environ, start_response):
+        payload = json.dumps({"path": environ["PATH_INFO"], "items": list(range(200))}).encode()
+        time.sleep(wait)
+        start_response("200 OK", [("Content-Type", "application/json"), ("Content-Length", str(len(payload)))])
+        return [payload]
+    return app
+
+
+def serve(mode: str, port: int, wait: float, workers: int, threads: int) -> None:
+    app = make_app(wait)
+
+    if mode == "dev":
+        try:
+            from flask import Flask
+        except ImportError:
+            from socketserver import ThreadingMixIn
+            from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+            class Quiet(WSGIRequestHandler):
+                def log_message(self, *args):
+                    pass
+
+            class Threaded(ThreadingMixIn, WSGIServer):
+                daemon_threads = True
+                request_queue_size = 128  # same backlog as Flask's server
+
+            make_server("127.0.0.1", port, app, Threaded, Quiet).serve_forever()
+        else:
+            flask_app = Flask(__name__)
+            flask_app.wsgi_app = app
+            flask_app.run("127.0.0.1", port)
+        return
+
+    from hostify.appserver import AppServer
+    server = AppServer(app, workers=workers if mode == "hostify-workers" else 1, threads=threads, port=port)
+    server.start()
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    try:
+        while True:
+            time.sleep(1)
+            server.ensure_workers()
+    finally:
+        server.stop()
+
+
+def serve_proxy(port: int, origin: int) -> None:
+    from hostify.balancer import Backend
+    from hostify.proxy import ReverseProxy
+
+    ReverseProxy(Backend(origin), port=port).start()
+    while True:
+        time.sleep(1)
+
+
+def spawn(*args) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, __file__, *map(str, args)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8, help="Threads per hostify worker")
+    parser.add_argument("--wait", type=float, default=0.002, help="Blocking wait per request (s)")
+    parser.add_argument("--serve", nargs=2, metavar=("MODE", "PORT"), help=argparse.SUPPRESS)
+    parser.add_argument("--proxy", nargs=2, type=int, metavar=("PORT", "ORIGIN"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve[0], int(args.serve[1]), args.wait, args.workers, args.threads)
+        return
+    if args.proxy:
+        serve_proxy(*args.proxy)
+        return
+
+    print(f"{'server':<18}{'rps':>8}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for mode in ("dev", "dev+proxy", "hostify", "hostify-workers"):
+        port = free_port()
+        extra = ["--wait", args.wait, "--workers", args.workers, "--threads", args.threads]
+        processes = [spawn("--serve", mode.split("+")[0], port, *extra)]
+        try:
+            wait_for_port(port)
+            if mode == "dev+proxy":
+                origin, port = port, free_port()
+                processes.append(spawn("--proxy", port, origin))
+                wait_for_port(port)
+            run_load(port, args.concurrency, 0.5)  # warm up
+            result = run_load(port, args.concurrency, args.duration)
+        finally:
+            stop_processes(processes)
+
+        print(
+            f"{mode:<18}{result['rps']:>8.0f}{result['p50_ms']:>10.1f}"
+            f"{result['p99_ms']:>10.1f}{result['errors']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
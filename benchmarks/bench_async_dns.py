@@ -0,0 +1,108 @@
+"""
+Benchmark: creating many DNS records one by one, concurrently and in batches.
+
+Creates ``--records`` CNAME records (and deletes them again) against
+:class:`hostify.mock_api.MockCloudflareAPI` taking ``--latency-ms`` per
+call, one at a time with :class:`Cloudflare`, concurrently with
+:class:`AsyncCloudflare` at each ``--concurrency`` level, and through the
+batch DNS endpoint. Reports wall time, API calls and connections opened.
+
+Usage:
+    python benchmarks/bench_async_dns.py [--records 100] [--latency-ms 50] [--concurrency 8 32]
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from common import free_port, stop_processes, wait_for_port  # noqa: E402
+from hostify.async_cloudflare import AsyncCloudflare  # noqa: E402
+from hostify.cloudflare import Cloudflare  # noqa: E402
+from hostify.mock_api import API_PREFIX, MockCloudflareAPI  # noqa: E402
+
+
+OPTIONS = dict(id_cache=False, rate_limit=None)
+
+
+def serve_api(port: int, latency: float) -> None:
+    MockCloudflareAPI(latency=latency, port=port).serve_forever()
+
+
+def sync_run(base_url: str, zone_id: str, names) -> None:
+    with Cloudflare("bench-token", base_url=base_url, **OPTIONS) as cf:
+        ids = [cf.create_dns_record(zone_id, name, "tunnel") for name in names]
+        for record_id in ids:
+            cf.delete_dns_record(zone_id, record_id)
+
+
+def batch_run(base_url: str, zone_id: str, names) -> None:
+    records = [{"type": "CNAME", "name": name, "content": "tunnel.cfargotunnel.com", "proxied": True} for name in names]
+    with Cloudflare("bench-token", base_url=base_url, **OPTIONS) as cf:
+        created = cf.apply_dns_batch(zone_id, creates=records)["created"]
+        cf.apply_dns_batch(zone_id, deletes=[record["id"] for record in created])
+
+
+async def async_run(base_url: str, zone_id: str, names, concurrency: int) -> None:
+    async with AsyncCloudflare("bench-token", concurrency=concurrency, base_url=base_url, **OPTIONS) as cf:
+        ids = await asyncio.gather(*[cf.create_dns_record(zone_id, name, "tunnel") for name in names])
+        await asyncio.gather(*[cf.delete_dns_record(zone_id, record_id) for record_id in ids])
+
+
+def server_stats(base_url: str) -> dict:
+    with Cloudflare("bench-token", base_url=base_url, **OPTIONS) as cf:
+        return cf.session.get(base_url[:-len(API_PREFIX)] + "/__mock/stats").json()
+
+
+def measure(base_url: str, run) -> tuple:
+    before = server_stats(base_url)
+    started = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - started
+    after = server_stats(base_url)
+    # Less the connection of the stats request itself
+    return elapsed, after["calls"] - before["calls"], after["connections"] - before["connections"] - 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--records", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--api", nargs=2, type=float, metavar=("PORT", "LATENCY"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.api:
+        serve_api(int(args.api[0]), args.api[1])
+        return
+
+    names = [f"host-{i}.example.com" for i in range(args.records)]
+    port = free_port()
+    process = subprocess.Popen([sys.executable, __file__, "--api", str(port), str(args.latency_ms / 1000)])
+    try:
+        wait_for_port(port)
+        base_url = f"http://127.0.0.1:{port}{API_PREFIX}"
+        with Cloudflare("bench-token", base_url=base_url, **OPTIONS) as cf:
+            zone_id = cf.get_zone_id("example.com")
+        results = [("sync", measure(base_url, lambda: sync_run(base_url, zone_id, names)))]
+        for concurrency in args.concurrency:
+            results.append((
+                f"async x{concurrency}",
+                measure(base_url, lambda: asyncio.run(async_run(base_url, zone_id, names, concurrency)))
+            ))
+        results.append(("batch", measure(base_url, lambda: batch_run(base_url, zone_id, names))))
+    finally:
+        stop_processes([process])
+
+    print(f"records={args.records} latency={args.latency_ms:g}ms (create + delete)")
+    print(f"{'':<12}{'wall time':>12}{'API calls':>11}{'connections':>13}")
+    for label, (elapsed, calls, opened) in results:
+        print(f"{label:<12}{elapsed * 1000:>10.0f}ms{calls:>11}{opened:>13}")
+
+
+if __name__ == "__main__":
+    main()
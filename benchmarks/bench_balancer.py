@@ -0,0 +1,58 @@
+"""
+Benchmark: throughput of the local load balancer as backends are added.
+
+Each backend is a single-threaded server that spends a fixed time per
+request, like a sync app with one worker. Throughput through the proxy
+should grow roughly linearly with the number of backends until the proxy
+itself becomes the bottleneck.
+
+Usage:
+    python benchmarks/bench_balancer.py [--duration 3] [--concurrency 32]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from common import free_port, run_load, start_backend, stop_processes  # noqa: E402
+
+from hostify.balancer import BackendPool  # noqa: E402
+from hostify.proxy import ReverseProxy  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--delay", type=float, default=0.01, help="Backend service time (s)")
+    parser.add_argument("--backends", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument(
+        "--strategies",
+        nargs="+",
+        default=["round_robin", "least_connections", "power_of_two"]
+    )
+    args = parser.parse_args()
+
+    print(f"{'strategy':<18} {'backends':>8} {'rps':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for strategy in args.strategies:
+        for count in args.backends:
+            ports = [free_port() for _ in range(count)]
+            processes = [start_backend(port, args.delay) for port in ports]
+            proxy = ReverseProxy(BackendPool.from_ports(ports, strategy))
+            try:
+                proxy_port = proxy.start()
+                result = run_load(proxy_port, args.concurrency, args.duration)
+            finally:
+                proxy.stop()
+                stop_processes(processes)
+
+            print(
+                f"{strategy:<18} {count:>8} {result['rps']:>9.0f} "
+                f"{result['p50_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['errors']:>6}"
+            )
+
+
+if __name__ == "__main__":
+    main()
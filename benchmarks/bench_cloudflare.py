@@ -0,0 +1,206 @@
+"""
+Benchmark: Cloudflare API calls with and without a pooled session.
+
+Runs the calls ``Host.serve()`` and ``Host.cleanup()`` make (create tunnel,
+route it, look up the zone and record, create the record, then delete
+both) against a local HTTPS stand-in for the API, once with a request per
+connection as ``requests.request`` does and once through the client's
+keep-alive session, then with account and zone IDs already in the
+on-disk cache. Reports the TLS handshakes the stand-in served and
+the wall time of one provision/cleanup cycle. The stand-in adds
+``--rtt-ms`` per round trip (two for a new connection, one per request)
+to approximate the distance to the real API.
+
+Needs the ``openssl`` command to create a throwaway certificate.
+
+Usage:
+    python benchmarks/bench_cloudflare.py [--runs 5] [--rtt-ms 20]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from common import free_port, stop_processes, wait_for_port  # noqa: E402
+from hostify.cloudflare import Cloudflare  # noqa: E402
+
+
+def make_certificate(directory: str) -> str:
+    path = os.path.join(directory, "localhost.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost",
+         "-keyout", path, "-out", path],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    return path
+
+
+def serve_api(port: int, certificate: str, rtt: float) -> None:
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certificate)
+    counts = {"handshakes": 0, "requests": 0}
+    lock = threading.Lock()
+
+    def result(method: str, path: str):
+        if path == "/accounts":
+            return [{"id": "account"}]
+        if path == "/zones":
+            return [{"id": "zone", "name": "example.com"}]
+        if path.endswith("/dns_records") and method == "GET":
+            return []
+        if method == "POST":
+            return {"id": path.rsplit("/", 1)[-1] + "-1"}
+        return {}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            # TCP and TLS 1.3 handshakes: one round trip each
+            time.sleep(2 * rtt)
+            self.request.do_handshake()
+            with lock:
+                counts["handshakes"] += 1
+            super().setup()
+
+        def respond(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            self.rfile.read(length)
+            path = self.path.split("?", 1)[0].replace("/client/v4", "", 1)
+            if path == "/__stats":
+                payload = dict(counts)
+            else:
+                time.sleep(rtt)
+                with lock:
+                    counts["requests"] += 1
+                payload = {"success": True, "errors": [], "result": result(self.command, path)}
+            body = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = do_POST = do_PUT = do_DELETE = respond
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+
+        def get_request(self):
+            sock, address = self.socket.accept()
+            return context.wrap_socket(sock, server_side=True, do_handshake_on_connect=False), address
+
+        def handle_error(self, request, client_address):
+            # wait_for_port() connects without TLS
+            pass
+
+    Server(("127.0.0.1", port), Handler).serve_forever()
+
+
+class OneShot:
+    """Session replacement that opens a connection per call, like ``requests.request``."""
+
+    def __init__(self, client: Cloudflare, certificate: str):
+        self.headers = client.get_headers()
+        self.certificate = certificate
+
+    def request(self, method, url, **kwargs):
+        with requests.Session() as session:
+            session.trust_env = False
+            return session.request(method, url, headers=self.headers, verify=self.certificate, **kwargs)
+
+    def close(self):
+        pass
+
+
+def provision_cycle(client: Cloudflare) -> None:
+    tunnel_id, _ = client.create_tunnel("bench")
+    client.configure_tunnel_route(tunnel_id, "app.example.com", "http://localhost:8000")
+    zone_id = client.get_zone_id("app.example.com")
+    client.find_existing_record(zone_id, "app.example.com")
+    record_id = client.create_dns_record(zone_id, "app.example.com", tunnel_id)
+    client.delete_dns_record(zone_id, record_id)
+    client.delete_tunnel(tunnel_id, force=True)
+
+
+def measure(base_url: str, certificate: str, pooled: bool, runs: int, id_cache_path: str = ""):
+    stats_url = f"{base_url}/__stats"
+    options = dict(base_url=base_url, id_cache=bool(id_cache_path), rate_limit=None)
+    if id_cache_path:
+        options["id_cache_path"] = id_cache_path
+    before = OneShot(Cloudflare("bench-token", id_cache=False, rate_limit=None), certificate).request("GET", stats_url).json()
+    started = time.perf_counter()
+    for _ in range(runs):
+        with Cloudflare("bench-token", **options) as client:
+            if pooled:
+                # REQUESTS_CA_BUNDLE would otherwise override verify
+                client.session.trust_env = False
+                client.session.verify = certificate
+            else:
+                client.session = OneShot(client, certificate)
+            provision_cycle(client)
+    elapsed = (time.perf_counter() - started) / runs
+    after = OneShot(Cloudflare("bench-token", id_cache=False, rate_limit=None), certificate).request("GET", stats_url).json()
+    # Less the stats request's own handshake
+    handshakes = (after["handshakes"] - before["handshakes"] - 1) / runs
+    calls = (after["requests"] - before["requests"]) / runs
+    return calls, handshakes, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--rtt-ms", type=float, default=20.0)
+    parser.add_argument("--api", nargs=3, metavar=("PORT", "CERT", "RTT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.api:
+        serve_api(int(args.api[0]), args.api[1], float(args.api[2]))
+        return
+
+    directory = tempfile.mkdtemp()
+    port = free_port()
+    try:
+        certificate = make_certificate(directory)
+        process = subprocess.Popen([sys.executable, __file__, "--api", str(port), certificate, str(args.rtt_ms / 1000)])
+        try:
+            wait_for_port(port)
+            base_url = f"https://localhost:{port}/client/v4"
+            id_cache_path = os.path.join(directory, "ids.json")
+            results = [
+                ("per call", measure(base_url, certificate, False, args.runs)),
+                ("pooled", measure(base_url, certificate, True, args.runs)),
+            ]
+            # The first run fills the ID cache, as a first hostify run would
+            measure(base_url, certificate, True, 1, id_cache_path)
+            results.append(("id cache", measure(base_url, certificate, True, args.runs, id_cache_path)))
+        finally:
+            stop_processes([process])
+    finally:
+        shutil.rmtree(directory)
+
+    print(f"runs={args.runs} rtt={args.rtt_ms:g}ms")
+    print(f"{'':<10}{'API calls':>10}{'handshakes':>12}{'wall time':>12}")
+    for name, (calls, handshakes, elapsed) in results:
+        print(f"{name:<10}{calls:>10.0f}{handshakes:>12.0f}{elapsed * 1000:>10.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark: finding one DNS record in a large zone.
+
+Serves :class:`hostify.mock_api.MockCloudflareAPI` with a zone of
+``--records`` records and looks up the last one three ways: the old
+``find_existing_record`` (scan the first page of an unfiltered listing),
+a scan of every page, and the new name-filtered lookup. Reports requests,
+bytes received, wall time and whether the record was found. The stand-in
+adds ``--rtt-ms`` to every request.
+
+Usage:
+    python benchmarks/bench_dns_lookup.py [--records 50000] [--rtt-ms 20]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from common import free_port, stop_processes, wait_for_port  # noqa: E402
+from hostify.cloudflare import Cloudflare  # noqa: E402
+from hostify.mock_api import API_PREFIX, MockCloudflareAPI  # noqa: E402
+
+
+def serve_api(port: int, count: int, rtt: float) -> None:
+    api = MockCloudflareAPI(latency=rtt, port=port)
+    zone_id = next(iter(api.zones))
+    for i in range(count):
+        api.add_dns_record(zone_id, f"host-{i}.example.com", f"{i:036x}.cfargotunnel.com")
+    api.serve_forever()
+
+
+def first_page_scan(cf: Cloudflare, zone_id: str, name: str):
+    """``find_existing_record`` as it was: one unfiltered page, scanned locally."""
+    for record in cf._make_request("GET", f"/zones/{zone_id}/dns_records"):
+        if record["name"] == name:
+            return record
+    return None
+
+
+def full_scan(cf: Cloudflare, zone_id: str, name: str):
+    for record in cf.iter_dns_records(zone_id):
+        if record["name"] == name:
+            return record
+    return None
+
+
+def measure(cf: Cloudflare, lookup, zone_id: str, name: str):
+    stats_url = cf.base_url[:-len(API_PREFIX)] + "/__mock/stats"
+    before = cf.session.get(stats_url).json()
+    started = time.perf_counter()
+    found = lookup(cf, zone_id, name) is not None
+    elapsed = time.perf_counter() - started
+    after = cf.session.get(stats_url).json()
+    return after["calls"] - before["calls"], after["bytes"] - before["bytes"], elapsed, found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--rtt-ms", type=float, default=20.0)
+    parser.add_argument("--api", nargs=3, type=float, metavar=("PORT", "RECORDS", "RTT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.api:
+        serve_api(int(args.api[0]), int(args.api[1]), args.api[2])
+        return
+
+    port = free_port()
+    process = subprocess.Popen([sys.executable, __file__, "--api", str(port), str(args.records), str(args.rtt_ms / 1000)])
+    try:
+        wait_for_port(port, timeout=60.0)
+        name = f"host-{args.records - 1}.example.com"
+        base_url = f"http://127.0.0.1:{port}{API_PREFIX}"
+        with Cloudflare("bench-token", base_url=base_url, id_cache=False, rate_limit=None) as cf:
+            zone_id = cf.get_zone_id(name)
+            results = [
+                ("first page", measure(cf, first_page_scan, zone_id, name)),
+                ("all pages", measure(cf, full_scan, zone_id, name)),
+                ("filtered", measure(cf, Cloudflare.find_existing_record, zone_id, name)),
+            ]
+    finally:
+        stop_processes([process])
+
+    print(f"records={args.records} rtt={args.rtt_ms:g}ms")
+    print(f"{'':<12}{'requests':>10}{'received':>12}{'wall time':>12}{'found':>8}")
+    for label, (requests, received, elapsed, found) in results:
+        print(f"{label:<12}{requests:>10}{received / 1024:>10.1f}KiB{elapsed * 1000:>10.0f}ms{'yes' if found else 'no':>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark: cost of active health checks on one event loop.
+
+Checks many backends (spread over a few origin processes) with one
+HealthChecker and reports probes per second and the CPU time the checker
+used, along with how late the event loop ran while checks were going on.
+
+Usage:
+    python benchmarks/bench_health.py [--backends 500] [--interval 1] [--duration 5]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from common import free_port, start_backend, stop_processes  # noqa: E402
+
+from hostify.balancer import Backend, BackendPool  # noqa: E402
+from hostify.health import HealthChecker  # noqa: E402
+
+
+async def measure(ports, backends: int, interval: float, duration: float) -> dict:
+    pool = BackendPool([Backend(ports[i % len(ports)]) for i in range(backends)])
+    checker = HealthChecker(interval=interval, pool=pool)
+
+    lag = []
+
+    async def ticker():
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lag.append(time.perf_counter() - start - 0.01)
+
+    tick = asyncio.ensure_future(ticker())
+    cpu = time.process_time()
+    await checker.start()
+    await asyncio.sleep(duration)
+    await checker.close()
+    cpu = time.process_time() - cpu
+    tick.cancel()
+    await pool.close()
+
+    lag.sort()
+    return {
+        "probes": checker.probes,
+        "failed": checker.failed_probes,
+        "cpu": cpu,
+        "lag_p99_ms": lag[int(len(lag) * 0.99)] * 1000 if lag else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--backends", type=int, default=500)
+    parser.add_argument("--origins", type=int, default=4)
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    ports = [free_port() for _ in range(args.origins)]
+    processes = [start_backend(port, delay=0.0) for port in ports]
+    try:
+        result = asyncio.run(measure(ports, args.backends, args.interval, args.duration))
+    finally:
+        stop_processes(processes)
+
+    print(f"backends={args.backends} interval={args.interval:g}s duration={args.duration:g}s")
+    print(
+        f"probes={result['probes']} ({result['probes'] / args.duration:.0f}/s) "
+        f"failed={result['failed']} "
+        f"checker cpu={result['cpu']:.2f}s ({result['cpu'] / args.duration:.0%} of one core) "
+        f"loop lag p99={result['lag_p99_ms']:.1f}ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
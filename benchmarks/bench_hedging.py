@@ -0,0 +1,72 @@
+"""
+Benchmark: hedged requests against jittery backends.
+
+Each backend is a single-worker server that usually answers in ``--delay``
+seconds but stalls for ``--stall`` seconds on a ``--jitter`` share of
+requests, like a replica pausing for garbage collection. Requests queued
+behind a stall wait too. Hedging sends a copy of a slow request to another
+replica and should cut p99 sharply at a small cost in extra requests.
+
+Results are noisy on machines with few cores, where the load generator,
+proxy and backends compete for CPU.
+
+Usage:
+    python benchmarks/bench_hedging.py [--duration 5] [--backends 3] [--jitter 0.01] [--strategy round_robin]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from common import free_port, run_load, start_backend, stop_processes  # noqa: E402
+
+from hostify.balancer import BackendPool  # noqa: E402
+from hostify.hedge import Hedger  # noqa: E402
+from hostify.proxy import ReverseProxy  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--backends", type=int, default=3)
+    parser.add_argument("--delay", type=float, default=0.003, help="Usual service time (s)")
+    parser.add_argument("--jitter", type=float, default=0.01, help="Share of requests that stall")
+    parser.add_argument("--stall", type=float, default=0.1, help="Stall duration (s)")
+    parser.add_argument("--strategy", default="round_robin")
+    args = parser.parse_args()
+
+    configs = [
+        ("none", None),
+        ("adaptive p95", lambda: Hedger()),
+        ("fixed 20ms", lambda: Hedger(delay=0.02)),
+    ]
+
+    print(f"{'hedging':<14} {'rps':>7} {'p50 ms':>8} {'p99 ms':>8} {'hedged':>8} {'won':>6}")
+    for name, factory in configs:
+        ports = [free_port() for _ in range(args.backends)]
+        processes = [start_backend(port, args.delay, args.jitter, args.stall) for port in ports]
+        hedger = factory() if factory else None
+        proxy = ReverseProxy(
+            BackendPool.from_ports(ports, args.strategy),
+            middleware=[hedger] if hedger else []
+        )
+        try:
+            proxy_port = proxy.start()
+            result = run_load(proxy_port, args.concurrency, args.duration)
+        finally:
+            proxy.stop()
+            stop_processes(processes)
+
+        hedged = f"{hedger.hedged / max(1, hedger.requests):.1%}" if hedger else "-"
+        won = hedger.hedge_wins if hedger else "-"
+        print(
+            f"{name:<14} {result['rps']:>7.0f} {result['p50_ms']:>8.1f} "
+            f"{result['p99_ms']:>8.1f} {hedged:>8} {won:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
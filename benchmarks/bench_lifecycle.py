@@ -0,0 +1,116 @@
+"""
+Benchmark: provisioning and teardown latency and API calls end to end.
+
+Runs ``Host`` against ``python -m hostify.mock_api`` under a few API
+conditions (added latency, injected 502s, a tight rate limit), starting a
+fresh stand-in for each. Every scenario provisions and tears down twice
+from the same home directory: the cold run downloads cloudflared and
+looks up the account and zone IDs, the warm run reuses both. For each
+run it reports how long provisioning and teardown took, the API calls
+each made as counted by the stand-in, and the retries and 429s the
+client saw.
+
+Usage:
+    python benchmarks/bench_lifecycle.py [--download-ms 1000] [--connect-ms 500]
+"""
+
+import argparse
+import atexit
+import contextlib
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from common import free_port, stop_processes, wait_for_port  # noqa: E402
+from hostify.host import Host  # noqa: E402
+from hostify.mock_api import API_PREFIX  # noqa: E402
+
+SCENARIOS = (
+    ("baseline", ["--latency-ms", "100"]),
+    ("slow api", ["--latency-ms", "300", "--jitter-ms", "100"]),
+    ("10% errors", ["--latency-ms", "100", "--error-rate", "0.1", "--seed", "1"]),
+    ("throttled", ["--latency-ms", "20", "--rate-limit", "5", "1"]),
+)
+
+
+def mock_calls(host: Host, url: str) -> int:
+    return host.cf.session.get(f"{url}/__mock/stats").json()["calls"]
+
+
+def run_once(url: str, site: str) -> tuple:
+    host = Host(domain="app.example.com", path=site, api_token="bench-token")
+    host.cloudflared.DOWNLOAD_URLS = {platform.system().lower(): f"{url}/__mock/cloudflared"}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        try:
+            before = mock_calls(host, url)
+            started = time.perf_counter()
+            host._provision()
+            provisioned = time.perf_counter()
+            provision_calls = mock_calls(host, url) - before
+        finally:
+            cleanup_started = time.perf_counter()
+            host.cleanup()
+            atexit.unregister(host.cleanup)
+        cleaned_up = time.perf_counter()
+        teardown_calls = mock_calls(host, url) - before - provision_calls
+    return (
+        provisioned - started, cleaned_up - cleanup_started,
+        provision_calls, teardown_calls, host.cf.retries, host.cf.rate_limited
+    )
+
+
+def run_scenario(options: list, site: str, download_ms: float, connect_ms: float) -> list:
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "hostify.mock_api", "--port", str(port),
+         "--download-ms", str(download_ms), "--connect-ms", str(connect_ms), *options],
+        cwd=ROOT, stdout=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{port}"
+    os.environ["CLOUDFLARE_API_BASE_URL"] = url + API_PREFIX
+    try:
+        wait_for_port(port)
+        with tempfile.TemporaryDirectory() as home:
+            os.environ["HOME"] = home
+            return [(run, run_once(url, site)) for run in ("cold", "warm")]
+    finally:
+        stop_processes([process])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--download-ms", type=float, default=1000.0)
+    parser.add_argument("--connect-ms", type=float, default=500.0)
+    args = parser.parse_args()
+
+    home = os.environ.get("HOME")
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as site:
+            with open(os.path.join(site, "index.html"), "w") as f:
+                f.write("<h1>hello</h1>")
+            for label, options in SCENARIOS:
+                for run, result in run_scenario(options, site, args.download_ms, args.connect_ms):
+                    results.append((label, run, result))
+    finally:
+        os.environ.pop("CLOUDFLARE_API_BASE_URL", None)
+        if home is not None:
+            os.environ["HOME"] = home
+
+    print(f"\ndownload={args.download_ms:g}ms connect={args.connect_ms:g}ms")
+    print(f"{'':<12}{'run':<6}{'provision':>11}{'calls':>7}{'teardown':>10}{'calls':>7}{'retries':>9}{'429s':>6}")
+    for label, run, (provision, teardown, provision_calls, teardown_calls, retries, throttled) in results:
+        print(
+            f"{label:<12}{run:<6}{provision * 1000:>9.0f}ms{provision_calls:>7}"
+            f"{teardown * 1000:>8.0f}ms{teardown_calls:>7}{retries:>9}{throttled:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark: overhead and memory of the Metrics stage.
+
+Runs requests through Metrics with an origin that answers instantly, so
+the time measured is the stage's own bookkeeping, and reports the cost of
+a snapshot and the memory held with ``max_routes`` routes in use.
+
+Usage:
+    python benchmarks/bench_metrics.py [--requests 200000] [--routes 100]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from hostify.metrics import Metrics  # noqa: E402
+from hostify.proxy import Body, Headers, Request, Response  # noqa: E402
+
+
+async def origin(request: Request) -> Response:
+    return Response(200, Headers(), Body.from_bytes(b"ok"))
+
+
+async def passthrough(request: Request, call_next) -> Response:
+    return await call_next(request)
+
+
+async def replay(handle, targets) -> float:
+    started = time.perf_counter()
+    for target in targets:
+        response = await handle(Request("GET", target), origin)
+        await response.body.read()
+    return time.perf_counter() - started
+
+
+async def measure(requests: int, routes: int) -> None:
+    targets = [f"/section{i % routes}/{i}" for i in range(requests)]
+
+    base = await replay(passthrough, targets)
+    metrics = Metrics(max_routes=routes)
+    timed = await replay(metrics.handle, targets)
+
+    started = time.perf_counter()
+    metrics.snapshot()
+    snapshot_ms = (time.perf_counter() - started) * 1000
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    fresh = Metrics(max_routes=routes)
+    await replay(fresh.handle, targets[:routes * 10])
+    memory = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    print(f"requests={requests} routes={routes}")
+    print(f"stage overhead: {(timed - base) / requests * 1e6:.2f}us per request")
+    print(f"snapshot: {snapshot_ms:.1f}ms, memory: {memory / 1024:.0f} KiB ({memory / routes / 1024:.1f} KiB per route)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--routes", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(measure(args.requests, args.routes))
+
+
+if __name__ == "__main__":
+    main()
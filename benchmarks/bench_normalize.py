@@ -0,0 +1,93 @@
+"""
+Benchmark: edge cacheability with and without cache-key normalization.
+
+Replays synthetic traffic against CacheKeyNormalizer: a site whose pages
+and static assets are reached through links carrying tracking parameters,
+served by a framework that attaches a session cookie (and ``Vary: Cookie``)
+to every response. Reports how many distinct URLs reach the origin and
+what share of responses Cloudflare's default rules would cache, before and
+after normalization, plus the stage's cost per request. (The edge keys on
+the URL the visitor asked for, so it only sees the smaller set of URLs with
+``redirect=True``.)
+
+Usage:
+    python benchmarks/bench_normalize.py [--requests 100000] [--tagged 0.3]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from hostify.normalize import CacheKeyNormalizer  # noqa: E402
+from hostify.proxy import Headers, Request, Response  # noqa: E402
+
+
+ASSETS = [f"/static/{name}.{ext}" for name in range(100) for ext in ("js", "css", "png", "woff2")]
+PAGES = [f"/blog/post-{n}" for n in range(100)]
+TRACKING = ["utm_source=newsletter", "utm_medium=email", "utm_campaign=launch", "fbclid=IwAR{}", "gclid=Cj0K{}"]
+
+
+def make_traffic(count: int, tagged: float, seed: int = 1):
+    rng = random.Random(seed)
+    targets = []
+    for _ in range(count):
+        path = rng.choice(ASSETS) if rng.random() < 0.7 else rng.choice(PAGES)
+        params = []
+        if path.startswith("/static/"):
+            params.append(f"v={rng.randint(1, 2)}")
+        if rng.random() < tagged:
+            params += [p.format(rng.randint(0, 10 ** 6)) for p in rng.sample(TRACKING, rng.randint(1, 3))]
+        rng.shuffle(params)
+        targets.append(f"{path}?{'&'.join(params)}" if params else path)
+    return targets
+
+
+async def origin(request: Request) -> Response:
+    headers = Headers([
+        ("Set-Cookie", "session=3f2a; Path=/; HttpOnly"),
+        ("Vary", "Cookie, Accept-Encoding"),
+        ("Cache-Control", "public, max-age=3600"),
+    ])
+    return Response(200, headers)
+
+
+async def replay(targets, stage: CacheKeyNormalizer):
+    keys = set()
+    started = time.perf_counter()
+    for target in targets:
+        request = Request("GET", target, Headers([("Host", "example.com")]))
+        await stage.handle(request, origin)
+        keys.add(request.target)
+    return keys, time.perf_counter() - started
+
+
+async def measure(count: int, tagged: float) -> None:
+    targets = make_traffic(count, tagged)
+
+    passthrough = CacheKeyNormalizer(strip_params=(), sort_query=False, asset_extensions=(), vary_ignore=())
+    keys_before, base_time = await replay(targets, passthrough)
+    normalizer = CacheKeyNormalizer()
+    keys_after, time_after = await replay(targets, normalizer)
+
+    print(f"requests={count} tagged={tagged:.0%}")
+    print(f"{'':<10}{'URLs':>12}{'edge-cacheable':>16}")
+    print(f"{'before':<10}{len(keys_before):>12}{passthrough.stats()['cacheable_ratio_after']:>16.1%}")
+    print(f"{'after':<10}{len(keys_after):>12}{normalizer.stats()['cacheable_ratio_after']:>16.1%}")
+    print(f"normalization cost: {(time_after - base_time) / count * 1e6:.1f}us per request")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--tagged", type=float, default=0.3, help="Share of requests carrying tracking parameters")
+    args = parser.parse_args()
+    asyncio.run(measure(args.requests, args.tagged))
+
+
+if __name__ == "__main__":
+    main()
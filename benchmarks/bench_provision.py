@@ -0,0 +1,111 @@
+"""
+Benchmark: time from ``serve()`` to a live site.
+
+Provisions a static site against :class:`hostify.mock_api.MockCloudflareAPI`
+taking ``--latency-ms`` per call, with the fake cloudflared that the
+stand-in serves as the binary download (taking ``--download-ms``) and
+that reports ready ``--connect-ms`` after it starts. Every run starts
+from an empty home directory, so the binary is downloaded each time, as
+on a first run. Compares the steps run one after another followed by a
+fixed five second wait, as ``serve()`` used to, with the step graph run
+one step at a time and concurrently.
+
+Usage:
+    python benchmarks/bench_provision.py [--latency-ms 150] [--download-ms 2000] [--connect-ms 1500]
+"""
+
+import argparse
+import atexit
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from common import free_port, stop_processes, wait_for_port  # noqa: E402
+from hostify.host import Host  # noqa: E402
+from hostify.mock_api import API_PREFIX, MockCloudflareAPI  # noqa: E402
+
+
+def serve_api(port: int, latency: float, download: float, connect: float) -> None:
+    MockCloudflareAPI(latency=latency, download_delay=download, connect_delay=connect, port=port).serve_forever()
+
+
+def provision_before(host: Host) -> None:
+    """The steps one after another, then a fixed wait, as ``serve()`` used to."""
+    host._setup_local_server()
+    host._create_tunnel()
+    host._configure_route()
+    host._find_dns()
+    host._create_dns()
+    host._fetch_cloudflared()
+    host._start_tunnel()
+    time.sleep(5)
+
+
+def measure(url: str, site: str, provision) -> tuple:
+    with tempfile.TemporaryDirectory() as home:
+        # Nothing cached: the binary is downloaded and the IDs looked up
+        os.environ["HOME"] = home
+        host = Host(domain="app.example.com", path=site, api_token="bench-token")
+        host.cloudflared.DOWNLOAD_URLS = {platform.system().lower(): f"{url}/__mock/cloudflared"}
+        before = host.cf.session.get(f"{url}/__mock/stats").json()["calls"]
+        try:
+            started = time.perf_counter()
+            provision(host)
+            elapsed = time.perf_counter() - started
+            calls = host.cf.session.get(f"{url}/__mock/stats").json()["calls"] - before
+        finally:
+            host.cleanup()
+            atexit.unregister(host.cleanup)
+    return elapsed, calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    parser.add_argument("--download-ms", type=float, default=2000.0)
+    parser.add_argument("--connect-ms", type=float, default=1500.0)
+    parser.add_argument("--api", nargs=4, type=float, metavar=("PORT", "LATENCY", "DOWNLOAD", "CONNECT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.api:
+        serve_api(int(args.api[0]), *args.api[1:])
+        return
+
+    port = free_port()
+    process = subprocess.Popen([
+        sys.executable, __file__, "--api", str(port),
+        str(args.latency_ms / 1000), str(args.download_ms / 1000), str(args.connect_ms / 1000)
+    ])
+    home = os.environ.get("HOME")
+    url = f"http://127.0.0.1:{port}"
+    os.environ["CLOUDFLARE_API_BASE_URL"] = url + API_PREFIX
+    results = []
+    try:
+        wait_for_port(port)
+        with tempfile.TemporaryDirectory() as site:
+            with open(os.path.join(site, "index.html"), "w") as f:
+                f.write("<h1>hello</h1>")
+            for label, provision in (
+                ("before", provision_before),
+                ("sequential", lambda host: host._provision(max_workers=1)),
+                ("concurrent", lambda host: host._provision()),
+            ):
+                results.append((label, measure(url, site, provision)))
+    finally:
+        if home is not None:
+            os.environ["HOME"] = home
+        stop_processes([process])
+
+    print(f"\napi latency={args.latency_ms:g}ms download={args.download_ms:g}ms connect={args.connect_ms:g}ms")
+    print(f"{'':<12}{'time to live':>14}{'API calls':>11}")
+    for label, (elapsed, calls) in results:
+        print(f"{label:<12}{elapsed * 1000:>12.0f}ms{calls:>11}")
+
+
+if __name__ == "__main__":
+    main()
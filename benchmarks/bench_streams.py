@@ -0,0 +1,188 @@
+"""
+Benchmark: memory and CPU cost of idle upgraded (WebSocket) streams.
+
+Opens many upgraded connections through the local proxy to an echo origin
+and leaves them idle, then reports the proxy's resident memory per stream,
+the CPU it burns while they sit idle, and round-trip time of a message on
+one stream while all the others stay open. The proxy holds two sockets per
+stream, so 5000 streams are 10k proxy sockets.
+
+``--relay tasks`` swaps the transport-level relay for the straightforward
+alternative of two coroutines per stream copying chunks, for comparison.
+
+Usage:
+    python benchmarks/bench_streams.py [--streams 5000] [--relay pipes|tasks]
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from common import current_rss_mb, free_port, stop_processes, wait_for_port  # noqa: E402
+
+
+def raise_fd_limit() -> None:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+async def echo_origin(port: int) -> None:
+    async def serve(reader, writer):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            writer.write(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n\r\n")
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(serve, "127.0.0.1", port, backlog=1024)
+    await server.serve_forever()
+
+
+async def task_relay(client, upstream, buffer_size):
+    """Two coroutines per stream, each copying one direction."""
+    async def copy(reader, writer):
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    await asyncio.gather(copy(client[0], upstream[1]), copy(upstream[0], client[1]))
+    return 0, 0
+
+
+def serve_proxy(port: int, origin: int, relay: str) -> None:
+    import hostify.proxy
+    from hostify.balancer import Backend
+    from hostify.proxy import ReverseProxy
+
+    if relay == "tasks":
+        hostify.proxy.relay = task_relay
+
+    async def run():
+        proxy = ReverseProxy(Backend(origin), port=port)
+        await proxy.start_async()
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+
+def cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+async def open_streams(port: int, count: int, batch: int = 200):
+    async def one():
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /ws HTTP/1.1\r\nHost: bench\r\nConnection: Upgrade\r\nUpgrade: websocket\r\n\r\n")
+        head = await reader.readuntil(b"\r\n\r\n")
+        if not head.startswith(b"HTTP/1.1 101"):
+            raise RuntimeError(head.split(b"\r\n", 1)[0].decode())
+        return reader, writer
+
+    streams = []
+    for start in range(0, count, batch):
+        streams += await asyncio.gather(*[one() for _ in range(min(batch, count - start))])
+    return streams
+
+
+async def measure(port: int, pid: int, count: int, idle: float) -> dict:
+    baseline = current_rss_mb(pid)
+    started = time.perf_counter()
+    streams = await open_streams(port, count)
+    opened = time.perf_counter() - started
+
+    await asyncio.sleep(1.0)
+    rss = current_rss_mb(pid)
+
+    cpu = cpu_seconds(pid)
+    await asyncio.sleep(idle)
+    idle_cpu = cpu_seconds(pid) - cpu
+
+    reader, writer = streams[len(streams) // 2]
+    rtts = []
+    for _ in range(200):
+        t = time.perf_counter()
+        writer.write(b"ping")
+        await reader.readexactly(4)
+        rtts.append(time.perf_counter() - t)
+    rtts.sort()
+
+    for _, writer in streams:
+        writer.close()
+
+    return {
+        "open_s": opened,
+        "baseline_mb": baseline,
+        "rss_mb": rss,
+        "per_stream_kb": (rss - baseline) * 1024 / count,
+        "idle_cpu": idle_cpu / idle,
+        "rtt_p50_ms": rtts[len(rtts) // 2] * 1000,
+        "rtt_p99_ms": rtts[int(len(rtts) * 0.99)] * 1000,
+    }
+
+
+def spawn(*args) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, __file__, *map(str, args)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--streams", type=int, default=5000)
+    parser.add_argument("--relay", choices=("pipes", "tasks"), default="pipes")
+    parser.add_argument("--idle", type=float, default=3.0, help="Seconds to measure idle CPU over")
+    parser.add_argument("--origin", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--proxy", nargs=3, metavar=("PORT", "ORIGIN", "RELAY"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    if args.origin:
+        asyncio.run(echo_origin(args.origin))
+        return
+    if args.proxy:
+        serve_proxy(int(args.proxy[0]), int(args.proxy[1]), args.proxy[2])
+        return
+
+    origin, port = free_port(), free_port()
+    processes = [spawn("--origin", origin)]
+    try:
+        wait_for_port(origin)
+        processes.append(spawn("--proxy", port, origin, args.relay))
+        wait_for_port(port)
+        result = asyncio.run(measure(port, processes[1].pid, args.streams, args.idle))
+    finally:
+        stop_processes(processes)
+
+    print(f"relay={args.relay} streams={args.streams} ({2 * args.streams} proxy sockets)")
+    print(
+        f"opened in {result['open_s']:.1f}s, proxy rss {result['baseline_mb']:.1f} -> {result['rss_mb']:.1f} MiB "
+        f"({result['per_stream_kb']:.1f} KiB per stream), idle cpu {result['idle_cpu']:.1%} of one core"
+    )
+    print(f"echo rtt with all streams open: p50={result['rtt_p50_ms']:.2f}ms p99={result['rtt_p99_ms']:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
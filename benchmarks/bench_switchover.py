@@ -0,0 +1,84 @@
+"""
+Load test: blue/green origin switchover under constant traffic.
+
+Starts origin A behind a blue/green Host proxy and drives keep-alive load
+at it. Meanwhile it switches to origin B through ``Host.switch_origin()``
+and then to origin C through the ``hostify switch`` CLI. Each old origin is
+stopped as soon as the switch reports it drained. A correct switchover
+finishes with zero failed requests.
+
+No tunnel or DNS record is created; only the local side of Host runs.
+
+Usage:
+    python benchmarks/bench_switchover.py [--duration 8] [--concurrency 32]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from common import free_port, run_load, start_backend  # noqa: E402
+
+from hostify import Host  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--duration", type=float, default=8.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--delay", type=float, default=0.005, help="Backend service time (s)")
+    args = parser.parse_args()
+
+    domain = "switchover.bench.invalid"
+    port_a, port_b, port_c = free_port(), free_port(), free_port()
+    origin_a = start_backend(port_a, args.delay)
+    processes = [origin_a]
+
+    host = Host(domain=domain, port=port_a, api_token="benchmark", blue_green=True)
+    host._setup_local_server()
+
+    result = {}
+    load = threading.Thread(
+        target=lambda: result.update(run_load(host.port, args.concurrency, args.duration))
+    )
+    load.start()
+
+    try:
+        time.sleep(args.duration / 4)
+        origin_b = start_backend(port_b, args.delay)
+        processes.append(origin_b)
+        switched = host.switch_origin(port_b)
+        origin_a.terminate()
+        print(f"API switch A -> B: drained={switched['drained']}")
+
+        time.sleep(args.duration / 4)
+        origin_c = start_backend(port_c, args.delay)
+        processes.append(origin_c)
+        env = dict(os.environ, PYTHONPATH=os.path.join(os.path.dirname(__file__), ".."))
+        subprocess.run(
+            [sys.executable, "-m", "hostify.cli", "switch", domain, str(port_c)],
+            check=True,
+            env=env
+        )
+        origin_b.terminate()
+
+        load.join()
+    finally:
+        host.cleanup()
+        for process in processes:
+            process.terminate()
+
+    print(
+        f"\nrequests={result['requests']} errors={result['errors']} "
+        f"rps={result['rps']:.0f} p50={result['p50_ms']:.1f}ms p99={result['p99_ms']:.1f}ms"
+    )
+    sys.exit(1 if result["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark: large uploads through the local proxy.
+
+Streams one large PUT through the proxy to an origin that discards it and
+reports throughput and the proxy's resident memory before the upload and
+at its peak. With streaming bodies the peak stays flat however large the
+upload is.
+
+Usage:
+    python benchmarks/bench_upload.py [--size-mb 5120] [--stream-buffer-kb 256]
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from common import current_rss_mb, free_port, peak_rss_mb, stop_processes, wait_for_port  # noqa: E402
+
+
+CHUNK = b"\0" * (256 * 1024)
+
+
+async def sink_origin(port: int) -> None:
+    async def serve(reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                while length:
+                    data = await reader.read(min(length, 1024 * 1024))
+                    if not data:
+                        return
+                    length -= len(data)
+                writer.write(b"HTTP/1.1 204 No Content\r\n\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(serve, "127.0.0.1", port)
+    await server.serve_forever()
+
+
+def serve_proxy(port: int, origin: int, stream_buffer: int) -> None:
+    from hostify.balancer import Backend
+    from hostify.proxy import ReverseProxy
+
+    async def run():
+        proxy = ReverseProxy(Backend(origin, stream_buffer=stream_buffer), port=port, stream_buffer=stream_buffer)
+        await proxy.start_async()
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+
+async def upload(port: int, size: int) -> float:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    started = time.perf_counter()
+    writer.write(
+        b"PUT /upload HTTP/1.1\r\nHost: bench\r\nContent-Length: %d\r\n"
+        b"Expect: 100-continue\r\n\r\n" % size
+    )
+    interim = await reader.readuntil(b"\r\n\r\n")
+    if not interim.startswith(b"HTTP/1.1 100"):
+        raise RuntimeError(interim.split(b"\r\n", 1)[0].decode())
+
+    remaining = size
+    while remaining:
+        chunk = CHUNK if remaining >= len(CHUNK) else CHUNK[:remaining]
+        writer.write(chunk)
+        await writer.drain()
+        remaining -= len(chunk)
+
+    head = await reader.readuntil(b"\r\n\r\n")
+    elapsed = time.perf_counter() - started
+    writer.close()
+    if not head.startswith(b"HTTP/1.1 204"):
+        raise RuntimeError(head.split(b"\r\n", 1)[0].decode())
+    return elapsed
+
+
+def spawn(*args) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, __file__, *map(str, args)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mb", type=int, default=5120)
+    parser.add_argument("--stream-buffer-kb", type=int, default=256)
+    parser.add_argument("--origin", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--proxy", nargs=3, type=int, metavar=("PORT", "ORIGIN", "BUFFER"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.origin:
+        asyncio.run(sink_origin(args.origin))
+        return
+    if args.proxy:
+        serve_proxy(*args.proxy)
+        return
+
+    size = args.size_mb * 1024 * 1024
+    origin, port = free_port(), free_port()
+    processes = [spawn("--origin", origin)]
+    try:
+        wait_for_port(origin)
+        processes.append(spawn("--proxy", port, origin, args.stream_buffer_kb * 1024))
+        wait_for_port(port)
+        pid = processes[1].pid
+        baseline = current_rss_mb(pid)
+        elapsed = asyncio.run(upload(port, size))
+        peak = peak_rss_mb(pid)
+    finally:
+        stop_processes(processes)
+
+    print(f"upload={args.size_mb} MiB stream_buffer={args.stream_buffer_kb} KiB")
+    print(
+        f"{args.size_mb / elapsed:.0f} MiB/s, proxy rss {baseline:.1f} MiB before, "
+        f"{peak:.1f} MiB peak (+{peak - baseline:.1f} MiB)"
+    )
+
+
+if __name__ == "__main__":
+    main()
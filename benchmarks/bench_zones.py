@@ -0,0 +1,113 @@
+"""
+Benchmark: resolving many hostnames to their zones.
+
+Serves :class:`hostify.mock_api.MockCloudflareAPI` with ``--zones``
+zones (some under two-label public suffixes such as ``co.uk``, some
+delegated subzones) and resolves ``--hostnames`` hostnames spread across them, once
+by guessing the zone from the last two labels with a ``/zones?name=``
+request per new guess, as ``get_zone_id`` used to, and once through the
+suffix index. Reports API calls, wall time and wrongly resolved
+hostnames. The stand-in adds ``--rtt-ms`` to every request.
+
+Usage:
+    python benchmarks/bench_zones.py [--zones 2000] [--hostnames 5000] [--rtt-ms 20]
+"""
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from common import free_port, stop_processes, wait_for_port  # noqa: E402
+from hostify.cloudflare import Cloudflare  # noqa: E402
+from hostify.mock_api import API_PREFIX, MockCloudflareAPI  # noqa: E402
+
+
+def make_zones(count: int):
+    zones = []
+    for i in range(count):
+        if i % 10 == 0:
+            zones.append(f"site{i}.co.uk")
+        elif i % 10 == 1:
+            # Subzone delegated from the zone before it
+            zones.append(f"shop.site{i - 1}.com")
+        else:
+            zones.append(f"site{i}.com")
+    return zones
+
+
+def serve_api(port: int, count: int, rtt: float) -> None:
+    MockCloudflareAPI(zones=make_zones(count), latency=rtt, port=port).serve_forever()
+
+
+def guess_zone(cf: Cloudflare, domain: str, cache: dict):
+    """``get_zone_id`` as it was: the last two labels, one lookup per new guess."""
+    root = ".".join(domain.split(".")[-2:])
+    if root not in cache:
+        zones = cf._make_request("GET", "/zones", params={"name": root})
+        cache[root] = zones[0]["id"] if zones else None
+    return cache[root]
+
+
+def measure(cf: Cloudflare, resolve, hostnames, expected):
+    stats_url = cf.base_url[:-len(API_PREFIX)] + "/__mock/stats"
+    before = cf.session.get(stats_url).json()["calls"]
+    started = time.perf_counter()
+    wrong = sum(1 for hostname in hostnames if resolve(hostname) != expected[hostname])
+    elapsed = time.perf_counter() - started
+    calls = cf.session.get(stats_url).json()["calls"] - before
+    return calls, elapsed, wrong
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--zones", type=int, default=2000)
+    parser.add_argument("--hostnames", type=int, default=5000)
+    parser.add_argument("--rtt-ms", type=float, default=20.0)
+    parser.add_argument("--api", nargs=3, type=float, metavar=("PORT", "ZONES", "RTT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.api:
+        serve_api(int(args.api[0]), int(args.api[1]), args.api[2])
+        return
+
+    rng = random.Random(1)
+    zones = make_zones(args.zones)
+    hostnames = [f"app{i}.{rng.choice(zones)}" for i in range(args.hostnames)]
+
+    port = free_port()
+    process = subprocess.Popen([sys.executable, __file__, "--api", str(port), str(args.zones), str(args.rtt_ms / 1000)])
+    try:
+        wait_for_port(port)
+        base_url = f"http://127.0.0.1:{port}{API_PREFIX}"
+        with Cloudflare("bench-token", base_url=base_url, id_cache=False, rate_limit=None) as cf:
+            ids = {zone["name"]: zone["id"] for zone in cf.iter_zones()}
+        expected = {hostname: ids[hostname.split(".", 1)[1]] for hostname in hostnames}
+
+        with Cloudflare("bench-token", base_url=base_url, id_cache=False, rate_limit=None) as cf:
+            cache = {}
+            guessed = measure(cf, lambda hostname: guess_zone(cf, hostname, cache), hostnames, expected)
+
+        def resolve(hostname):
+            try:
+                return cf.get_zone_id(hostname)
+            except Exception:
+                return None
+
+        with Cloudflare("bench-token", base_url=base_url, id_cache=False, rate_limit=None) as cf:
+            indexed = measure(cf, resolve, hostnames, expected)
+    finally:
+        stop_processes([process])
+
+    print(f"zones={args.zones} hostnames={args.hostnames} rtt={args.rtt_ms:g}ms")
+    print(f"{'':<12}{'API calls':>10}{'wall time':>12}{'wrong':>8}")
+    for label, (calls, elapsed, wrong) in (("two labels", guessed), ("suffix trie", indexed)):
+        print(f"{label:<12}{calls:>10}{elapsed * 1000:>10.0f}ms{wrong:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Shared helpers for the hostify benchmarks.
+
+Backends run as separate processes so that the proxy under test does not
+share an interpreter (and GIL) with the servers it balances across.
+"""
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import List, Optional
+
+
+BACKEND_SCRIPT = r"""
+import sys, time, random, threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+port, delay, jitter, jitter_delay = int(sys.argv[1]), float(sys.argv[2]), float(sys.argv[3]), float(sys.argv[4])
+size = int(sys.argv[5])
+payload = b"x" * size
+worker = threading.Lock()
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Head and body go out in separate writes; without this, Nagle plus
+    # delayed ACKs add ~40ms to every keep-alive response
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        # Connections are accepted concurrently but only one request is
+        # worked on at a time, like a sync app with a single worker
+        with worker:
+            time.sleep(jitter_delay if random.random() < jitter else delay)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+ThreadingHTTPServer(("127.0.0.1", port), Handler).serve_forever()
+"""
+
+
+def free_port() -> int:
+    """Return a port that is currently free on localhost."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 10.0) -> None:
+    """Block until something accepts connections on ``port``."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.05)
+    raise RuntimeError(f"Nothing listening on port {port}")
+
+
+def start_backend(
+    port: int,
+    delay: float = 0.01,
+    jitter: float = 0.0,
+    jitter_delay: float = 0.0,
+    size: int = 64
+) -> subprocess.Popen:
+    """
+    Start a single-worker HTTP backend in a subprocess.
+
+    Args:
+        port: Port to listen on
+        delay: Seconds each request takes
+        jitter: Probability that a request takes ``jitter_delay`` instead
+        jitter_delay: Seconds a jittery request takes
+        size: Response body size in bytes
+
+    Returns:
+        Popen process object
+    """
+    process = subprocess.Popen(
+        [sys.executable, "-c", BACKEND_SCRIPT,
+         str(port), str(delay), str(jitter), str(jitter_delay), str(size)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    wait_for_port(port)
+    return process
+
+
+def stop_processes(processes: List[subprocess.Popen]) -> None:
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.wait()
+
+
+async def _client(
+    port: int,
+    path: str,
+    deadline: float,
+    latencies: List[float],
+    errors: List[int],
+    error_pause: float
+) -> None:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    request = f"GET {path} HTTP/1.1\r\nHost: bench\r\n\r\n".encode()
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            writer.write(request)
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            close = head.startswith(b"HTTP/1.0")
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+                elif line.lower().replace(b" ", b"") == b"connection:close":
+                    close = True
+            await reader.readexactly(length)
+            # Latencies are those of successful requests only
+            if head.split(b" ", 2)[1].startswith(b"2"):
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors.append(1)
+                if error_pause:
+                    await asyncio.sleep(error_pause)
+            if close:
+                # Servers without keep-alive (e.g. development servers)
+                writer.close()
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    except (ConnectionError, asyncio.IncompleteReadError):
+        errors.append(1)
+    finally:
+        writer.close()
+
+
+def run_load(
+    port: int,
+    concurrency: int = 32,
+    duration: float = 3.0,
+    path: str = "/",
+    error_pause: float = 0.0
+) -> dict:
+    """
+    Drive keep-alive GET traffic at ``port`` for ``duration`` seconds.
+
+    ``error_pause`` makes a client wait that many seconds after a non-2xx
+    response, like a user hitting reload, instead of retrying at once.
+
+    Returns:
+        Dict with successful requests, errors (failed requests and non-2xx
+        responses), rps and latency percentiles (ms) of the successes
+    """
+    latencies: List[float] = []
+    errors: List[int] = []
+
+    async def main():
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*[
+            _client(port, path, deadline, latencies, errors, error_pause)
+            for _ in range(concurrency)
+        ])
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    elapsed = time.perf_counter() - started
+
+    return summarize(latencies, len(errors), elapsed)
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> dict:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def peak_rss_mb(pid: Optional[int] = None) -> float:
+    """Peak resident set size of ``pid`` (default: this process) in MiB."""
+    path = f"/proc/{pid or os.getpid()}/status"
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def current_rss_mb(pid: Optional[int] = None) -> float:
+    """Current resident set size of ``pid`` (default: this process) in MiB."""
+    path = f"/proc/{pid or os.getpid()}/status"
+    with open(path) as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
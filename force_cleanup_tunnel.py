@@ -64,21 +64,17 @@ def force_delete_tunnel(tunnel_id: str):
     # Step 3: Find and delete associated DNS records
     print(f"\n[+] Searching for associated DNS records...")
     try:
-        # Get all zones
-        zones_response = cf._make_request("GET", "/zones")
-        zones = zones_response if isinstance(zones_response, list) else [zones_response]
-        
         deleted_records = 0
-        for zone in zones:
+        for zone in cf.iter_zones():
             zone_id = zone['id']
             zone_name = zone['name']
             
             # List DNS records for this zone
             try:
-                records = cf.list_dns_records(zone_id, record_type="CNAME")
-                
-                # Find records pointing to this tunnel
+                # Find records pointing to this tunnel (collected first:
+                # deleting while paging would shift the later pages)
                 tunnel_cname = f"{tunnel_id}.cfargotunnel.com"
+                records = list(cf.iter_dns_records(zone_id, record_type="CNAME", content=tunnel_cname))
                 for record in records:
                     if record.get('content') == tunnel_cname:
                         try:
@@ -6,6 +6,28 @@ using Cloudflare Tunnels, making them accessible via real domains.
 """
 
 from .host import Host
+from .cache import ResponseCache
+from .coalesce import RequestCoalescer
+from .compress import Compressor
+from .concurrency import ConcurrencyLimiter
+from .health import HealthChecker
+from .hedge import Hedger
+from .metrics import Metrics
+from .normalize import CacheKeyNormalizer
+from .ratelimit import RateLimiter
+from .warmup import Warmup
 
 __version__ = "0.2.1"
-__all__ = ["Host"]
+__all__ = [
+    "CacheKeyNormalizer",
+    "Compressor",
+    "ConcurrencyLimiter",
+    "HealthChecker",
+    "Hedger",
+    "Host",
+    "Metrics",
+    "RateLimiter",
+    "RequestCoalescer",
+    "ResponseCache",
+    "Warmup",
+]
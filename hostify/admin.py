@@ -0,0 +1,159 @@
+"""
+Loopback control endpoint for a running Host.
+
+While the local proxy runs, a second small HTTP listener on 127.0.0.1 takes
+control requests (such as switching the origin) from the ``hostify`` CLI.
+Its port and a random bearer token are written to a control file under
+``~/.hostify/admin`` that only the current user can read.
+"""
+
+import json
+import os
+import re
+import secrets
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from .proxy import Body, Headers, Request, Response
+
+
+CONTROL_DIR = "~/.hostify/admin"
+
+Route = Callable[[Dict], Awaitable[Tuple[int, Dict]]]
+
+
+class AdminError(Exception):
+    """Custom exception for admin endpoint errors."""
+    pass
+
+
+class AdminAPI:
+    """
+    Upstream handler that serves JSON control routes.
+
+    Used as the ``upstream`` of a :class:`hostify.proxy.ReverseProxy`, so it
+    shares the proxy's event loop and HTTP handling.
+    """
+
+    def __init__(self, token: str):
+        """
+        Initialize admin API.
+
+        Args:
+            token: Bearer token every request must present
+        """
+        self.token = token
+        self.routes: Dict[Tuple[str, str], Route] = {}
+
+    def route(self, method: str, path: str, handler: Route) -> None:
+        """Register ``handler`` for ``method`` ``path``."""
+        self.routes[(method.upper(), path)] = handler
+
+    async def send(self, request: Request) -> Response:
+        presented = request.headers.get("authorization", "")
+        if not secrets.compare_digest(presented, f"Bearer {self.token}"):
+            return _json(401, {"error": "unauthorized"})
+
+        handler = self.routes.get((request.method, request.path))
+        if handler is None:
+            return _json(404, {"error": f"no route for {request.method} {request.path}"})
+
+        raw = await request.read()
+        try:
+            payload = json.loads(raw) if raw else {}
+        except ValueError:
+            return _json(400, {"error": "body must be JSON"})
+
+        try:
+            status, result = await handler(payload)
+        except Exception as e:
+            return _json(500, {"error": str(e)})
+        return _json(status, result)
+
+
+def _json(status: int, data: Dict) -> Response:
+    body = json.dumps(data).encode("utf-8")
+    return Response(status, Headers([("Content-Type", "application/json")]), Body.from_bytes(body))
+
+
+def new_token() -> str:
+    """Generate a random bearer token."""
+    return secrets.token_urlsafe(32)
+
+
+def control_file_path(domain: str) -> str:
+    """Path of the control file for ``domain``."""
+    name = re.sub(r"[^A-Za-z0-9.-]", "_", domain)
+    return os.path.join(os.path.expanduser(CONTROL_DIR), f"{name}.json")
+
+
+def write_control_file(domain: str, port: int, token: str) -> str:
+    """
+    Record where the admin endpoint for ``domain`` listens.
+
+    Returns:
+        Path to the control file
+    """
+    path = control_file_path(domain)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump({"pid": os.getpid(), "port": port, "token": token}, f)
+    return path
+
+
+def read_control_file(domain: str) -> Dict:
+    """
+    Read the control file for ``domain``.
+
+    Raises:
+        AdminError: If no hostify process is serving ``domain``
+    """
+    path = control_file_path(domain)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        raise AdminError(
+            f"No running hostify process found for {domain}. "
+            f"Start it with a local proxy (e.g. 'hostify port <port> {domain} --blue-green')."
+        )
+
+
+def call_admin(
+    domain: str,
+    method: str,
+    path: str,
+    payload: Optional[Dict] = None,
+    timeout: float = 120.0
+) -> Dict:
+    """
+    Call the admin endpoint of the hostify process serving ``domain``.
+
+    Returns:
+        Decoded JSON result
+
+    Raises:
+        AdminError: If the process can't be reached or reports an error
+    """
+    import requests
+
+    control = read_control_file(domain)
+    try:
+        response = requests.request(
+            method,
+            f"http://127.0.0.1:{control['port']}{path}",
+            json=payload,
+            headers={"Authorization": f"Bearer {control['token']}"},
+            timeout=timeout
+        )
+    except requests.exceptions.RequestException as e:
+        raise AdminError(f"Could not reach hostify process for {domain}: {e}")
+
+    try:
+        data = response.json()
+    except ValueError:
+        data = {}
+    if response.status_code >= 400:
+        raise AdminError(data.get("error") or f"HTTP {response.status_code}")
+    return data
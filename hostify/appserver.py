@@ -0,0 +1,534 @@
+"""
+In-process WSGI/ASGI application server.
+
+Instead of proxying to a server the user started separately, the app is
+called directly from hostify's HTTP/1.1 server (the same one the local
+proxy uses), so cloudflared talks straight to the process running the app.
+
+WSGI apps run on a thread pool. ASGI apps run on the event loop. Either
+can be spread over several worker processes that share one listening
+socket (POSIX only, uses fork).
+"""
+
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence
+from urllib.parse import unquote
+
+from .proxy import Body, Headers, ProxyError, Request, Response, ReverseProxy
+
+
+class AppServerError(ProxyError):
+    """Custom exception for application server errors."""
+    pass
+
+
+def _app_error(error: Exception) -> Response:
+    # Like other servers, report the traceback and answer 500 instead of
+    # dropping the client's connection
+    print(f"[ERROR] Exception in application: {error!r}", file=sys.stderr)
+    traceback.print_exception(type(error), error, error.__traceback__, file=sys.stderr)
+    return Response.text(500, "Internal Server Error\n")
+
+
+def _server_info(request: Request, port: int):
+    host = request.headers.get("host", f"localhost:{port}")
+    name, _, server_port = host.partition(":")
+    return name or "localhost", server_port or str(port)
+
+
+def _scheme(request: Request) -> str:
+    # cloudflared terminates TLS at the edge and forwards plain HTTP
+    proto = request.headers.get("x-forwarded-proto", "")
+    return "https" if proto.lower() == "https" else "http"
+
+
+class _WSGIInput:
+    """
+    File-like ``wsgi.input`` that pulls request body chunks from the event
+    loop on demand, so uploads stream into the app instead of being
+    buffered up front.
+    """
+
+    def __init__(self, body: Body, loop: asyncio.AbstractEventLoop):
+        self._body = body
+        self._loop = loop
+        self._buffer = b""
+        self._eof = False
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        try:
+            chunk = asyncio.run_coroutine_threadsafe(self._body.__anext__(), self._loop).result()
+        except StopAsyncIteration:
+            self._eof = True
+            return False
+        self._buffer += chunk
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            while self._fill():
+                pass
+            data, self._buffer = self._buffer, b""
+            return data
+        while len(self._buffer) < size and self._fill():
+            pass
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def readline(self, size: int = -1) -> bytes:
+        while b"\n" not in self._buffer and (size < 0 or len(self._buffer) < size) and self._fill():
+            pass
+        end = self._buffer.find(b"\n") + 1 or len(self._buffer)
+        if size >= 0:
+            end = min(end, size)
+        data, self._buffer = self._buffer[:end], self._buffer[end:]
+        return data
+
+    def readlines(self, hint: int = -1) -> List[bytes]:
+        return list(iter(self.readline, b""))
+
+    def __iter__(self):
+        return iter(self.readline, b"")
+
+
+class WSGIHandler:
+    """
+    Upstream handler that calls a WSGI application on a thread pool.
+    """
+
+    def __init__(self, app: Callable, threads: int = 8, multiprocess: bool = False):
+        """
+        Initialize handler.
+
+        Args:
+            app: WSGI application callable
+            threads: Size of the thread pool the app runs on
+            multiprocess: Value of ``wsgi.multiprocess``
+        """
+        self.app = app
+        self.threads = threads
+        self.multiprocess = multiprocess
+        self.port = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def start(self) -> None:
+        self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix="hostify-wsgi")
+
+    async def close(self) -> None:
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def environ(self, request: Request, loop: asyncio.AbstractEventLoop) -> dict:
+        server_name, server_port = _server_info(request, self.port)
+        environ = {
+            "REQUEST_METHOD": request.method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": unquote(request.path, encoding="latin-1"),
+            "QUERY_STRING": request.query,
+            "SERVER_NAME": server_name,
+            "SERVER_PORT": server_port,
+            "SERVER_PROTOCOL": request.version,
+            "REMOTE_ADDR": request.client[0] if request.client else "",
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": _scheme(request),
+            "wsgi.input": _WSGIInput(request.body, loop),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": self.threads > 1,
+            "wsgi.multiprocess": self.multiprocess,
+            "wsgi.run_once": False,
+        }
+
+        for name, value in request.headers:
+            key = name.upper().replace("-", "_")
+            if key == "CONTENT_TYPE":
+                environ["CONTENT_TYPE"] = value
+            elif key == "CONTENT_LENGTH":
+                environ["CONTENT_LENGTH"] = value
+            elif key not in ("TRANSFER_ENCODING", "CONNECTION"):
+                key = f"HTTP_{key}"
+                environ[key] = f"{environ[key]},{value}" if key in environ else value
+
+        if request.body.length is not None:
+            environ["CONTENT_LENGTH"] = str(request.body.length)
+        return environ
+
+    async def send(self, request: Request) -> Response:
+        loop = asyncio.get_running_loop()
+        environ = self.environ(request, loop)
+        state = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and state.get("sent"):
+                raise exc_info[1].with_traceback(exc_info[2])
+            state["status"] = status
+            state["headers"] = headers
+            return state.setdefault("written", []).append
+
+        def begin():
+            result = self.app(environ, start_response)
+            try:
+                iterator = iter(result)
+                # Pull until the app has called start_response and produced
+                # the first chunk (or finished)
+                first = b""
+                for first in iterator:
+                    if first:
+                        break
+                else:
+                    first = b""
+                if "status" not in state:
+                    raise AppServerError("WSGI app returned without calling start_response")
+            except BaseException:
+                close = getattr(result, "close", None)
+                if close:
+                    close()
+                raise
+            state["sent"] = True
+            return result, iterator, b"".join(state.get("written", [])) + first
+
+        try:
+            result, iterator, first = await loop.run_in_executor(self._executor, begin)
+        except Exception as e:
+            return _app_error(e)
+
+        status_code, _, reason = state["status"].partition(" ")
+        headers = Headers(state["headers"])
+        length = headers.get("content-length")
+
+        def next_chunk():
+            for chunk in iterator:
+                if chunk:
+                    return chunk
+            return None
+
+        def finish():
+            close = getattr(result, "close", None)
+            if close:
+                close()
+
+        async def chunks():
+            try:
+                if first:
+                    yield first
+                while True:
+                    chunk = await loop.run_in_executor(self._executor, next_chunk)
+                    if chunk is None:
+                        return
+                    yield chunk
+            finally:
+                await loop.run_in_executor(self._executor, finish)
+
+        body = Body(chunks(), int(length) if length is not None else None)
+        return Response(int(status_code), headers, body, reason)
+
+
+class ASGIHandler:
+    """
+    Upstream handler that runs an ASGI 3 application on the event loop.
+
+    Lifespan events are sent when the server starts and stops; apps that
+    don't support lifespan are tolerated.
+    """
+
+    # Response chunks buffered between the app and the socket
+    QUEUE_SIZE = 16
+
+    def __init__(self, app: Callable):
+        """
+        Initialize handler.
+
+        Args:
+            app: ASGI application callable
+        """
+        self.app = app
+        self.port = 0
+        self._lifespan: Optional[asyncio.Task] = None
+        self._lifespan_queue: Optional[asyncio.Queue] = None
+
+    async def start(self) -> None:
+        self._lifespan_queue = asyncio.Queue()
+        started = asyncio.get_running_loop().create_future()
+
+        async def receive():
+            return await self._lifespan_queue.get()
+
+        async def send(message):
+            if message["type"] in ("lifespan.startup.complete", "lifespan.startup.failed"):
+                if not started.done():
+                    started.set_result(message)
+
+        async def run():
+            try:
+                await self.app({"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}}, receive, send)
+            except Exception:
+                pass  # lifespan not supported
+            finally:
+                if not started.done():
+                    started.set_result(None)
+
+        self._lifespan = asyncio.ensure_future(run())
+        await self._lifespan_queue.put({"type": "lifespan.startup"})
+        message = await started
+        if message and message["type"] == "lifespan.startup.failed":
+            raise AppServerError(f"ASGI app failed to start: {message.get('message', '')}")
+
+    async def close(self) -> None:
+        if self._lifespan and not self._lifespan.done():
+            await self._lifespan_queue.put({"type": "lifespan.shutdown"})
+            try:
+                await asyncio.wait_for(self._lifespan, 10)
+            except (asyncio.TimeoutError, Exception):
+                self._lifespan.cancel()
+
+    def scope(self, request: Request) -> dict:
+        server_name, server_port = _server_info(request, self.port)
+        return {
+            "type": "http",
+            "asgi": {"version": "3.0", "spec_version": "2.3"},
+            "http_version": request.version.split("/", 1)[1],
+            "method": request.method,
+            "scheme": _scheme(request),
+            "path": unquote(request.path),
+            "raw_path": request.path.encode("latin-1"),
+            "query_string": request.query.encode("latin-1"),
+            "root_path": "",
+            "headers": [
+                (name.lower().encode("latin-1"), value.encode("latin-1"))
+                for name, value in request.headers
+            ],
+            "client": request.client,
+            "server": (server_name, int(server_port) if server_port.isdigit() else self.port),
+        }
+
+    async def send(self, request: Request) -> Response:
+        loop = asyncio.get_running_loop()
+        started = loop.create_future()
+        queue: asyncio.Queue = asyncio.Queue(self.QUEUE_SIZE)
+        finished = asyncio.Event()
+        body = request.body
+
+        async def receive():
+            if not body.closed:
+                try:
+                    chunk = await body.__anext__()
+                    return {"type": "http.request", "body": chunk, "more_body": True}
+                except StopAsyncIteration:
+                    return {"type": "http.request", "body": b"", "more_body": False}
+            await finished.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                started.set_result(message)
+            elif message["type"] == "http.response.body":
+                data = message.get("body", b"")
+                if data:
+                    await queue.put(data)
+                if not message.get("more_body", False):
+                    await queue.put(None)
+
+        async def run():
+            try:
+                await self.app(self.scope(request), receive, send)
+            except Exception as e:
+                if not started.done():
+                    started.set_exception(e)
+                else:
+                    await queue.put(e)
+                return
+            if not started.done():
+                started.set_exception(AppServerError("ASGI app returned without a response"))
+            else:
+                await queue.put(None)
+
+        task = asyncio.ensure_future(run())
+        try:
+            message = await started
+        except Exception as e:
+            finished.set()
+            return _app_error(e)
+        except BaseException:
+            finished.set()
+            raise
+
+        headers = Headers(
+            (name.decode("latin-1"), value.decode("latin-1"))
+            for name, value in message.get("headers", [])
+        )
+        length = headers.get("content-length")
+
+        async def chunks():
+            try:
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        return
+                    if isinstance(item, Exception):
+                        raise AppServerError(f"ASGI app failed mid-response: {item}")
+                    yield item
+            finally:
+                finished.set()
+                if not task.done():
+                    task.cancel()
+
+        status = message["status"]
+        return Response(status, headers, Body(chunks(), int(length) if length is not None else None))
+
+
+class AppServer:
+    """
+    Serve a WSGI or ASGI application on a local port.
+
+    With ``workers=1`` the server runs on a background thread of the
+    current process. With more workers, the listening socket is bound once
+    and shared by ``workers`` forked processes.
+    """
+
+    def __init__(
+        self,
+        app: Callable,
+        interface: str = "wsgi",
+        workers: int = 1,
+        threads: int = 8,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        middleware: Optional[Sequence] = None
+    ):
+        """
+        Initialize application server.
+
+        Args:
+            app: WSGI or ASGI application
+            interface: "wsgi" or "asgi"
+            workers: Number of worker processes
+            threads: WSGI threads per worker
+            host: Interface to listen on
+            port: Port to listen on (0 picks a free port)
+            middleware: Proxy stages to run in front of the app
+        """
+        if interface not in ("wsgi", "asgi"):
+            raise AppServerError(f"Unknown interface '{interface}'. Use 'wsgi' or 'asgi'")
+        if workers < 1 or threads < 1:
+            raise AppServerError("workers and threads must be at least 1")
+        if workers > 1 and "fork" not in multiprocessing.get_all_start_methods():
+            raise AppServerError("Multiple worker processes need fork(); use threads on this platform")
+
+        self.app = app
+        self.interface = interface
+        self.workers = workers
+        self.threads = threads
+        self.host = host
+        self.port = port
+        self.middleware = list(middleware or [])
+
+        self.server: Optional[ReverseProxy] = None
+        self.processes: List[multiprocessing.Process] = []
+        self._sock: Optional[socket.socket] = None
+
+    def _handler(self):
+        if self.interface == "wsgi":
+            handler = WSGIHandler(self.app, self.threads, multiprocess=self.workers > 1)
+        else:
+            handler = ASGIHandler(self.app)
+        handler.port = self.port
+        return handler
+
+    def start(self) -> int:
+        """
+        Start serving.
+
+        Returns:
+            Port the application is served on
+        """
+        if self.workers == 1:
+            self.server = ReverseProxy(self._handler(), self.host, self.port, middleware=self.middleware)
+            self.port = self.server.start()
+            self.server.upstream.port = self.port
+            return self.port
+
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((self.host, self.port))
+        self._sock.listen(1024)
+        self._sock.setblocking(False)
+        self.port = self._sock.getsockname()[1]
+
+        self.ensure_workers()
+        return self.port
+
+    def ensure_workers(self) -> int:
+        """
+        Start worker processes until ``workers`` are alive.
+
+        Returns:
+            Number of workers (re)started
+        """
+        if self._sock is None:
+            return 0
+
+        self.processes = [p for p in self.processes if p.is_alive()]
+        context = multiprocessing.get_context("fork")
+        started = 0
+        while len(self.processes) < self.workers:
+            process = context.Process(target=self._run_worker, name="hostify-worker", daemon=True)
+            process.start()
+            self.processes.append(process)
+            started += 1
+        return started
+
+    def _run_worker(self) -> None:
+        # The parent handles Ctrl+C and stops workers with SIGTERM
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        signal.signal(signal.SIGTERM, lambda *args: loop.call_soon_threadsafe(loop.stop))
+
+        server = ReverseProxy(self._handler(), sock=self._sock, middleware=self.middleware)
+        loop.run_until_complete(server.start_async())
+        try:
+            loop.run_forever()
+        finally:
+            loop.run_until_complete(server.stop_async())
+            pending = asyncio.all_tasks(loop)
+            for task in pending:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            loop.close()
+
+    def is_running(self) -> bool:
+        if self.server is not None:
+            return self.server.loop is not None
+        return bool(self.processes) and all(p.is_alive() for p in self.processes)
+
+    def summary(self) -> List[str]:
+        return self.server.summary() if self.server else []
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the server and any worker processes."""
+        if self.server:
+            self.server.stop(timeout)
+            self.server = None
+
+        for process in self.processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.kill()
+        self.processes = []
+
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
@@ -0,0 +1,178 @@
+"""
+Asyncio interface to the Cloudflare API.
+
+:class:`AsyncCloudflare` runs the calls of a :class:`hostify.cloudflare.Cloudflare`
+client on a pool of worker threads, so coroutines can have many API calls
+in flight at once: provisioning or tearing down dozens of hostnames takes
+about as long as the slowest call instead of the sum of all of them. The
+calls share the client's keep-alive connections, retries, rate limiter
+and ID caches.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
+
+from .cloudflare import DNS_BATCH_SIZE, Cloudflare
+
+
+class AsyncCloudflare:
+    """
+    Cloudflare API client for asyncio code.
+
+    At most ``concurrency`` calls run at once; further calls wait for a
+    free worker. Use it as an async context manager or call
+    :meth:`aclose` when done::
+
+        async with AsyncCloudflare() as cf:
+            zone_id = await cf.get_zone_id("example.com")
+            await asyncio.gather(*[
+                cf.create_dns_record(zone_id, name, tunnel_id) for name in hostnames
+            ])
+    """
+
+    def __init__(self, api_token: Optional[str] = None, concurrency: int = 16, **options):
+        """
+        Initialize async Cloudflare API client.
+
+        Args:
+            api_token: Cloudflare API token. If None, reads from CF_API_TOKEN or CLOUDFLARE_API_TOKEN env var.
+            concurrency: Most API calls in flight at once (and connections kept open)
+            **options: Further :class:`hostify.cloudflare.Cloudflare` arguments
+                (``base_url``, ``timeout``, ``max_retries``, ``rate_limit``, ...)
+
+        Raises:
+            CloudflareAPIError: If API token is not provided.
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        options.setdefault("pool_size", concurrency)
+        self.client = Cloudflare(api_token, **options)
+        self.concurrency = concurrency
+        self._executor = ThreadPoolExecutor(concurrency, thread_name_prefix="hostify-cf")
+
+    async def __aenter__(self) -> "AsyncCloudflare":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Wait for calls in flight and close the connections."""
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+        self.client.close()
+
+    def stats(self) -> Dict[str, float]:
+        """Retry and throttling counters of the underlying client."""
+        return self.client.stats()
+
+    async def _run(self, function, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(function, *args, **kwargs))
+
+    async def _iterate(self, iterator) -> AsyncIterator[Dict]:
+        # Each page is fetched on a worker; items of a fetched page come
+        # back without another thread hop
+        done = object()
+
+        def next_page():
+            page = []
+            for item in iterator:
+                page.append(item)
+                if len(page) >= self.client.PAGE_SIZE:
+                    break
+            return page or done
+
+        while True:
+            page = await self._run(next_page)
+            if page is done:
+                return
+            for item in page:
+                yield item
+
+    # -- accounts and zones ------------------------------------------------
+
+    async def get_account_id(self) -> str:
+        """Coroutine version of :meth:`Cloudflare.get_account_id`."""
+        return await self._run(self.client.get_account_id)
+
+    async def get_zone_id(self, domain: str) -> str:
+        """Coroutine version of :meth:`Cloudflare.get_zone_id`."""
+        return await self._run(self.client.get_zone_id, domain)
+
+    def iter_zones(self, name: Optional[str] = None) -> AsyncIterator[Dict]:
+        """Async iterator version of :meth:`Cloudflare.iter_zones`."""
+        return self._iterate(self.client.iter_zones(name))
+
+    async def list_zones(self) -> List[Dict]:
+        """Coroutine version of :meth:`Cloudflare.list_zones`."""
+        return await self._run(self.client.list_zones)
+
+    # -- tunnels -------------------------------------------------------------
+
+    async def create_tunnel(self, name: str) -> Tuple[str, Dict]:
+        """Coroutine version of :meth:`Cloudflare.create_tunnel`."""
+        return await self._run(self.client.create_tunnel, name)
+
+    async def configure_tunnel_route(self, tunnel_id: str, hostname: str, service: str) -> Dict:
+        """Coroutine version of :meth:`Cloudflare.configure_tunnel_route`."""
+        return await self._run(self.client.configure_tunnel_route, tunnel_id, hostname, service)
+
+    async def delete_tunnel(self, tunnel_id: str, force: bool = False) -> None:
+        """Coroutine version of :meth:`Cloudflare.delete_tunnel`."""
+        await self._run(self.client.delete_tunnel, tunnel_id, force)
+
+    async def list_tunnels(self) -> List[Dict]:
+        """Coroutine version of :meth:`Cloudflare.list_tunnels`."""
+        return await self._run(self.client.list_tunnels)
+
+    async def iter_tunnels(self, name: Optional[str] = None, include_deleted: bool = True) -> AsyncIterator[Dict]:
+        """Async iterator version of :meth:`Cloudflare.iter_tunnels`."""
+        iterator = await self._run(self.client.iter_tunnels, name, include_deleted)
+        async for tunnel in self._iterate(iterator):
+            yield tunnel
+
+    # -- DNS records ---------------------------------------------------------
+
+    async def create_dns_record(self, zone_id: str, subdomain: str, tunnel_id: str) -> str:
+        """Coroutine version of :meth:`Cloudflare.create_dns_record`."""
+        return await self._run(self.client.create_dns_record, zone_id, subdomain, tunnel_id)
+
+    async def find_existing_record(self, zone_id: str, subdomain: str, record_type: Optional[str] = None) -> Optional[Dict]:
+        """Coroutine version of :meth:`Cloudflare.find_existing_record`."""
+        return await self._run(self.client.find_existing_record, zone_id, subdomain, record_type)
+
+    async def update_dns_record(self, zone_id: str, record_id: str, changes: Dict) -> Dict:
+        """Coroutine version of :meth:`Cloudflare.update_dns_record`."""
+        return await self._run(self.client.update_dns_record, zone_id, record_id, changes)
+
+    async def apply_dns_batch(
+        self,
+        zone_id: str,
+        creates: Sequence[Dict] = (),
+        deletes: Sequence[Union[str, Dict]] = (),
+        patches: Sequence[Dict] = (),
+        batch_size: int = DNS_BATCH_SIZE
+    ) -> Dict[str, List]:
+        """Coroutine version of :meth:`Cloudflare.apply_dns_batch`."""
+        return await self._run(self.client.apply_dns_batch, zone_id, creates, deletes, patches, batch_size)
+
+    async def delete_dns_record(self, zone_id: str, record_id: str) -> None:
+        """Coroutine version of :meth:`Cloudflare.delete_dns_record`."""
+        await self._run(self.client.delete_dns_record, zone_id, record_id)
+
+    async def list_dns_records(self, zone_id: str, record_type: Optional[str] = None) -> List[Dict]:
+        """Coroutine version of :meth:`Cloudflare.list_dns_records`."""
+        return await self._run(self.client.list_dns_records, zone_id, record_type)
+
+    def iter_dns_records(
+        self,
+        zone_id: str,
+        record_type: Optional[str] = None,
+        name: Optional[str] = None,
+        content: Optional[str] = None,
+        per_page: Optional[int] = None
+    ) -> AsyncIterator[Dict]:
+        """Async iterator version of :meth:`Cloudflare.iter_dns_records`."""
+        return self._iterate(self.client.iter_dns_records(zone_id, record_type, name, content, per_page))
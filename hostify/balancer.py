@@ -0,0 +1,462 @@
+"""
+Backends, keep-alive connection pools and load balancing strategies for the
+local proxy.
+"""
+
+import asyncio
+import contextvars
+import itertools
+import random
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+from .proxy import (
+    Body,
+    Headers,
+    ProxyError,
+    Request,
+    Response,
+    UpstreamError,
+    body_from_headers,
+    encode_head,
+    parse_head,
+    response_has_body,
+    strip_hop_by_hop,
+    upgrade_headers,
+    write_body,
+)
+from .relay import STREAM_BUFFER
+
+
+# Backends already used for the current logical request. A stage that sends
+# the same request more than once (see hostify.hedge) sets this to a shared
+# list so that every copy lands on a different backend.
+attempted_backends: "contextvars.ContextVar[Optional[List[Backend]]]" = contextvars.ContextVar(
+    "attempted_backends",
+    default=None
+)
+
+# Timing breakdown of the current request. A stage that wants to know where
+# the time went (see hostify.metrics) sets this to a dict, and the backend
+# fills in its address, whether a pooled connection was reused and how many
+# seconds opening a new one took.
+request_timing: "contextvars.ContextVar[Optional[Dict[str, object]]]" = contextvars.ContextVar(
+    "request_timing",
+    default=None
+)
+
+
+class NoBackendError(ProxyError):
+    """Raised when no backend is available to take a request."""
+    pass
+
+
+class ConnectError(UpstreamError):
+    """Raised when a TCP connection to a backend cannot be opened."""
+    pass
+
+
+class _Connection:
+    """A reusable upstream connection."""
+
+    __slots__ = ("reader", "writer")
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    def usable(self) -> bool:
+        return not self.reader.at_eof() and not self.writer.is_closing()
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class Backend:
+    """
+    A single local origin server with its own keep-alive connection pool.
+
+    ``active`` counts requests whose response has not been fully relayed
+    yet and is what the least-connections strategies look at. ``healthy``
+    is maintained by :class:`hostify.health.HealthChecker`; unhealthy
+    backends are taken out of rotation.
+    """
+
+    def __init__(
+        self,
+        port: int,
+        host: str = "127.0.0.1",
+        max_idle: int = 32,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 60.0,
+        stream_buffer: int = STREAM_BUFFER
+    ):
+        """
+        Initialize backend.
+
+        Args:
+            port: Port the origin listens on
+            host: Host the origin listens on
+            max_idle: Idle keep-alive connections kept for reuse
+            connect_timeout: Seconds to wait for a TCP connection
+            read_timeout: Seconds to wait for the response head
+            stream_buffer: Bytes of a request body buffered for the origin
+                before reading from the client is paused
+        """
+        self.host = host
+        self.port = port
+        self.max_idle = max_idle
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.stream_buffer = stream_buffer
+
+        self.active = 0
+        self.requests = 0
+        self.failures = 0
+        self.connections_opened = 0
+        self.healthy = True
+        self._idle: Deque[_Connection] = deque()
+
+    @property
+    def address(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    async def _acquire(self) -> Tuple[_Connection, bool]:
+        """Return an idle connection if one is usable, else open a new one."""
+        while self._idle:
+            conn = self._idle.pop()
+            if conn.usable():
+                return conn, True
+            conn.close()
+
+        started = time.perf_counter()
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port),
+                self.connect_timeout
+            )
+        except (OSError, asyncio.TimeoutError) as e:
+            raise ConnectError(f"Cannot connect to {self.address}: {e}")
+
+        timing = request_timing.get()
+        if timing is not None:
+            timing["connect"] = timing.get("connect", 0.0) + time.perf_counter() - started
+        self.connections_opened += 1
+        writer.transport.set_write_buffer_limits(high=self.stream_buffer)
+        return _Connection(reader, writer), False
+
+    def _release(self, conn: _Connection, reusable: bool) -> None:
+        if reusable and conn.usable() and len(self._idle) < self.max_idle:
+            self._idle.append(conn)
+        else:
+            conn.close()
+
+    async def send(self, request: Request) -> Response:
+        """
+        Forward ``request`` to this backend.
+
+        An idle connection that turns out to be dead is retried once on a
+        fresh connection, as long as no part of the request body has been
+        sent yet.
+
+        Args:
+            request: Request to forward
+
+        Returns:
+            Streaming response; its body holds the connection until closed
+
+        Raises:
+            UpstreamError: If the backend cannot be reached
+        """
+        self.active += 1
+        self.requests += 1
+        try:
+            for attempt in range(2):
+                conn, reused = await self._acquire()
+                timing = request_timing.get()
+                if timing is not None:
+                    timing["backend"] = self.address
+                    timing["reused"] = reused
+                try:
+                    await self._write_request(conn, request)
+                    status, reason, headers = await asyncio.wait_for(
+                        self._read_head(conn.reader),
+                        self.read_timeout
+                    )
+                    break
+                except (ConnectionError, asyncio.IncompleteReadError, UpstreamError) as e:
+                    conn.close()
+                    if reused and attempt == 0 and request.body.length == 0:
+                        continue
+                    raise UpstreamError(f"Backend {self.address} failed: {e}")
+                except BaseException:
+                    conn.close()
+                    raise
+        except BaseException:
+            self.active -= 1
+            self.failures += 1
+            raise
+
+        if status == 101:
+            return self._upgraded(conn, reason, headers, request)
+
+        has_body = response_has_body(request.method, status)
+        keep_alive = "close" not in headers.tokens("connection") and not (
+            has_body
+            and "content-length" not in headers
+            and "chunked" not in headers.tokens("transfer-encoding")
+        )
+
+        def on_close(completed: bool) -> None:
+            self.active -= 1
+            self._release(conn, completed and keep_alive)
+
+        if has_body:
+            body = body_from_headers(headers, conn.reader, on_close, until_eof=True)
+        else:
+            body = Body.empty(on_close)
+
+        return Response(status, strip_hop_by_hop(headers), body, reason)
+
+    def _upgraded(self, conn: _Connection, reason: str, headers: Headers, request: Request) -> Response:
+        """Hand a connection that switched protocols over to the proxy."""
+        if not request.upgrade:
+            conn.close()
+            self.active -= 1
+            self.failures += 1
+            raise UpstreamError(f"Backend {self.address} switched protocols unasked")
+
+        # The stream counts as active until the proxy stops relaying it
+        def on_close(completed: bool) -> None:
+            self.active -= 1
+            conn.close()
+
+        response = Response(101, upgrade_headers(headers, headers.get("upgrade")), Body.empty(on_close), reason)
+        response.upgraded = (conn.reader, conn.writer)
+        return response
+
+    async def _write_request(self, conn: _Connection, request: Request) -> None:
+        headers = upgrade_headers(request.headers, request.upgrade)
+        headers.remove("content-length")
+        headers.remove("expect")
+
+        chunked = False
+        if request.body.length is not None:
+            if request.body.length or request.method in ("POST", "PUT", "PATCH"):
+                headers.set("Content-Length", str(request.body.length))
+        else:
+            headers.set("Transfer-Encoding", "chunked")
+            chunked = True
+        if not request.upgrade:
+            headers.set("Connection", "keep-alive")
+
+        conn.writer.write(encode_head(f"{request.method} {request.target} HTTP/1.1", headers))
+        if request.body.length == 0:
+            await conn.writer.drain()
+        else:
+            await write_body(conn.writer, request.body, chunked)
+
+    async def _read_head(self, reader: asyncio.StreamReader) -> Tuple[int, str, Headers]:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            start_line, headers = parse_head(head[:-4])
+            parts = start_line.split(" ", 2)
+            try:
+                status = int(parts[1])
+            except (IndexError, ValueError):
+                raise UpstreamError(f"Malformed status line: {start_line!r}")
+
+            # Interim responses (100 Continue etc.) are swallowed
+            if 100 <= status < 200 and status != 101:
+                continue
+            reason = parts[2] if len(parts) > 2 else ""
+            return status, reason, headers
+
+    async def close(self) -> None:
+        """Close all idle connections."""
+        while self._idle:
+            self._idle.pop().close()
+
+    def __repr__(self) -> str:
+        state = "" if self.healthy else " unhealthy"
+        return f"<Backend {self.address} active={self.active}{state}>"
+
+
+# ---------------------------------------------------------------------------
+# Strategies
+# ---------------------------------------------------------------------------
+
+class RoundRobin:
+    """Hand requests to backends in turn."""
+
+    name = "round_robin"
+
+    def __init__(self):
+        self._counter = itertools.count()
+
+    def select(self, backends: Sequence[Backend]) -> Backend:
+        return backends[next(self._counter) % len(backends)]
+
+
+class LeastConnections:
+    """Pick the backend with the fewest in-flight requests."""
+
+    name = "least_connections"
+
+    def __init__(self):
+        self._counter = itertools.count()
+
+    def select(self, backends: Sequence[Backend]) -> Backend:
+        # Start the scan at a rotating offset so ties are spread out
+        offset = next(self._counter) % len(backends)
+        ordered = list(backends[offset:]) + list(backends[:offset])
+        return min(ordered, key=lambda b: b.active)
+
+
+class PowerOfTwoChoices:
+    """Sample two backends at random and pick the less loaded one."""
+
+    name = "power_of_two"
+
+    def __init__(self, rng: Optional[random.Random] = None):
+        self._random = rng or random.Random()
+
+    def select(self, backends: Sequence[Backend]) -> Backend:
+        if len(backends) == 1:
+            return backends[0]
+        first, second = self._random.sample(list(backends), 2)
+        return first if first.active <= second.active else second
+
+
+STRATEGIES = {
+    "round_robin": RoundRobin,
+    "least_connections": LeastConnections,
+    "power_of_two": PowerOfTwoChoices,
+    "p2c": PowerOfTwoChoices,
+}
+
+
+def get_strategy(name: str):
+    """
+    Create a balancing strategy by name.
+
+    Args:
+        name: One of ``round_robin``, ``least_connections``, ``power_of_two``
+
+    Returns:
+        Strategy instance
+
+    Raises:
+        ValueError: If the name is unknown
+    """
+    try:
+        return STRATEGIES[name]()
+    except KeyError:
+        raise ValueError(
+            f"Unknown balancing strategy '{name}'. "
+            f"Choose from: {', '.join(sorted(STRATEGIES))}"
+        )
+
+
+class BackendPool:
+    """
+    A set of interchangeable backends behind one balancing strategy.
+    """
+
+    def __init__(self, backends: Sequence[Backend], strategy: str = "round_robin"):
+        """
+        Initialize pool.
+
+        Args:
+            backends: Backends to balance across
+            strategy: Balancing strategy name (see :data:`STRATEGIES`)
+        """
+        if not backends:
+            raise ValueError("At least one backend is required")
+
+        self.backends: List[Backend] = list(backends)
+        self.strategy = get_strategy(strategy)
+
+    @classmethod
+    def from_ports(cls, ports: Sequence[int], strategy: str = "round_robin", **kwargs) -> "BackendPool":
+        """Build a pool of localhost backends from a list of ports."""
+        return cls([Backend(port, **kwargs) for port in ports], strategy)
+
+    def available(self) -> List[Backend]:
+        """
+        Backends that may currently receive traffic.
+
+        Unhealthy backends are left out, unless every backend is unhealthy:
+        then all of them are tried rather than failing every request.
+        """
+        healthy = [b for b in self.backends if b.healthy]
+        return healthy or self.backends
+
+    def choose(self, exclude: Sequence[Backend] = ()) -> Backend:
+        """
+        Pick a backend for the next request.
+
+        Raises:
+            NoBackendError: If every backend is excluded or unavailable
+        """
+        candidates = [b for b in self.available() if b not in exclude]
+        if not candidates:
+            raise NoBackendError("No backend available")
+        return self.strategy.select(candidates)
+
+    async def send(self, request: Request) -> Response:
+        """
+        Forward ``request`` to a backend chosen by the strategy.
+
+        If a backend refuses the connection, the request is offered to the
+        next one. Backends listed in :data:`attempted_backends` are skipped.
+        """
+        tried: List[Backend] = []
+        attempted = attempted_backends.get()
+        while True:
+            backend = self.choose(exclude=tried + (attempted or []))
+            if attempted is not None:
+                attempted.append(backend)
+            try:
+                return await backend.send(request)
+            except ConnectError:
+                # Nothing was sent, so the next backend can take it as-is
+                tried.append(backend)
+                if len(tried) >= len(self.available()):
+                    raise
+
+    async def replace(self, backends: Sequence[Backend], drain_timeout: float = 30.0) -> bool:
+        """
+        Atomically move all new traffic to ``backends`` and drain the rest.
+
+        Requests already running on a retired backend are allowed to finish;
+        its idle connections are closed once it has no requests in flight or
+        ``drain_timeout`` has passed.
+
+        Args:
+            backends: The new set of backends
+            drain_timeout: Seconds to wait for retired backends to go idle
+
+        Returns:
+            True if every retired backend drained in time
+        """
+        if not backends:
+            raise ValueError("At least one backend is required")
+
+        retiring = [b for b in self.backends if b not in backends]
+        self.backends = list(backends)
+
+        deadline = time.monotonic() + drain_timeout
+        while any(b.active for b in retiring) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+        drained = not any(b.active for b in retiring)
+        for backend in retiring:
+            await backend.close()
+        return drained
+
+    async def close(self) -> None:
+        """Close idle connections on every backend."""
+        for backend in self.backends:
+            await backend.close()
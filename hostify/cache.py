@@ -0,0 +1,625 @@
+"""
+HTTP response cache stage for the local proxy.
+
+Responses the origin marks as cacheable are kept in a byte-budgeted memory
+tier and, optionally, a disk tier under ``~/.hostify/cache``. Freshness
+follows ``Cache-Control`` (``max-age``, ``s-maxage``, ``no-cache``,
+``no-store``, ``private``, ``stale-while-revalidate``) and ``Expires``.
+Responses without an explicit lifetime are never cached, so dynamic pages
+keep working exactly as before.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+
+from .proxy import Body, Headers, Request, Response
+
+
+# Status codes that may be stored when the origin gives them a lifetime
+CACHEABLE_STATUSES = {200, 203, 204, 300, 301, 308, 404, 405, 410, 414, 501}
+
+# Rough per-entry bookkeeping cost added to the body size
+ENTRY_OVERHEAD = 256
+
+
+def parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    """
+    Parse a ``Cache-Control`` header.
+
+    Args:
+        value: Header value (may be None)
+
+    Returns:
+        Dict mapping lower-cased directives to their argument (or None)
+    """
+    directives: Dict[str, Optional[str]] = {}
+    if not value:
+        return directives
+
+    for part in value.split(","):
+        name, sep, argument = part.strip().partition("=")
+        if not name:
+            continue
+        directives[name.strip().lower()] = argument.strip().strip('"') if sep else None
+    return directives
+
+
+def _seconds(directives: Dict[str, Optional[str]], name: str) -> Optional[int]:
+    try:
+        return max(0, int(directives[name]))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _http_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def freshness_lifetime(headers: Headers) -> Optional[int]:
+    """
+    Seconds a response stays fresh in a shared cache, or None if the
+    response does not say.
+    """
+    directives = parse_cache_control(headers.get("cache-control"))
+    for name in ("s-maxage", "max-age"):
+        seconds = _seconds(directives, name)
+        if seconds is not None:
+            return seconds
+
+    expires = headers.get("expires")
+    if expires is not None:
+        expires_at = _http_date(expires)
+        if expires_at is None:
+            return 0  # invalid Expires means "already expired"
+        date = _http_date(headers.get("date")) or time.time()
+        return max(0, int(expires_at - date))
+
+    return None
+
+
+class CacheEntry:
+    """A stored response plus what is needed to judge its freshness."""
+
+    def __init__(
+        self,
+        key: str,
+        vary: Tuple[str, ...],
+        status: int,
+        reason: str,
+        headers: Headers,
+        body: bytes,
+        stored_at: Optional[float] = None
+    ):
+        self.key = key
+        self.vary = vary
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self.stored_at = stored_at if stored_at is not None else time.time()
+        self.refresh(headers)
+
+    def refresh(self, headers: Headers) -> None:
+        """Recompute freshness from (possibly updated) response headers."""
+        directives = parse_cache_control(headers.get("cache-control"))
+        lifetime = freshness_lifetime(headers) or 0
+        if "no-cache" in directives:
+            lifetime = 0
+
+        try:
+            self.initial_age = max(0, int(headers.get("age", "0")))
+        except ValueError:
+            self.initial_age = 0
+        self.lifetime = lifetime
+        self.stale_while_revalidate = _seconds(directives, "stale-while-revalidate") or 0
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + ENTRY_OVERHEAD + sum(len(k) + len(v) for k, v in self.headers)
+
+    def age(self, now: Optional[float] = None) -> float:
+        return self.initial_age + max(0.0, (now or time.time()) - self.stored_at)
+
+    def to_response(self, age: float, state: str) -> Response:
+        headers = self.headers.copy()
+        headers.set("Age", str(int(age)))
+        headers.set("Content-Length", str(len(self.body)))
+        headers.set("X-Cache", state)
+        return Response(self.status, headers, Body.from_bytes(self.body), self.reason)
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "key": self.key,
+            "vary": list(self.vary),
+            "status": self.status,
+            "reason": self.reason,
+            "headers": self.headers.items(),
+            "stored_at": self.stored_at,
+        })
+
+    @classmethod
+    def from_json(cls, meta: str, body: bytes) -> "CacheEntry":
+        data = json.loads(meta)
+        return cls(
+            data["key"],
+            tuple(data["vary"]),
+            data["status"],
+            data["reason"],
+            Headers(tuple(item) for item in data["headers"]),
+            body,
+            data["stored_at"]
+        )
+
+
+class DiskTier:
+    """
+    Second cache tier: one file per entry (JSON metadata line + body).
+
+    Entries land here when they are evicted from memory. File I/O runs in
+    the default executor so the proxy loop never blocks on the disk.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = os.path.expanduser(directory)
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, full_key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(full_key.encode("utf-8")).hexdigest())
+
+    def load_index(self) -> List[Tuple[str, Tuple[str, ...]]]:
+        """
+        Scan the cache directory.
+
+        Returns:
+            List of (key, vary names) for every entry found on disk
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".tmp"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                files.append((os.path.getmtime(path), name, os.path.getsize(path)))
+            except OSError:
+                continue
+
+        for _, name, size in sorted(files):
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, "rb") as f:
+                    meta = json.loads(f.readline())
+            except (OSError, ValueError):
+                continue
+            found.append((meta["key"], tuple(meta["vary"])))
+            self._index[name] = size
+            self.size += size
+
+        return found
+
+    def write(self, full_key: str, entry: CacheEntry) -> None:
+        path = self._path(full_key)
+        name = os.path.basename(path)
+        data = entry.to_json().encode("utf-8") + b"\n" + entry.body
+        if len(data) > self.max_bytes:
+            return
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self.size -= self._index.pop(name, 0)
+            self._index[name] = len(data)
+            self.size += len(data)
+
+            evicted = []
+            while self.size > self.max_bytes and self._index:
+                old_name, old_size = self._index.popitem(last=False)
+                self.size -= old_size
+                evicted.append(old_name)
+
+        for old_name in evicted:
+            try:
+                os.remove(os.path.join(self.directory, old_name))
+            except OSError:
+                pass
+
+    def read(self, full_key: str) -> Optional[CacheEntry]:
+        path = self._path(full_key)
+        name = os.path.basename(path)
+        with self._lock:
+            if name not in self._index:
+                return None
+            self._index.move_to_end(name)
+        try:
+            with open(path, "rb") as f:
+                meta = f.readline()
+                body = f.read()
+        except OSError:
+            with self._lock:
+                self.size -= self._index.pop(name, 0)
+            return None
+
+        return CacheEntry.from_json(meta.decode("utf-8"), body)
+
+    def remove(self, full_key: str) -> None:
+        path = self._path(full_key)
+        with self._lock:
+            size = self._index.pop(os.path.basename(path), None)
+            if size is not None:
+                self.size -= size
+        if size is not None:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class ResponseCache:
+    """
+    Caching stage for :class:`hostify.proxy.ReverseProxy`.
+
+    Only GET and HEAD requests without ``Authorization`` are looked up.
+    Responses with ``Set-Cookie``, ``Vary: *``, ``private`` or ``no-store``
+    are never stored. Served responses carry ``Age`` and an ``X-Cache``
+    header (``HIT``, ``STALE``, ``REVALIDATED`` or ``MISS``).
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_object_size: int = 8 * 1024 * 1024,
+        disk: bool = False,
+        disk_dir: str = "~/.hostify/cache",
+        disk_max_bytes: int = 1024 * 1024 * 1024
+    ):
+        """
+        Initialize cache.
+
+        Args:
+            max_bytes: Memory budget for stored responses
+            max_object_size: Largest single response that will be stored
+            disk: Keep entries evicted from memory on disk
+            disk_dir: Directory for the disk tier
+            disk_max_bytes: Disk budget for stored responses
+        """
+        self.max_bytes = max_bytes
+        self.max_object_size = min(max_object_size, max_bytes)
+        self.disk = DiskTier(disk_dir, disk_max_bytes) if disk else None
+
+        self.size = 0
+        self._memory: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._vary: Dict[str, Tuple[str, ...]] = {}
+        self._variants: Dict[str, int] = {}
+        self._revalidating: set = set()
+        self._tasks: set = set()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.background_revalidations = 0
+        self.bytes_served = 0
+
+    # -- stage protocol ----------------------------------------------------
+
+    async def start(self) -> None:
+        if self.disk:
+            loop = asyncio.get_running_loop()
+            for key, vary in await loop.run_in_executor(None, self.disk.load_index):
+                self._vary[key] = vary
+
+    async def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+
+    async def handle(self, request: Request, call_next) -> Response:
+        if not self._request_cacheable(request):
+            self.bypassed += 1
+            return await call_next(request)
+
+        key = self.primary_key(request)
+        full_key = self._full_key(key, request)
+        entry = await self._lookup(full_key) if full_key else None
+
+        if entry is None:
+            self.misses += 1
+            response = await call_next(request)
+            return self._store_on_the_way(key, request, response)
+
+        now = time.time()
+        age = entry.age(now)
+        directives = parse_cache_control(request.headers.get("cache-control"))
+
+        if age < entry.lifetime and "no-cache" not in directives:
+            self.hits += 1
+            return self._serve(entry, request, age, "HIT")
+
+        if age < entry.lifetime + entry.stale_while_revalidate and "no-cache" not in directives:
+            self.stale_hits += 1
+            self._revalidate_in_background(key, full_key, entry, request, call_next)
+            return self._serve(entry, request, age, "STALE")
+
+        response = await call_next(self._conditional(request, entry))
+        if response.status == 304:
+            await response.aclose()
+            self._refresh(full_key, entry, response.headers)
+            self.revalidated += 1
+            return self._serve(entry, request, entry.age(), "REVALIDATED")
+
+        self.misses += 1
+        return self._store_on_the_way(key, request, response)
+
+    def summary(self) -> str:
+        return (
+            f"Cache: {self.hit_ratio * 100:.1f}% hit ratio "
+            f"(hits={self.hits}, stale={self.stale_hits}, revalidated={self.revalidated}, "
+            f"misses={self.misses}), {self.bytes_served / (1024 * 1024):.1f} MB served from cache"
+        )
+
+    # -- statistics --------------------------------------------------------
+
+    @property
+    def lookups(self) -> int:
+        return self.hits + self.stale_hits + self.revalidated + self.misses
+
+    @property
+    def hit_ratio(self) -> float:
+        """Share of cacheable requests answered without origin work."""
+        return (self.hits + self.stale_hits) / self.lookups if self.lookups else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_ratio": self.hit_ratio,
+            "bytes_served": self.bytes_served,
+            "memory_bytes": self.size,
+            "memory_entries": len(self._memory),
+            "disk_bytes": self.disk.size if self.disk else 0,
+        }
+
+    # -- keys --------------------------------------------------------------
+
+    @staticmethod
+    def primary_key(request: Request) -> str:
+        return f"{request.headers.get('host', '')}{request.target}"
+
+    @staticmethod
+    def variant(request: Request, names: Tuple[str, ...]) -> str:
+        return "\n".join(
+            f"{name}={' '.join((request.headers.get(name) or '').lower().split())}"
+            for name in names
+        )
+
+    def _full_key(self, key: str, request: Request) -> Optional[str]:
+        names = self._vary.get(key)
+        if names is None:
+            return None
+        return f"{key}\n{self.variant(request, names)}"
+
+    # -- policy ------------------------------------------------------------
+
+    @staticmethod
+    def _request_cacheable(request: Request) -> bool:
+        if request.method not in ("GET", "HEAD") or request.upgrade:
+            return False
+        if "authorization" in request.headers:
+            return False
+        return "no-store" not in parse_cache_control(request.headers.get("cache-control"))
+
+    @staticmethod
+    def _response_cacheable(response: Response) -> bool:
+        if response.status not in CACHEABLE_STATUSES:
+            return False
+        if "set-cookie" in response.headers or "*" in response.headers.tokens("vary"):
+            return False
+
+        directives = parse_cache_control(response.headers.get("cache-control"))
+        if "no-store" in directives or "private" in directives:
+            return False
+
+        has_validator = "etag" in response.headers or "last-modified" in response.headers
+        if "no-cache" in directives:
+            return has_validator
+        lifetime = freshness_lifetime(response.headers)
+        if lifetime is None:
+            return False
+        return lifetime > 0 or has_validator or bool(_seconds(directives, "stale-while-revalidate"))
+
+    # -- tiers -------------------------------------------------------------
+
+    async def _lookup(self, full_key: str) -> Optional[CacheEntry]:
+        entry = self._memory.get(full_key)
+        if entry is not None:
+            self._memory.move_to_end(full_key)
+            return entry
+
+        if self.disk:
+            loop = asyncio.get_running_loop()
+            entry = await loop.run_in_executor(None, self.disk.read, full_key)
+            if entry is not None:
+                self._put_memory(full_key, entry)
+        return entry
+
+    def _put_memory(self, full_key: str, entry: CacheEntry) -> None:
+        old = self._memory.pop(full_key, None)
+        if old is not None:
+            self.size -= old.size
+        else:
+            self._variants[entry.key] = self._variants.get(entry.key, 0) + 1
+
+        self._memory[full_key] = entry
+        self.size += entry.size
+
+        while self.size > self.max_bytes and self._memory:
+            evicted_key, evicted = self._memory.popitem(last=False)
+            self._drop_memory(evicted)
+            if self.disk:
+                self._spawn(self._to_disk(evicted_key, evicted))
+
+    def _drop_memory(self, entry: CacheEntry) -> None:
+        self.size -= entry.size
+        remaining = self._variants.get(entry.key, 1) - 1
+        if remaining > 0:
+            self._variants[entry.key] = remaining
+        else:
+            self._variants.pop(entry.key, None)
+            if not self.disk:
+                # Without a disk tier nothing else can answer for this key
+                self._vary.pop(entry.key, None)
+
+    async def _to_disk(self, full_key: str, entry: CacheEntry) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.disk.write, full_key, entry)
+
+    def _store(self, key: str, request: Request, response: Response, body: bytes) -> None:
+        vary = tuple(sorted(set(response.headers.tokens("vary"))))
+        if self._vary.get(key, vary) != vary:
+            self._purge(key)
+        self._vary[key] = vary
+
+        headers = response.headers.copy()
+        for name in ("content-length", "age", "x-cache"):
+            headers.remove(name)
+
+        full_key = f"{key}\n{self.variant(request, vary)}"
+        self._put_memory(full_key, CacheEntry(key, vary, response.status, response.reason, headers, body))
+
+    def _purge(self, key: str) -> None:
+        prefix = key + "\n"
+        for full_key in [k for k in self._memory if k.startswith(prefix)]:
+            self._drop_memory(self._memory.pop(full_key))
+            if self.disk:
+                self.disk.remove(full_key)
+
+    # -- helpers -----------------------------------------------------------
+
+    def _serve(self, entry: CacheEntry, request: Request, age: float, state: str) -> Response:
+        etag = entry.headers.get("etag")
+        if etag and etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+            response = entry.to_response(age, state)
+            response.status, response.reason = 304, "Not Modified"
+            response.body = Body.empty()
+            return response
+
+        if request.method != "HEAD":
+            self.bytes_served += len(entry.body)
+        return entry.to_response(age, state)
+
+    def _store_on_the_way(self, key: str, request: Request, response: Response) -> Response:
+        """Relay ``response`` to the client and store a copy if allowed."""
+        if request.method != "GET" or not self._response_cacheable(response):
+            return response
+
+        if response.body.length is not None and response.body.length > self.max_object_size:
+            return response
+
+        source = response.body
+        limit = self.max_object_size
+
+        async def tee():
+            chunks: Optional[List[bytes]] = []
+            size = 0
+            async for chunk in source:
+                if chunks is not None:
+                    size += len(chunk)
+                    if size > limit:
+                        chunks = None
+                    else:
+                        chunks.append(chunk)
+                yield chunk
+            if chunks is not None:
+                self._store(key, request, response, b"".join(chunks))
+
+        response.body = Body(tee(), source.length, source=source)
+        response.headers.set("X-Cache", "MISS")
+        return response
+
+    @staticmethod
+    def _conditional(request: Request, entry: CacheEntry) -> Request:
+        headers = request.headers.copy()
+        etag = entry.headers.get("etag")
+        last_modified = entry.headers.get("last-modified")
+        if etag:
+            headers.set("If-None-Match", etag)
+        if last_modified:
+            headers.set("If-Modified-Since", last_modified)
+        return Request(request.method, request.target, headers, Body.empty(), request.version, request.client)
+
+    def _refresh(self, full_key: str, entry: CacheEntry, headers: Headers) -> None:
+        size = entry.size
+        for name in ("cache-control", "expires", "date", "etag", "last-modified"):
+            value = headers.get(name)
+            if value is not None:
+                entry.headers.set(name, value)
+        entry.headers.remove("age")
+        entry.stored_at = time.time()
+        entry.refresh(entry.headers)
+        # The new headers change the entry's size; keep the total in step
+        if self._memory.get(full_key) is entry:
+            self.size += entry.size - size
+
+    def _revalidate_in_background(
+        self,
+        key: str,
+        full_key: str,
+        entry: CacheEntry,
+        request: Request,
+        call_next
+    ) -> None:
+        if full_key in self._revalidating:
+            return
+        self._revalidating.add(full_key)
+        replay = self._conditional(request, entry)
+        replay.method = "GET"
+        self._spawn(self._revalidate(key, full_key, entry, replay, call_next))
+
+    async def _revalidate(
+        self,
+        key: str,
+        full_key: str,
+        entry: CacheEntry,
+        request: Request,
+        call_next
+    ) -> None:
+        self.background_revalidations += 1
+        try:
+            response = await call_next(request)
+            if response.status == 304:
+                await response.aclose()
+                self._refresh(full_key, entry, response.headers)
+            else:
+                response = self._store_on_the_way(key, request, response)
+                await response.body.read()
+        except Exception:
+            pass  # keep serving the stale copy; the next miss will retry
+        finally:
+            self._revalidating.discard(full_key)
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
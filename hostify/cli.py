@@ -13,6 +13,7 @@ import signal
 from pathlib import Path
 from typing import Optional
 
+from .admin import AdminError, call_admin
 from .host import Host
 from . import __version__
 
@@ -54,13 +55,14 @@ class HostifyCLI:
             sys.exit(1)
         return token
     
-    def host_static(self, directory: str, domain: str):
+    def host_static(self, directory: str, domain: str, trace: Optional[str] = None):
         """
         Host a static site from a directory.
         
         Args:
             directory: Path to the directory containing static files
             domain: Domain name to host on (e.g., mysite.example.com)
+            trace: Path to write a Chrome trace of provisioning and cleanup to
         """
         # Validate directory
         dir_path = Path(directory).resolve()
@@ -85,7 +87,8 @@ class HostifyCLI:
             self.host = Host(
                 path=str(dir_path),
                 domain=domain,
-                api_token=api_token
+                api_token=api_token,
+                trace=trace
             )
             self.host.serve()
             
@@ -95,13 +98,16 @@ class HostifyCLI:
             print(f"\n[!] Error: {e}")
             sys.exit(1)
     
-    def host_port(self, port: int, domain: str):
+    def host_port(self, port: int, domain: str, blue_green: bool = False, trace: Optional[str] = None):
         """
         Host an existing server running on a port.
         
         Args:
             port: Port number where the server is running
             domain: Domain name to host on (e.g., app.example.com)
+            blue_green: Keep a local proxy in front so the origin can be
+                switched later with 'hostify switch'
+            trace: Path to write a Chrome trace of provisioning and cleanup to
         """
         # Validate port
         try:
@@ -125,7 +131,9 @@ class HostifyCLI:
             self.host = Host(
                 port=port_num,
                 domain=domain,
-                api_token=api_token
+                api_token=api_token,
+                blue_green=blue_green,
+                trace=trace
             )
             self.host.serve()
             
@@ -135,6 +143,41 @@ class HostifyCLI:
             print(f"\n[!] Error: {e}")
             sys.exit(1)
     
+    def switch_origin(self, domain: str, port: int, health_path: str = "/", drain_timeout: float = 30.0):
+        """
+        Move a running 'hostify port --blue-green' process to a new origin port.
+        
+        Args:
+            domain: Domain the running process serves
+            port: Port of the new origin
+            health_path: Path probed on the new origin before switching
+            drain_timeout: Seconds to let the old origin finish its requests
+        """
+        if not (1 <= port <= 65535):
+            print(f"[!] Error: Invalid port number - Port must be between 1 and 65535")
+            sys.exit(1)
+        
+        print(f"\n[*] Switching {domain} to port {port}...")
+        
+        try:
+            result = call_admin(
+                domain,
+                "POST",
+                "/switch",
+                {"port": port, "health_path": health_path, "drain_timeout": drain_timeout},
+                timeout=drain_timeout + 60
+            )
+        except AdminError as e:
+            print(f"[!] Error: {e}")
+            sys.exit(1)
+        
+        previous = ", ".join(map(str, result.get("previous_ports", [])))
+        print(f"[+] Traffic moved from port {previous} to port {port}")
+        if result.get("drained"):
+            print(f"[+] Old origin drained, safe to stop")
+        else:
+            print(f"[!] Old origin still had requests in flight after {drain_timeout:.0f}s")
+    
     def show_version(self):
         """Display version information."""
         print(f"Hostify v{__version__}")
@@ -190,6 +233,47 @@ def create_parser() -> argparse.ArgumentParser:
         "domain",
         help="Domain name to host on (e.g., app.example.com)"
     )
+    port_parser.add_argument(
+        "--blue-green",
+        action="store_true",
+        help="Keep a local proxy in front of the server so it can be replaced with 'hostify switch'"
+    )
+    
+    for hosting_parser in (static_parser, port_parser):
+        hosting_parser.add_argument(
+            "--trace",
+            metavar="FILE",
+            help="Write the timing of every startup step and API call to FILE "
+                 "as Chrome trace-event JSON (open in chrome://tracing or ui.perfetto.dev)"
+        )
+    
+    # Origin switchover command
+    switch_parser = subparsers.add_parser(
+        "switch",
+        help="Move a running site to a new local port without downtime",
+        description="Health-check a new origin and move traffic to it from a running "
+                    "'hostify port --blue-green' process"
+    )
+    switch_parser.add_argument(
+        "domain",
+        help="Domain of the running site (e.g., app.example.com)"
+    )
+    switch_parser.add_argument(
+        "port",
+        type=int,
+        help="Port where the new version of your server is running"
+    )
+    switch_parser.add_argument(
+        "--health-path",
+        default="/",
+        help="Path that must answer before traffic is switched (default: /)"
+    )
+    switch_parser.add_argument(
+        "--drain-timeout",
+        type=float,
+        default=30.0,
+        help="Seconds to let the old server finish in-flight requests (default: 30)"
+    )
     
     # Version command
     subparsers.add_parser(
@@ -216,9 +300,11 @@ def main():
     # Execute command
     try:
         if args.command == "static":
-            cli.host_static(args.directory, args.domain)
+            cli.host_static(args.directory, args.domain, args.trace)
         elif args.command == "port":
-            cli.host_port(args.port, args.domain)
+            cli.host_port(args.port, args.domain, args.blue_green, args.trace)
+        elif args.command == "switch":
+            cli.switch_origin(args.domain, args.port, args.health_path, args.drain_timeout)
         elif args.command == "version":
             cli.show_version()
     except KeyboardInterrupt:
@@ -4,13 +4,43 @@ Cloudflare API wrapper for tunnel and DNS management.
 
 import os
 import json
+import threading
+import time
 import requests
-from typing import Dict, List, Optional, Tuple
+from contextlib import nullcontext
+from requests.adapters import HTTPAdapter
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .idcache import DEFAULT_PATH, IDCache
+from .throttle import ACCOUNT_RATE_LIMIT, backoff_delay, retry_after, shared_bucket
+from .trace import Tracer
+from .zones import ZoneIndex
+
+
+# API error codes meaning an account or zone ID in the URL is not (or no
+# longer) valid for this token
+STALE_ID_CODES = frozenset((1001, 1003, 7000, 7003, 9109, 10000))
+
+# Calls that can be repeated without side effects if an attempt failed
+# after the request was sent
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE"))
+
+# Transient server errors worth retrying
+RETRY_STATUSES = frozenset((500, 502, 503, 504))
+
+# Most record changes the batch DNS endpoint accepts in one call on the
+# Free plan (paid plans allow more)
+DNS_BATCH_SIZE = 200
 
 
 class CloudflareAPIError(Exception):
     """Custom exception for Cloudflare API errors."""
-    pass
+    
+    def __init__(self, message: str, status: Optional[int] = None, codes: Sequence[int] = ()):
+        super().__init__(message)
+        # HTTP status and Cloudflare error codes, when the API answered
+        self.status = status
+        self.codes = tuple(codes)
 
 
 class Cloudflare:
@@ -25,12 +55,61 @@ class Cloudflare:
     
     BASE_URL = "https://api.cloudflare.com/client/v4"
     
-    def __init__(self, api_token: Optional[str] = None):
+    # Items fetched per request by the paginated list calls
+    PAGE_SIZE = 100
+    
+    def __init__(
+        self,
+        api_token: Optional[str] = None,
+        base_url: Optional[str] = None,
+        pool_size: int = 10,
+        timeout: Union[float, Tuple[float, float]] = (10.0, 30.0),
+        id_cache: bool = True,
+        id_cache_path: str = DEFAULT_PATH,
+        id_cache_ttl: float = 7 * 24 * 3600,
+        max_retries: int = 4,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        rate_limit: Optional[Tuple[float, int]] = ACCOUNT_RATE_LIMIT,
+        tracer: Optional[Tracer] = None
+    ):
         """
         Initialize Cloudflare API client.
         
+        All calls share one keep-alive connection pool, so only the first
+        request to the API pays for the TCP and TLS handshakes. The client
+        can be used from several threads at once; up to ``pool_size``
+        connections are kept open.
+        
+        Account and zone IDs are cached on disk (``id_cache_path``), so
+        later runs skip those lookups. An entry is dropped as soon as a
+        call using it fails with an invalid-ID error.
+        
+        Calls answered with ``429`` are retried after ``Retry-After``, and
+        idempotent calls (GET, PUT, DELETE) also after connection errors
+        and ``5xx`` responses, with jittered exponential backoff. A token
+        bucket shared by all clients using the same token keeps the
+        process below Cloudflare's limit of 1200 requests per five minutes.
+        
         Args:
             api_token: Cloudflare API token. If None, reads from CF_API_TOKEN or CLOUDFLARE_API_TOKEN env var.
+            base_url: API root URL (default: the ``CLOUDFLARE_API_BASE_URL``
+                environment variable, else ``BASE_URL``), e.g. that of a
+                :class:`hostify.mock_api.MockCloudflareAPI`
+            pool_size: Most idle connections kept open to the API
+            timeout: Seconds to wait for a connection and for a response,
+                as one number or a (connect, read) tuple
+            id_cache: Cache account and zone IDs on disk across runs
+            id_cache_path: Cache file, shared by all hostify processes
+            id_cache_ttl: Seconds a cached ID is trusted
+            max_retries: Retries per call after the first attempt
+            backoff: Base delay in seconds, doubled with every retry
+            max_backoff: Longest delay between retries (unless the API
+                asks for longer with ``Retry-After``)
+            rate_limit: (requests per second, burst) for the client-side
+                limiter, or None to disable it
+            tracer: Records every call as a span (category "api") with its
+                endpoint, status and retries
         
         Raises:
             CloudflareAPIError: If API token is not provided.
@@ -42,9 +121,56 @@ class Cloudflare:
                 "environment variable or pass api_token parameter."
             )
         
+        if pool_size < 1:
+            raise ValueError("pool_size must be at least 1")
+        if max_retries < 0:
+            raise ValueError("max_retries must not be negative")
+        self.base_url = (base_url or os.getenv("CLOUDFLARE_API_BASE_URL") or self.BASE_URL).rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(self.get_headers())
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        
         # Cache for account and zone IDs
         self._account_id = None
         self._zone_cache = {}
+        self._zone_index: Optional[ZoneIndex] = None
+        # Threads resolving the account or zones at once share one lookup
+        self._resolve_lock = threading.Lock()
+        self.id_cache = IDCache(id_cache_path, id_cache_ttl, self.api_token) if id_cache else None
+        
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.rate_limiter = shared_bucket(self.api_token, *rate_limit) if rate_limit else None
+        
+        self.retries = 0
+        # 429 responses received / calls held back by the limiter
+        self.rate_limited = 0
+        self.throttled = 0
+        self.throttle_wait = 0.0
+        self.tracer = tracer
+    
+    def close(self) -> None:
+        """Close the pooled connections to the API."""
+        self.session.close()
+    
+    def stats(self) -> Dict[str, float]:
+        """Retry and throttling counters."""
+        return {
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "throttled": self.throttled,
+            "throttle_wait": self.throttle_wait,
+        }
+    
+    def __enter__(self) -> "Cloudflare":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
     
     def get_headers(self) -> Dict[str, str]:
         """
@@ -73,23 +199,114 @@ class Cloudflare:
         Raises:
             CloudflareAPIError: If request fails
         """
-        url = f"{self.BASE_URL}/{endpoint.lstrip('/')}"
-        kwargs.setdefault("headers", self.get_headers())
-        
+        data = self._send(method, endpoint, **kwargs)
+        return data.get("result", data)
+    
+    def _send(self, method: str, endpoint: str, **kwargs) -> Dict:
+        """Make HTTP request, retrying if worthwhile, and return the whole response envelope."""
+        url = f"{self.base_url}/{endpoint.lstrip('/')}"
+        kwargs.setdefault("timeout", self.timeout)
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        
+        span = nullcontext({})
+        if self.tracer:
+            span = self.tracer.span(f"{method.upper()} {endpoint}", "api", method=method.upper(), endpoint=endpoint)
+        
+        with span as details:
+            attempt = 0
+            while True:
+                if self.rate_limiter:
+                    waited = self.rate_limiter.acquire()
+                    if waited:
+                        self.throttled += 1
+                        self.throttle_wait += waited
+                        details["throttle_wait"] = details.get("throttle_wait", 0.0) + waited
+                
+                status = None
+                delay = None
+                details["retries"] = attempt
+                try:
+                    response = self.session.request(method, url, **kwargs)
+                except requests.exceptions.RequestException as e:
+                    error = CloudflareAPIError(f"Request failed: {str(e)}")
+                    # A connect timeout means nothing was sent, so any call may be repeated
+                    retry = idempotent or isinstance(e, requests.exceptions.ConnectTimeout)
+                    retry = retry and isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+                else:
+                    details["status"] = response.status_code
+                    try:
+                        return self._parse_response(response)
+                    except CloudflareAPIError as e:
+                        error = e
+                    status = response.status_code
+                    if status == 429:
+                        self.rate_limited += 1
+                    # Cloudflare rejects a 429'd call before acting on it
+                    retry = status == 429 or (idempotent and status in RETRY_STATUSES)
+                    delay = retry_after(response.headers.get("Retry-After"))
+                
+                if not retry or attempt >= self.max_retries:
+                    self._forget_stale_ids(endpoint, error)
+                    raise error
+                
+                if delay is None:
+                    delay = backoff_delay(attempt, self.backoff, self.max_backoff)
+                attempt += 1
+                self.retries += 1
+                if status == 429 and self.rate_limiter:
+                    # Hold back every thread using this token, not just this one
+                    self.rate_limiter.pause(delay)
+                else:
+                    time.sleep(delay)
+    
+    def _parse_response(self, response: requests.Response) -> Dict:
+        """Return the envelope of a successful response or raise CloudflareAPIError."""
         try:
-            response = requests.request(method, url, **kwargs)
-            response.raise_for_status()
             data = response.json()
-            
-            if not data.get("success", False):
-                errors = data.get("errors", [])
-                error_msg = "; ".join([e.get("message", str(e)) for e in errors])
-                raise CloudflareAPIError(f"API request failed: {error_msg}")
-            
-            return data.get("result", data)
+        except ValueError as e:
+            if response.ok:
+                raise CloudflareAPIError(f"Request failed: {str(e)}", response.status_code)
+            data = {}
+        errors = data.get("errors") or []
+        codes = [e.get("code") for e in errors if isinstance(e, dict)]
+        
+        if not response.ok:
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as e:
+                raise CloudflareAPIError(f"Request failed: {str(e)}", response.status_code, codes)
+        if not data.get("success", False):
+            error_msg = "; ".join([e.get("message", str(e)) for e in errors])
+            raise CloudflareAPIError(f"API request failed: {error_msg}", response.status_code, codes)
+        return data
+    
+    def _paginate(self, endpoint: str, params: Optional[Dict] = None, per_page: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Yield every item of a list endpoint, fetching pages as they are needed.
         
-        except requests.exceptions.RequestException as e:
-            raise CloudflareAPIError(f"Request failed: {str(e)}")
+        Args:
+            endpoint: API endpoint path
+            params: Query parameters (filters) sent with every page
+            per_page: Items per request (default: ``PAGE_SIZE``)
+        
+        Yields:
+            Result items, in API order
+        """
+        per_page = per_page or self.PAGE_SIZE
+        page = 1
+        while True:
+            query = dict(params or {}, page=page, per_page=per_page)
+            data = self._send("GET", endpoint, params=query)
+            items = data.get("result") or []
+            yield from items
+            
+            total_pages = (data.get("result_info") or {}).get("total_pages")
+            if total_pages is not None:
+                if page >= total_pages:
+                    return
+            elif len(items) < per_page:
+                return
+            page += 1
     
     def get_accounts(self) -> List[Dict]:
         """
@@ -113,17 +330,57 @@ class Cloudflare:
         if self._account_id:
             return self._account_id
         
-        accounts = self.get_accounts()
-        if not accounts:
-            raise CloudflareAPIError("No Cloudflare accounts found for this API token.")
+        with self._resolve_lock:
+            if self._account_id:
+                return self._account_id
+            
+            if self.id_cache:
+                self._account_id = self.id_cache.get("account")
+                if self._account_id:
+                    return self._account_id
+            
+            accounts = self.get_accounts()
+            if not accounts:
+                raise CloudflareAPIError("No Cloudflare accounts found for this API token.")
+            
+            self._account_id = accounts[0]["id"]
+            if self.id_cache:
+                self.id_cache.set({"account": self._account_id})
+            return self._account_id
+    
+    def iter_zones(self, name: Optional[str] = None) -> Iterator[Dict]:
+        """
+        Iterate over the zones the API token can access, page by page.
+        
+        Args:
+            name: Only the zone with this name
+        
+        Yields:
+            Zone dictionaries.
+        """
+        params = {"name": name} if name else None
+        # The zones endpoint allows at most 50 per page
+        return self._paginate("/zones", params, per_page=50)
+    
+    def list_zones(self) -> List[Dict]:
+        """
+        List all zones the API token can access.
         
-        self._account_id = accounts[0]["id"]
-        return self._account_id
+        Returns:
+            List of zone dictionaries.
+        """
+        return list(self.iter_zones())
     
     def get_zone_id(self, domain: str) -> str:
         """
         Get zone ID for a domain.
         
+        The zone is the longest zone name that ``domain`` ends with, so
+        ``app.example.co.uk`` and subzones delegated from a parent zone
+        resolve correctly. All zones of the token are listed once, on the
+        first lookup; later lookups need no API call. A domain that matches
+        no zone lists them again once, in case its zone was added since.
+        
         Args:
             domain: Domain name (e.g., "example.com")
         
@@ -136,46 +393,86 @@ class Cloudflare:
         # Check cache first
         if domain in self._zone_cache:
             return self._zone_cache[domain]
-        
-        # Extract root domain (handle subdomains)
-        parts = domain.split(".")
-        if len(parts) > 2:
-            # Try with last two parts first (e.g., example.com from app.example.com)
-            root_domain = ".".join(parts[-2:])
-        else:
-            root_domain = domain
-        
-        # Search for zone
-        zones = self._make_request("GET", "/zones", params={"name": root_domain})
-        
-        if not zones:
+        if self.id_cache:
+            zone_id = self.id_cache.get(f"zone:{domain}")
+            if zone_id:
+                self._zone_cache[domain] = zone_id
+                return zone_id
+        
+        with self._resolve_lock:
+            fresh = self._zone_index is None
+            if fresh:
+                self._zone_index = ZoneIndex(self.iter_zones())
+            index = self._zone_index
+        
+        match = index.match(domain)
+        if match is None and not fresh:
+            with self._resolve_lock:
+                # Unless another thread has just rebuilt it
+                if self._zone_index is index:
+                    self._zone_index = ZoneIndex(self.iter_zones())
+                index = self._zone_index
+            match = index.match(domain)
+        if match is None:
             raise CloudflareAPIError(
                 f"Zone not found for domain '{domain}'. "
-                f"Make sure '{root_domain}' is added to your Cloudflare account."
+                f"Make sure '{domain}' or one of its parent domains is added to your Cloudflare account."
             )
         
-        zone_id = zones[0]["id"]
+        zone_name, zone_id = match
         self._zone_cache[domain] = zone_id
-        self._zone_cache[root_domain] = zone_id
+        self._zone_cache[zone_name] = zone_id
+        if self.id_cache:
+            self.id_cache.set({f"zone:{domain}": zone_id, f"zone:{zone_name}": zone_id})
         
         return zone_id
     
-    def list_dns_records(self, zone_id: str, record_type: Optional[str] = None) -> List[Dict]:
+    def iter_dns_records(
+        self,
+        zone_id: str,
+        record_type: Optional[str] = None,
+        name: Optional[str] = None,
+        content: Optional[str] = None,
+        per_page: Optional[int] = None
+    ) -> Iterator[Dict]:
         """
-        List DNS records for a zone.
+        Iterate over the DNS records of a zone, fetching pages as they are needed.
+        
+        Filters are applied by the API, so only matching records are
+        transferred.
         
         Args:
             zone_id: Zone ID
-            record_type: Optional filter by record type (A, CNAME, etc.)
+            record_type: Only records of this type (A, CNAME, etc.)
+            name: Only records with this exact name (e.g., "app.example.com")
+            content: Only records with this exact content
+            per_page: Records fetched per request
         
-        Returns:
-            List of DNS record dictionaries.
+        Yields:
+            DNS record dictionaries.
         """
         params = {}
         if record_type:
             params["type"] = record_type
+        if name:
+            params["name"] = name
+        if content:
+            params["content"] = content
         
-        return self._make_request("GET", f"/zones/{zone_id}/dns_records", params=params)
+        return self._paginate(f"/zones/{zone_id}/dns_records", params, per_page)
+    
+    def list_dns_records(self, zone_id: str, record_type: Optional[str] = None) -> List[Dict]:
+        """
+        List DNS records for a zone.
+        
+        Args:
+            zone_id: Zone ID
+            record_type: Optional filter by record type (A, CNAME, etc.)
+        
+        Returns:
+            List of all DNS record dictionaries, across every page.
+        """
+        return list(self.iter_dns_records(zone_id, record_type))
     
     def create_tunnel(self, name: str) -> Tuple[str, Dict]:
         """
@@ -231,6 +528,25 @@ class Cloudflare:
                 return
             raise
     
+    def iter_tunnels(self, name: Optional[str] = None, include_deleted: bool = True) -> Iterator[Dict]:
+        """
+        Iterate over the account's tunnels, fetching pages as they are needed.
+        
+        Args:
+            name: Only tunnels with this name
+            include_deleted: Also yield tunnels that have been deleted
+        
+        Yields:
+            Tunnel dictionaries.
+        """
+        account_id = self.get_account_id()
+        params = {}
+        if name:
+            params["name"] = name
+        if not include_deleted:
+            params["is_deleted"] = "false"
+        return self._paginate(f"/accounts/{account_id}/cfd_tunnel", params)
+    
     def list_tunnels(self) -> List[Dict]:
         """
         List all tunnels for the account.
@@ -238,8 +554,7 @@ class Cloudflare:
         Returns:
             List of tunnel dictionaries.
         """
-        account_id = self.get_account_id()
-        return self._make_request("GET", f"/accounts/{account_id}/cfd_tunnel")
+        return list(self.iter_tunnels())
     
     def configure_tunnel_route(self, tunnel_id: str, hostname: str, service: str) -> Dict:
         """
@@ -300,6 +615,20 @@ class Cloudflare:
         result = self._make_request("POST", f"/zones/{zone_id}/dns_records", json=data)
         return result["id"]
     
+    def update_dns_record(self, zone_id: str, record_id: str, changes: Dict) -> Dict:
+        """
+        Change fields of a DNS record.
+        
+        Args:
+            zone_id: Zone ID
+            record_id: DNS record ID
+            changes: Fields to change (e.g., ``{"content": "...", "proxied": True}``)
+        
+        Returns:
+            Updated DNS record dict
+        """
+        return self._make_request("PATCH", f"/zones/{zone_id}/dns_records/{record_id}", json=changes)
+    
     def delete_dns_record(self, zone_id: str, record_id: str) -> None:
         """
         Delete a DNS record.
@@ -310,18 +639,103 @@ class Cloudflare:
         """
         self._make_request("DELETE", f"/zones/{zone_id}/dns_records/{record_id}")
     
-    def find_existing_record(self, zone_id: str, subdomain: str) -> Optional[Dict]:
+    def apply_dns_batch(
+        self,
+        zone_id: str,
+        creates: Sequence[Dict] = (),
+        deletes: Sequence[Union[str, Dict]] = (),
+        patches: Sequence[Dict] = (),
+        batch_size: int = DNS_BATCH_SIZE
+    ) -> Dict[str, List]:
+        """
+        Create, change and delete many DNS records with few API calls.
+        
+        Changes go to the batch DNS endpoint, ``batch_size`` per call, in
+        the order deletes, patches, creates (the order the API applies them
+        in within a call). The API applies a call all or nothing, so when a
+        call is rejected as invalid it is split in halves and retried until
+        the failing records are isolated; the others are still applied.
+        
+        Args:
+            zone_id: Zone ID
+            creates: Records to create (``type``, ``name``, ``content``, ...)
+            deletes: IDs (or record dicts) of records to delete
+            patches: Changes to existing records, each with its ``id``
+            batch_size: Most changes per API call
+        
+        Returns:
+            Dict with ``created``, ``patched`` and ``deleted`` lists aligned
+            with the arguments (the record, or the ID for deletes; None where
+            the change failed) and ``errors``, a list of dicts with
+            ``operation`` ("create", "patch" or "delete"), ``index`` into its
+            argument and ``error`` (a :class:`CloudflareAPIError`).
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        
+        result: Dict[str, List] = {
+            "created": [None] * len(creates),
+            "patched": [None] * len(patches),
+            "deleted": [None] * len(deletes),
+            "errors": [],
+        }
+        changes = [("deletes", i, {"id": d if isinstance(d, str) else d["id"]}) for i, d in enumerate(deletes)]
+        changes += [("patches", i, dict(patch)) for i, patch in enumerate(patches)]
+        changes += [("posts", i, dict(record)) for i, record in enumerate(creates)]
+        
+        for start in range(0, len(changes), batch_size):
+            self._apply_dns_chunk(zone_id, changes[start:start + batch_size], result)
+        return result
+    
+    def _apply_dns_chunk(self, zone_id: str, changes: List[Tuple[str, int, Dict]], result: Dict[str, List]) -> None:
+        operations = {"deletes": "delete", "patches": "patch", "posts": "create"}
+        body: Dict[str, List[Dict]] = {}
+        for kind, _, payload in changes:
+            body.setdefault(kind, []).append(payload)
+        
+        try:
+            applied = self._make_request("POST", f"/zones/{zone_id}/dns_records/batch", json=body)
+        except CloudflareAPIError as e:
+            # Only a validation error is specific to some of the records;
+            # anything else (auth, throttling, outage) would fail every half too
+            if len(changes) > 1 and e.status == 400:
+                middle = len(changes) // 2
+                self._apply_dns_chunk(zone_id, changes[:middle], result)
+                self._apply_dns_chunk(zone_id, changes[middle:], result)
+                return
+            for kind, index, _ in changes:
+                result["errors"].append({"operation": operations[kind], "index": index, "error": e})
+            return
+        
+        outputs = {"deletes": "deleted", "patches": "patched", "posts": "created"}
+        position = dict.fromkeys(body, 0)
+        for kind, index, _ in changes:
+            records = (applied or {}).get(kind) or []
+            record = records[position[kind]] if position[kind] < len(records) else None
+            position[kind] += 1
+            if not isinstance(record, dict) or "id" not in record:
+                # Don't report a change as applied without the API saying so
+                error = CloudflareAPIError(f"Batch response did not confirm {operations[kind]} #{index}")
+                result["errors"].append({"operation": operations[kind], "index": index, "error": error})
+                continue
+            result[outputs[kind]][index] = record["id"] if kind == "deletes" else record
+    
+    def find_existing_record(self, zone_id: str, subdomain: str, record_type: Optional[str] = None) -> Optional[Dict]:
         """
         Find existing DNS record for a subdomain.
         
+        The API filters by name (and type), so this is a single small
+        request however many records the zone holds.
+        
         Args:
             zone_id: Zone ID
             subdomain: Subdomain to search for
+            record_type: Only a record of this type (A, CNAME, etc.)
         
         Returns:
             DNS record dict if found, None otherwise
         """
-        records = self.list_dns_records(zone_id)
+        records = self.iter_dns_records(zone_id, record_type, name=subdomain, per_page=5)
         for record in records:
             if record["name"] == subdomain:
                 return record
@@ -349,6 +763,25 @@ class Cloudflare:
         
         return creds_path
     
+    def _forget_stale_ids(self, endpoint: str, error: CloudflareAPIError) -> None:
+        """Drop cached account/zone IDs that ``endpoint`` used if ``error`` says they are invalid."""
+        if error.status != 403 and not STALE_ID_CODES.intersection(error.codes):
+            return
+        
+        path = "/" + endpoint.strip("/") + "/"
+        stale = []
+        if self._account_id and f"/accounts/{self._account_id}/" in path:
+            self._account_id = None
+            stale.append("account")
+        for domain, zone_id in list(self._zone_cache.items()):
+            if f"/zones/{zone_id}/" in path:
+                del self._zone_cache[domain]
+                stale.append(f"zone:{domain}")
+                self._zone_index = None
+        
+        if stale and self.id_cache:
+            self.id_cache.invalidate(stale)
+    
     def _generate_tunnel_secret(self) -> str:
         """
         Generate a random tunnel secret.
@@ -4,8 +4,11 @@ Cloudflared binary manager and tunnel runner.
 
 import os
 import sys
+import time
+import socket
 import platform
 import subprocess
+import http.client
 import requests
 import stat
 from typing import Optional
@@ -38,6 +41,7 @@ class Cloudflared:
     def __init__(self):
         """Initialize cloudflared manager."""
         self.process: Optional[subprocess.Popen] = None
+        self.metrics_port: Optional[int] = None
         self._binary_path: Optional[str] = None
     
     def get_binary_path(self) -> str:
@@ -129,7 +133,8 @@ class Cloudflared:
         tunnel_id: str,
         credentials_path: str,
         port: int,
-        host: str = "localhost"
+        host: str = "localhost",
+        metrics_port: Optional[int] = None
     ) -> subprocess.Popen:
         """
         Start cloudflared tunnel process.
@@ -139,6 +144,8 @@ class Cloudflared:
             credentials_path: Path to credentials JSON file
             port: Local port to tunnel
             host: Local host (default: localhost)
+            metrics_port: Local port for cloudflared's metrics server, which
+                ``wait_until_ready`` polls (default: any free port)
         
         Returns:
             Popen process object
@@ -151,10 +158,13 @@ class Cloudflared:
         if not os.path.exists(credentials_path):
             raise CloudflaredError(f"Credentials file not found: {credentials_path}")
         
+        self.metrics_port = metrics_port or _free_port()
+        
         # Build command
         cmd = [
             binary_path,
             "tunnel",
+            "--metrics", f"127.0.0.1:{self.metrics_port}",
             "--credentials-file", credentials_path,
             "run",
             "--url", f"http://{host}:{port}",
@@ -203,6 +213,39 @@ class Cloudflared:
         
         return self.process.poll() is None
     
+    def wait_until_ready(self, timeout: float = 30.0, interval: float = 0.1) -> bool:
+        """
+        Wait until the tunnel has a connection to the Cloudflare edge.
+        
+        Polls the ``/ready`` endpoint of cloudflared's metrics server, which
+        answers 200 once at least one edge connection is registered.
+        
+        Args:
+            timeout: Seconds to wait at most
+            interval: Seconds between polls
+        
+        Returns:
+            True once connected, False if the process exited or ``timeout`` passed
+        """
+        deadline = time.monotonic() + timeout
+        while self.is_running():
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", self.metrics_port, timeout=1)
+                try:
+                    conn.request("GET", "/ready")
+                    if conn.getresponse().status == 200:
+                        return True
+                finally:
+                    conn.close()
+            except (OSError, http.client.HTTPException):
+                pass  # Metrics server not listening yet
+            
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(interval)
+        
+        return False
+    
     def get_logs(self, lines: int = 50) -> str:
         """
         Get recent log output from tunnel process.
@@ -228,3 +271,9 @@ class Cloudflared:
             return "".join(output)
         except:
             return ""
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
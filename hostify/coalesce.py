@@ -0,0 +1,245 @@
+"""
+Request coalescing stage for the local proxy.
+
+When many identical GET/HEAD requests arrive while the first one is still
+being fetched, only that first request goes to the origin. The others wait
+for its response and receive a copy, which keeps a slow origin from being
+flattened by a thundering herd when a popular page expires.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .cache import parse_cache_control
+from .proxy import Body, Headers, Request, Response, UpstreamError
+
+
+# Request headers that may change the response when the origin has not yet
+# told us its Vary header for a URL
+DEFAULT_VARY = ("accept", "accept-encoding", "accept-language", "cookie")
+
+
+class _Flight:
+    """One upstream fetch shared by every identical request."""
+
+    __slots__ = ("future", "waiters")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.future: asyncio.Future = loop.create_future()
+        # Nobody may be waiting when the leader fails; don't warn about that
+        self.future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.waiters = 0
+
+
+class RequestCoalescer:
+    """
+    Coalescing stage for :class:`hostify.proxy.ReverseProxy`.
+
+    Requests are identical when method, host, URL and the request headers
+    named in the origin's ``Vary`` match. Responses that can't be shared
+    (``Set-Cookie``, ``private``, ``no-store`` or larger than
+    ``max_body_size``) make the waiters fetch for themselves. The URL is
+    then left alone for ``pass_ttl`` seconds so later requests don't queue
+    behind it.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 30.0,
+        max_body_size: int = 8 * 1024 * 1024,
+        pass_ttl: float = 60.0,
+        max_tracked: int = 10000
+    ):
+        """
+        Initialize coalescer.
+
+        Args:
+            timeout: Seconds the shared fetch (head and body) may take before
+                every waiter gets a gateway timeout
+            max_body_size: Largest response body that is shared
+            pass_ttl: Seconds a URL with an unshareable response is bypassed
+            max_tracked: URLs remembered for Vary and bypass decisions
+        """
+        self.timeout = timeout
+        self.max_body_size = max_body_size
+        self.pass_ttl = pass_ttl
+        self.max_tracked = max_tracked
+
+        self._flights: Dict[str, _Flight] = {}
+        self._vary: "OrderedDict[str, Tuple[str, ...]]" = OrderedDict()
+        self._pass: "OrderedDict[str, float]" = OrderedDict()
+
+        self.upstream_fetches = 0
+        self.collapsed = 0
+        self.passed = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    # -- stage protocol ----------------------------------------------------
+
+    async def handle(self, request: Request, call_next) -> Response:
+        if not self._eligible(request):
+            return await call_next(request)
+
+        url = f"{request.method} {request.headers.get('host', '')}{request.target}"
+        if self._bypassed(url):
+            self.passed += 1
+            return await call_next(request)
+
+        key = self._key(url, request)
+        flight = self._flights.get(key)
+        if flight is not None:
+            return await self._wait(flight, request, call_next)
+
+        flight = _Flight(asyncio.get_running_loop())
+        self._flights[key] = flight
+        try:
+            return await self._lead(flight, url, request, call_next)
+        finally:
+            self._flights.pop(key, None)
+
+    def summary(self) -> str:
+        return (
+            f"Coalescing: {self.collapsed} requests collapsed into "
+            f"{self.upstream_fetches} origin fetches "
+            f"(passed={self.passed}, timeouts={self.timeouts}, errors={self.errors})"
+        )
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "upstream_fetches": self.upstream_fetches,
+            "collapsed": self.collapsed,
+            "passed": self.passed,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "in_flight": len(self._flights),
+        }
+
+    # -- leader / follower -------------------------------------------------
+
+    async def _lead(self, flight: _Flight, url: str, request: Request, call_next) -> Response:
+        self.upstream_fetches += 1
+        try:
+            response, body = await asyncio.wait_for(
+                self._fetch(url, request, call_next),
+                self.timeout
+            )
+        except asyncio.TimeoutError as e:
+            self.timeouts += 1
+            flight.future.set_exception(e)
+            raise
+        except Exception as e:
+            self.errors += 1
+            flight.future.set_exception(e)
+            raise
+        except BaseException:
+            flight.future.set_exception(UpstreamError("Shared fetch was cancelled"))
+            raise
+
+        if body is None:
+            # Not shareable: release the waiters to fetch on their own
+            flight.future.set_result(None)
+            return response
+
+        flight.future.set_result((response.status, response.reason, response.headers, body))
+        return response
+
+    async def _wait(self, flight: _Flight, request: Request, call_next) -> Response:
+        flight.waiters += 1
+        self.collapsed += 1
+        result = await asyncio.wait_for(asyncio.shield(flight.future), self.timeout)
+        if result is None:
+            self.collapsed -= 1
+            self.passed += 1
+            return await call_next(request)
+
+        status, reason, headers, body = result
+        return Response(status, headers.copy(), Body.from_bytes(body), reason)
+
+    async def _fetch(self, url: str, request: Request, call_next) -> Tuple[Response, Optional[bytes]]:
+        """
+        Fetch from upstream and buffer the body if it can be shared.
+
+        Returns:
+            Tuple of (response, body bytes or None when not shareable)
+        """
+        response = await call_next(request)
+        self._remember_vary(url, response.headers)
+
+        if not self._shareable(response):
+            self._mark_pass(url)
+            return response, None
+
+        chunks: List[bytes] = []
+        size = 0
+        source = response.body
+        async for chunk in source:
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > self.max_body_size:
+                # Too big to hold for everyone: stream the rest to the leader
+                self._mark_pass(url)
+                response.body = Body(_resume(chunks, source), source.length, source=source)
+                return response, None
+
+        body = b"".join(chunks)
+        response.body = Body.from_bytes(body)
+        return response, body
+
+    # -- policy ------------------------------------------------------------
+
+    @staticmethod
+    def _eligible(request: Request) -> bool:
+        if request.method not in ("GET", "HEAD") or "authorization" in request.headers:
+            return False
+        if request.upgrade:
+            return False
+        directives = parse_cache_control(request.headers.get("cache-control"))
+        return "no-store" not in directives
+
+    def _shareable(self, response: Response) -> bool:
+        if "set-cookie" in response.headers or "*" in response.headers.tokens("vary"):
+            return False
+        directives = parse_cache_control(response.headers.get("cache-control"))
+        if "private" in directives or "no-store" in directives:
+            return False
+        length = response.body.length
+        return length is None or length <= self.max_body_size
+
+    def _key(self, url: str, request: Request) -> str:
+        names = self._vary.get(url, DEFAULT_VARY)
+        values = "\n".join(
+            f"{name}={' '.join((request.headers.get(name) or '').split())}"
+            for name in names
+        )
+        return f"{url}\n{values}"
+
+    def _remember_vary(self, url: str, headers: Headers) -> None:
+        self._vary[url] = tuple(sorted(set(headers.tokens("vary"))))
+        self._vary.move_to_end(url)
+        while len(self._vary) > self.max_tracked:
+            self._vary.popitem(last=False)
+
+    def _mark_pass(self, url: str) -> None:
+        self._pass[url] = time.monotonic() + self.pass_ttl
+        self._pass.move_to_end(url)
+        while len(self._pass) > self.max_tracked:
+            self._pass.popitem(last=False)
+
+    def _bypassed(self, url: str) -> bool:
+        expires = self._pass.get(url)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            del self._pass[url]
+            return False
+        return True
+
+
+async def _resume(prefix: List[bytes], rest: Body):
+    for chunk in prefix:
+        yield chunk
+    async for chunk in rest:
+        yield chunk
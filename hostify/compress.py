@@ -0,0 +1,268 @@
+"""
+Response compression stage for the local proxy.
+
+Development servers (``php -S``, ``python -m http.server``, ``app.run()``)
+usually send JSON and HTML uncompressed, and every one of those bytes has to
+cross the uplink to Cloudflare's edge. :class:`Compressor` compresses such
+responses on the fly, chunk by chunk, before they enter the tunnel.
+
+zstd needs the optional ``zstandard`` package (``pip install hostify[zstd]``);
+gzip always works.
+"""
+
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .cache import parse_cache_control
+from .proxy import Body, Request, Response, response_has_body
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Content types worth compressing (prefix match on the media type)
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/x-javascript",
+    "application/xml",
+    "application/xhtml+xml",
+    "application/rss+xml",
+    "application/atom+xml",
+    "application/ld+json",
+    "application/manifest+json",
+    "application/wasm",
+    "image/svg+xml",
+    "image/x-icon",
+    "font/ttf",
+    "font/otf",
+)
+
+# Streams that must reach the client as they are produced
+STREAMING_TYPES = ("text/event-stream",)
+
+
+def _gzip(level: int):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress, compressor.flush
+
+
+def _zstd(level: int):
+    compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    return compressor.compress, compressor.flush
+
+
+# Encoding name -> (factory, default level)
+ENCODERS = {
+    "gzip": (_gzip, 6),
+    "zstd": (_zstd, 3),
+}
+
+
+def available_encodings() -> List[str]:
+    """Encodings usable in this environment, most preferred first."""
+    return [name for name in ("zstd", "gzip") if name != "zstd" or zstandard is not None]
+
+
+def parse_accept_encoding(value: Optional[str]) -> Dict[str, float]:
+    """
+    Parse an ``Accept-Encoding`` header.
+
+    Returns:
+        Dict mapping lower-cased codings (including ``*``) to their q-value
+    """
+    accepted: Dict[str, float] = {}
+    for part in (value or "").split(","):
+        coding, *params = [p.strip() for p in part.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, argument = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(argument)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.lower()] = q
+    return accepted
+
+
+class Compressor:
+    """
+    Compression stage for :class:`hostify.proxy.ReverseProxy`.
+
+    A response is compressed when the client accepts one of ``encodings``,
+    its ``Content-Type`` is textual, it isn't already encoded, it doesn't
+    say ``Cache-Control: no-transform`` and it is at least ``min_size``
+    bytes. Bodies of unknown length are held back only until ``min_size``
+    bytes have arrived; after that, memory use stays at one chunk plus the
+    compressor's window no matter how large the response is.
+    """
+
+    def __init__(
+        self,
+        min_size: int = 1024,
+        encodings: Optional[Sequence[str]] = None,
+        level: Optional[int] = None,
+        content_types: Sequence[str] = COMPRESSIBLE_TYPES
+    ):
+        """
+        Initialize compressor.
+
+        Args:
+            min_size: Smallest body (in bytes) worth compressing
+            encodings: Encodings to offer, most preferred first (default:
+                zstd if installed, then gzip)
+            level: Compression level (default: 6 for gzip, 3 for zstd)
+            content_types: Media type prefixes that are compressed
+
+        Raises:
+            ValueError: If an encoding is unknown or its package is missing
+        """
+        encodings = list(encodings) if encodings is not None else available_encodings()
+        for name in encodings:
+            if name not in ENCODERS:
+                raise ValueError(f"Unknown encoding '{name}'. Available: {', '.join(ENCODERS)}")
+            if name == "zstd" and zstandard is None:
+                raise ValueError("zstd needs the 'zstandard' package (pip install hostify[zstd])")
+        if not encodings:
+            raise ValueError("At least one encoding is required")
+
+        self.min_size = min_size
+        self.encodings = encodings
+        self.level = level
+        self.content_types = tuple(content_types)
+
+        self.compressed = 0
+        self.skipped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    # -- stage protocol ----------------------------------------------------
+
+    async def handle(self, request: Request, call_next) -> Response:
+        response = await call_next(request)
+
+        if not self._compressible(request, response):
+            return response
+
+        # Shared caches must keep compressed and plain copies apart
+        if "accept-encoding" not in response.headers.tokens("vary"):
+            response.headers.add("Vary", "Accept-Encoding")
+
+        encoding = self._negotiate(request.headers.get("accept-encoding"))
+        if encoding is None or (response.body.length is not None and response.body.length < self.min_size):
+            self.skipped += 1
+            return response
+
+        if response.body.length is None:
+            head, complete = await self._peek(response.body)
+            if complete:
+                # Whole body turned out to be below the threshold
+                self.skipped += 1
+                response.body = Body.from_bytes(head)
+                return response
+        else:
+            head = b""
+
+        self.compressed += 1
+        response.headers.set("Content-Encoding", encoding)
+        response.headers.remove("Content-Length")
+        response.headers.remove("Accept-Ranges")
+        etag = response.headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            response.headers.set("ETag", f"W/{etag}")
+
+        source = response.body
+        if response_has_body(request.method, response.status):
+            response.body = Body(self._encode(encoding, head, source), None, source=source)
+        return response
+
+    def summary(self) -> str:
+        saved = self.bytes_in - self.bytes_out
+        return (
+            f"Compression: {self.compressed} responses compressed, "
+            f"{saved / 1024:.0f} KiB saved ({self.ratio:.0%} of original)"
+        )
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "compressed": self.compressed,
+            "skipped": self.skipped,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": self.ratio,
+        }
+
+    @property
+    def ratio(self) -> float:
+        """Compressed size as a fraction of the original size."""
+        return self.bytes_out / self.bytes_in if self.bytes_in else 1.0
+
+    # -- helpers -----------------------------------------------------------
+
+    def _compressible(self, request: Request, response: Response) -> bool:
+        if response.status < 200 or response.status in (204, 206, 304):
+            return False
+        if "content-encoding" in response.headers or "content-range" in response.headers:
+            return False
+        if "no-transform" in parse_cache_control(response.headers.get("cache-control")):
+            return False
+        media_type = (response.headers.get("content-type") or "").split(";")[0].strip().lower()
+        if not media_type or media_type.startswith(STREAMING_TYPES):
+            return False
+        return media_type.startswith(self.content_types)
+
+    def _negotiate(self, header: Optional[str]) -> Optional[str]:
+        accepted = parse_accept_encoding(header)
+        wildcard = accepted.get("*", 0.0)
+        ranked: List[Tuple[float, int, str]] = []
+        for preference, name in enumerate(self.encodings):
+            q = accepted.get(name, wildcard)
+            if q > 0:
+                ranked.append((-q, preference, name))
+        return min(ranked)[2] if ranked else None
+
+    async def _peek(self, body: Body) -> Tuple[bytes, bool]:
+        """
+        Read from ``body`` until ``min_size`` bytes or the end arrive.
+
+        Returns:
+            Tuple of (bytes read, whether the body ended)
+        """
+        chunks: List[bytes] = []
+        size = 0
+        while size < self.min_size:
+            try:
+                chunk = await body.__anext__()
+            except StopAsyncIteration:
+                return b"".join(chunks), True
+            chunks.append(chunk)
+            size += len(chunk)
+        return b"".join(chunks), False
+
+    async def _encode(self, encoding: str, head: bytes, source: Body):
+        factory, default_level = ENCODERS[encoding]
+        compress, flush = factory(self.level if self.level is not None else default_level)
+
+        if head:
+            self.bytes_in += len(head)
+            data = compress(head)
+            if data:
+                self.bytes_out += len(data)
+                yield data
+
+        async for chunk in source:
+            self.bytes_in += len(chunk)
+            data = compress(chunk)
+            if data:
+                self.bytes_out += len(data)
+                yield data
+
+        data = flush()
+        self.bytes_out += len(data)
+        yield data
@@ -0,0 +1,194 @@
+"""
+Adaptive concurrency limiting stage for the local proxy.
+
+A small machine can only work on so many requests at once. Past that point
+extra requests just wait in queues inside cloudflared and the app, and
+latency grows for everyone. :class:`ConcurrencyLimiter` learns how many
+concurrent requests the origin handles before it slows down and answers
+the rest immediately with ``503 Service Unavailable`` and ``Retry-After``.
+"""
+
+import math
+import time
+from typing import Dict, Optional
+
+from .proxy import Body, Headers, Request, Response
+
+
+ALGORITHMS = ("gradient", "aimd")
+
+
+class ConcurrencyLimiter:
+    """
+    Admission control stage for :class:`hostify.proxy.ReverseProxy`.
+
+    The limit is adjusted after every response using the time the origin
+    took to send its response head:
+
+    - ``"gradient"`` (default) compares each sample with the long-term
+      baseline latency and shrinks the limit in proportion as latency rises
+      above it, growing it by roughly ``sqrt(limit)`` while latency stays at
+      the baseline.
+    - ``"aimd"`` adds one request per limit's worth of good responses and
+      multiplies the limit by ``backoff`` when a response is slower than
+      ``latency_threshold`` or fails.
+
+    Timeouts, connection errors and 502/503/504 answers from the origin
+    count as congestion for both algorithms.
+
+    A request holds its slot until its response body has been relayed.
+    Upgraded connections (WebSocket) give theirs back as soon as the origin
+    has switched protocols, since they may stay open for hours.
+    """
+
+    def __init__(
+        self,
+        algorithm: str = "gradient",
+        initial_limit: int = 20,
+        min_limit: int = 1,
+        max_limit: int = 500,
+        latency_threshold: Optional[float] = None,
+        backoff: float = 0.9,
+        tolerance: float = 1.5,
+        smoothing: float = 0.2,
+        retry_after: int = 1
+    ):
+        """
+        Initialize limiter.
+
+        Args:
+            algorithm: "gradient" or "aimd"
+            initial_limit: Concurrent requests admitted before anything is learned
+            min_limit: Lowest the limit may go
+            max_limit: Highest the limit may go
+            latency_threshold: Seconds above which a response counts as a
+                congestion signal for AIMD (default: twice the baseline)
+            backoff: Factor the AIMD limit is multiplied by on congestion
+            tolerance: How far latency may rise above the baseline before the
+                gradient limit shrinks
+            smoothing: Weight of each new gradient estimate (0-1)
+            retry_after: Seconds sent in ``Retry-After`` on shed requests
+        """
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown algorithm '{algorithm}'. Available: {', '.join(ALGORITHMS)}")
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError("Limits must satisfy 1 <= min_limit <= initial_limit <= max_limit")
+
+        self.algorithm = algorithm
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_threshold = latency_threshold
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.retry_after = retry_after
+
+        self._limit = float(initial_limit)
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed = 0
+        self.errors = 0
+        self.peak_in_flight = 0
+
+        # Long-term (baseline) and short-term latency averages, in seconds
+        self.baseline_rtt: Optional[float] = None
+        self.recent_rtt: Optional[float] = None
+
+    @property
+    def limit(self) -> int:
+        """Current concurrency limit."""
+        return int(self._limit)
+
+    # -- stage protocol ----------------------------------------------------
+
+    async def handle(self, request: Request, call_next) -> Response:
+        if self.in_flight >= self.limit:
+            self.shed += 1
+            return self._reject()
+
+        self.in_flight += 1
+        self.admitted += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        inflight_at_start = self.in_flight
+        started = time.monotonic()
+
+        try:
+            response = await call_next(request)
+        except BaseException:
+            self.in_flight -= 1
+            self.errors += 1
+            self._update(time.monotonic() - started, inflight_at_start, failed=True)
+            raise
+
+        rtt = time.monotonic() - started
+        # Overload answers from the origin itself; plain 500s are app bugs
+        failed = response.status in (502, 503, 504)
+
+        def release(completed: bool) -> None:
+            self.in_flight -= 1
+
+        self._update(rtt, inflight_at_start, failed)
+        if response.upgraded is not None:
+            self.in_flight -= 1
+            return response
+        source = response.body
+        response.body = Body(source, source.length, release)
+        return response
+
+    def summary(self) -> str:
+        return (
+            f"Concurrency limit: {self.limit} ({self.algorithm}), "
+            f"{self.admitted} admitted, {self.shed} shed, peak in flight {self.peak_in_flight}"
+        )
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "errors": self.errors,
+            "baseline_rtt_ms": (self.baseline_rtt or 0.0) * 1000,
+            "recent_rtt_ms": (self.recent_rtt or 0.0) * 1000,
+        }
+
+    # -- limit estimation --------------------------------------------------
+
+    def _reject(self) -> Response:
+        headers = Headers([("Retry-After", str(self.retry_after))])
+        return Response.text(503, "Server is busy, please retry shortly\n", headers)
+
+    def _update(self, rtt: float, in_flight: int, failed: bool) -> None:
+        if self.baseline_rtt is None:
+            self.baseline_rtt = self.recent_rtt = rtt
+        else:
+            self.recent_rtt = 0.9 * self.recent_rtt + 0.1 * rtt
+            # Slow-moving baseline; drifts down quickly so that a period of
+            # overload doesn't become the new normal
+            if rtt < self.baseline_rtt:
+                self.baseline_rtt = 0.9 * self.baseline_rtt + 0.1 * rtt
+            else:
+                self.baseline_rtt = 0.999 * self.baseline_rtt + 0.001 * rtt
+
+        # Only grow when the origin was actually busy; otherwise the
+        # samples say nothing about what it can take
+        busy = in_flight * 2 >= self._limit
+
+        if self.algorithm == "aimd":
+            threshold = self.latency_threshold or 2 * self.baseline_rtt
+            if failed or rtt > threshold:
+                limit = self._limit * self.backoff
+            elif busy:
+                limit = self._limit + 1 / self._limit
+            else:
+                limit = self._limit
+        else:
+            gradient = max(0.5, min(1.0, self.tolerance * self.baseline_rtt / max(self.recent_rtt, 1e-6)))
+            if failed:
+                gradient = 0.5
+            target = self._limit * gradient + math.sqrt(self._limit)
+            if target > self._limit and not busy:
+                target = self._limit
+            limit = (1 - self.smoothing) * self._limit + self.smoothing * target
+
+        self._limit = max(float(self.min_limit), min(float(self.max_limit), limit))
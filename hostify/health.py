@@ -0,0 +1,264 @@
+"""
+HTTP health probes for local origins.
+
+:func:`probe` checks a backend once. :class:`HealthChecker` probes every
+backend of a pool periodically and takes failing ones out of rotation.
+All of its probes are scheduled from one task on the proxy's event loop,
+so checking hundreds of backends costs a few idle coroutines rather than a
+thread each.
+"""
+
+import asyncio
+import heapq
+import random
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .balancer import Backend, BackendPool
+from .proxy import Headers, ProxyError, Request
+
+
+async def probe(
+    backend: Backend,
+    path: str = "/",
+    timeout: float = 2.0,
+    expected_status: Optional[int] = None,
+    max_latency: Optional[float] = None
+) -> bool:
+    """
+    Send one HTTP GET to ``backend`` and judge the answer.
+
+    Args:
+        backend: Backend to probe
+        path: Request path
+        timeout: Seconds the whole exchange may take
+        expected_status: Exact status to require; by default anything below
+            500 counts as healthy
+        max_latency: Seconds within which the response must be complete
+
+    Returns:
+        True if the backend answered in time with an acceptable status
+    """
+    request = Request("GET", path, Headers([("Host", "localhost"), ("User-Agent", "hostify-health")]))
+
+    async def exchange() -> int:
+        response = await backend.send(request)
+        try:
+            await response.body.read()
+        finally:
+            await response.aclose()
+        return response.status
+
+    started = time.monotonic()
+    try:
+        status = await asyncio.wait_for(exchange(), timeout)
+    except (ProxyError, OSError, EOFError, asyncio.TimeoutError):
+        return False
+
+    if max_latency is not None and time.monotonic() - started > max_latency:
+        return False
+
+    if expected_status is not None:
+        return status == expected_status
+    return status < 500
+
+
+async def wait_until_healthy(
+    backend: Backend,
+    path: str = "/",
+    timeout: float = 30.0,
+    interval: float = 0.5
+) -> bool:
+    """
+    Probe ``backend`` until it passes or ``timeout`` seconds have passed.
+
+    Returns:
+        True if the backend became healthy in time
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        if await probe(backend, path, timeout=min(2.0, timeout)):
+            return True
+        if time.monotonic() + interval > deadline:
+            return False
+        await asyncio.sleep(interval)
+
+
+class HealthChecker:
+    """
+    Periodic HTTP health checks for the backends of a :class:`BackendPool`.
+
+    A backend that fails ``unhealthy_threshold`` probes in a row is marked
+    unhealthy and gets no new requests. It is put back once it passes
+    ``healthy_threshold`` probes in a row. Backends added to the pool later
+    (e.g. by ``switch_origin``) are picked up automatically.
+    """
+
+    def __init__(
+        self,
+        path: str = "/",
+        interval: float = 5.0,
+        timeout: float = 2.0,
+        expected_status: Optional[int] = None,
+        max_latency: Optional[float] = None,
+        unhealthy_threshold: int = 2,
+        healthy_threshold: int = 2,
+        pool: Optional[BackendPool] = None,
+        on_change: Optional[Callable[[Backend, bool], None]] = None
+    ):
+        """
+        Initialize health checker.
+
+        Args:
+            path: Request path probed on each backend
+            interval: Seconds between probes of the same backend
+            timeout: Seconds a probe may take before it fails
+            expected_status: Exact status to require; by default anything
+                below 500 passes
+            max_latency: Seconds above which a slow answer counts as a failure
+            unhealthy_threshold: Consecutive failures that eject a backend
+            healthy_threshold: Consecutive passes that bring it back
+            pool: Pool to check (``Host`` sets this for you)
+            on_change: Called with ``(backend, healthy)`` on every transition
+        """
+        if interval <= 0 or timeout <= 0:
+            raise ValueError("interval and timeout must be positive")
+        if unhealthy_threshold < 1 or healthy_threshold < 1:
+            raise ValueError("Thresholds must be at least 1")
+
+        self.path = path
+        self.interval = interval
+        self.timeout = timeout
+        self.expected_status = expected_status
+        self.max_latency = max_latency
+        self.unhealthy_threshold = unhealthy_threshold
+        self.healthy_threshold = healthy_threshold
+        self.pool = pool
+        self.on_change = on_change
+
+        self.probes = 0
+        self.failed_probes = 0
+        self.ejections = 0
+        self.restorations = 0
+
+        self._streaks: Dict[Backend, int] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._in_flight: Dict[Backend, asyncio.Task] = {}
+
+    async def start(self) -> None:
+        """Start checking on the running event loop."""
+        if self.pool is None:
+            raise ValueError("HealthChecker needs a pool to check")
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def close(self) -> None:
+        """Stop checking and cancel probes in flight."""
+        tasks = list(self._in_flight.values())
+        if self._task is not None:
+            tasks.append(self._task)
+            self._task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._in_flight.clear()
+
+    async def check(self, backend: Backend) -> bool:
+        """
+        Probe ``backend`` once and update its health state.
+
+        Returns:
+            Whether the probe passed
+        """
+        passed = await probe(
+            backend,
+            self.path,
+            self.timeout,
+            self.expected_status,
+            self.max_latency
+        )
+        self.probes += 1
+        if not passed:
+            self.failed_probes += 1
+
+        # Positive streak counts passes, negative counts failures
+        streak = self._streaks.get(backend, 0)
+        if passed:
+            streak = streak + 1 if streak > 0 else 1
+        else:
+            streak = streak - 1 if streak < 0 else -1
+        self._streaks[backend] = streak
+
+        if backend.healthy and -streak >= self.unhealthy_threshold:
+            backend.healthy = False
+            self.ejections += 1
+            self._changed(backend, False)
+        elif not backend.healthy and streak >= self.healthy_threshold:
+            backend.healthy = True
+            self.restorations += 1
+            self._changed(backend, True)
+        return passed
+
+    def summary(self) -> str:
+        unhealthy = [b.address for b in self.pool.backends if not b.healthy] if self.pool else []
+        line = (
+            f"Health checks: {self.probes} probes, {self.failed_probes} failed, "
+            f"{self.ejections} ejections"
+        )
+        return line + (f" (unhealthy now: {', '.join(unhealthy)})" if unhealthy else "")
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "probes": self.probes,
+            "failed_probes": self.failed_probes,
+            "ejections": self.ejections,
+            "restorations": self.restorations,
+            "unhealthy": [b.port for b in self.pool.backends if not b.healthy] if self.pool else [],
+        }
+
+    def _changed(self, backend: Backend, healthy: bool) -> None:
+        if self.on_change:
+            try:
+                self.on_change(backend, healthy)
+            except Exception:
+                pass
+
+    async def _run(self) -> None:
+        # Min-heap of (due time, tie breaker, backend). Each backend starts at
+        # a random offset so probes are spread evenly over the interval.
+        schedule: List[Tuple[float, int, Backend]] = []
+        counter = 0
+        known: Optional[List[Backend]] = None
+        members = set()
+
+        while True:
+            backends = self.pool.backends
+            if backends is not known:
+                # The pool swapped its backend list (see BackendPool.replace)
+                known = backends
+                members = set(backends)
+                scheduled = {entry[2] for entry in schedule}
+                now = time.monotonic()
+                for backend in backends:
+                    if backend not in scheduled:
+                        counter += 1
+                        heapq.heappush(schedule, (now + random.uniform(0, self.interval), counter, backend))
+                for backend in list(self._streaks):
+                    if backend not in members:
+                        del self._streaks[backend]
+
+            now = time.monotonic()
+            while schedule and schedule[0][0] <= now:
+                _, _, backend = heapq.heappop(schedule)
+                if backend not in members:
+                    continue
+                if backend not in self._in_flight:
+                    task = asyncio.ensure_future(self.check(backend))
+                    self._in_flight[backend] = task
+                    task.add_done_callback(lambda t, b=backend: self._in_flight.pop(b, None))
+                counter += 1
+                heapq.heappush(schedule, (now + self.interval, counter, backend))
+
+            delay = schedule[0][0] - now if schedule else self.interval
+            # Wake up at least once per interval to notice pool changes
+            await asyncio.sleep(min(max(delay, 0.0), self.interval))
@@ -0,0 +1,192 @@
+"""
+Hedged requests for replicated local backends.
+
+When several copies of an app run behind ``Host(ports=[...])``, one of them
+stalling (garbage collection, a slow disk) makes every request it holds
+slow. :class:`Hedger` sends a second copy of a slow idempotent request to
+another backend and relays whichever answers first.
+"""
+
+import asyncio
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from .balancer import attempted_backends
+from .proxy import Request, Response
+
+
+# Methods that may safely be sent twice
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class Hedger:
+    """
+    Hedging stage for :class:`hostify.proxy.ReverseProxy`.
+
+    If the origin has not started answering an idempotent, bodiless request
+    after ``delay`` seconds, a copy goes to a different backend of the pool.
+    The first response wins; the other request is cancelled and its
+    connection closed. By default ``delay`` follows the ``percentile`` of
+    recent response times, so only the slowest few percent are hedged.
+    ``max_ratio`` caps hedges as a share of all requests so that an
+    overloaded pool isn't pushed over the edge by its own duplicates.
+    """
+
+    def __init__(
+        self,
+        delay: Optional[float] = None,
+        percentile: float = 0.95,
+        min_delay: float = 0.005,
+        max_ratio: float = 0.1,
+        window: int = 1000
+    ):
+        """
+        Initialize hedger.
+
+        Args:
+            delay: Fixed hedge delay in seconds (default: adaptive)
+            percentile: Response time percentile used as the adaptive delay
+            min_delay: Shortest adaptive delay
+            max_ratio: Largest share of requests that may be hedged
+            window: Recent response times the percentile is taken over
+        """
+        if not 0 < percentile < 1:
+            raise ValueError("percentile must be between 0 and 1")
+        if not 0 <= max_ratio <= 1:
+            raise ValueError("max_ratio must be between 0 and 1")
+
+        self.fixed_delay = delay
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_ratio = max_ratio
+
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._new_samples = 0
+        self._delay = delay if delay is not None else 0.05
+        # Hedges earn max_ratio tokens per request; a hedge spends one
+        self._budget = 1.0
+
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.over_budget = 0
+
+    @property
+    def delay(self) -> float:
+        """Seconds after which a request is hedged."""
+        return self._delay
+
+    # -- stage protocol ----------------------------------------------------
+
+    async def handle(self, request: Request, call_next) -> Response:
+        if request.method not in IDEMPOTENT_METHODS or request.body.length != 0 or request.upgrade:
+            return await call_next(request)
+
+        self.requests += 1
+        self._budget = min(10.0, self._budget + self.max_ratio)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+
+        # Both copies share one list, so the pool sends them to different backends
+        attempted = []
+        token = attempted_backends.set(attempted)
+        try:
+            primary = asyncio.ensure_future(call_next(request))
+        finally:
+            attempted_backends.reset(token)
+
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self._delay)
+            if not done and self._budget < 1.0:
+                self.over_budget += 1
+            if done or self._budget < 1.0:
+                response = await primary
+                self._record(loop.time() - started)
+                return response
+        except BaseException:
+            await self._discard(primary)
+            raise
+
+        self._budget -= 1.0
+        self.hedged += 1
+        copy = Request(request.method, request.target, request.headers.copy(), None, request.version, request.client)
+        token = attempted_backends.set(attempted)
+        try:
+            hedge = asyncio.ensure_future(call_next(copy))
+        finally:
+            attempted_backends.reset(token)
+
+        try:
+            response, winner = await self._race(primary, hedge)
+        except BaseException:
+            for task in (primary, hedge):
+                await self._discard(task)
+            raise
+
+        if winner is hedge:
+            self.hedge_wins += 1
+        self._record(loop.time() - started)
+        return response
+
+    def summary(self) -> str:
+        return (
+            f"Hedging: {self.hedged} of {self.requests} requests hedged "
+            f"({self.hedge_wins} won by the hedge), delay {self._delay * 1000:.0f}ms"
+        )
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "over_budget": self.over_budget,
+            "delay_ms": self._delay * 1000,
+        }
+
+    # -- helpers -----------------------------------------------------------
+
+    async def _race(self, primary: asyncio.Future, hedge: asyncio.Future):
+        """
+        Wait for the first successful response of the two.
+
+        Returns:
+            Tuple of (response, winning task)
+        """
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    # Both may have answered in the same wake-up; close every loser
+                    for other in (done | pending) - {task}:
+                        await self._discard(other)
+                    return task.result(), task
+                error = error or task.exception()
+        raise error
+
+    @staticmethod
+    async def _discard(task: asyncio.Future) -> None:
+        """Cancel a losing request, or close its response if it already arrived."""
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except BaseException:
+                pass
+            return
+        if not task.cancelled() and task.exception() is None:
+            await task.result().aclose()
+
+    def _record(self, elapsed: float) -> None:
+        if self.fixed_delay is not None:
+            return
+        self._samples.append(elapsed)
+        self._new_samples += 1
+        # Re-sorting the window on every request would cost more than the
+        # hedging saves; refresh the percentile every 50 samples instead
+        if self._new_samples >= 50 and len(self._samples) >= 50:
+            self._new_samples = 0
+            ordered = sorted(self._samples)
+            value = ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+            self._delay = max(self.min_delay, value)
@@ -7,11 +7,20 @@ import sys
 import time
 import signal
 import atexit
-from typing import Optional
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
+from .admin import AdminAPI, new_token, write_control_file
+from .appserver import AppServer
+from .balancer import STRATEGIES, Backend, BackendPool
 from .cloudflare import Cloudflare, CloudflareAPIError
 from .cloudflared import Cloudflared, CloudflaredError
+from .health import HealthChecker, wait_until_healthy
+from .metrics import Metrics
+from .provision import StepGraph
+from .proxy import ProxyError, ReverseProxy
+from .trace import Tracer
 from .utils import is_port_in_use, start_static_server, validate_server
+from .warmup import Warmup
 
 
 class HostError(Exception):
@@ -28,14 +37,45 @@ class Host:
     
     Or with static files:
         Host(domain="app.example.com", path="./public").serve()
+    
+    Or load balanced across several local workers:
+        Host(domain="app.example.com", ports=[5001, 5002, 5003]).serve()
+    
+    Or with local proxy stages in front of the origin:
+        Host(domain="app.example.com", port=3000, middleware=[ResponseCache()]).serve()
+    
+    Or ready for zero-downtime deploys (see ``switch_origin``):
+        Host(domain="app.example.com", port=3000, blue_green=True).serve()
+    
+    Or taking failing workers out of rotation automatically:
+        Host(domain="app.example.com", ports=[5001, 5002],
+             health_check=HealthChecker(path="/health")).serve()
+    
+    Or serving a WSGI/ASGI app object directly:
+        Host(domain="app.example.com", app=flask_app, workers=4).serve()
+        Host(domain="app.example.com", asgi_app=fastapi_app).serve()
     """
     
+    # Seconds to wait for cloudflared to connect to the edge
+    TUNNEL_READY_TIMEOUT = 30.0
+    
     def __init__(
         self,
         domain: str,
         port: Optional[int] = None,
         path: Optional[str] = None,
-        api_token: Optional[str] = None
+        api_token: Optional[str] = None,
+        ports: Optional[List[int]] = None,
+        balance: str = "round_robin",
+        middleware: Optional[List] = None,
+        blue_green: bool = False,
+        app: Optional[Callable] = None,
+        asgi_app: Optional[Callable] = None,
+        workers: int = 1,
+        threads: int = 8,
+        health_check: Optional[HealthChecker] = None,
+        warmup: Optional[Warmup] = None,
+        trace: Optional[str] = None
     ):
         """
         Initialize Host instance.
@@ -45,6 +85,27 @@ class Host:
             port: Port of existing local server (mutually exclusive with path)
             path: Path to static files to serve (mutually exclusive with port)
             api_token: Cloudflare API token (optional, reads from CF_API_TOKEN env var)
+            ports: Ports of several identical local servers to load balance
+                across (mutually exclusive with port and path)
+            balance: Balancing strategy used with ``ports``: "round_robin",
+                "least_connections" or "power_of_two"
+            middleware: Local proxy stages (e.g. ``ResponseCache()``) to run
+                between cloudflared and the origin, outermost first
+            blue_green: Keep a local proxy in front of the origin so it can be
+                replaced with ``switch_origin()`` without touching the tunnel
+            app: WSGI application (Flask, Django, ...) to serve in-process
+                instead of pointing at a port
+            asgi_app: ASGI application (FastAPI, Starlette, ...) to serve
+                in-process instead of pointing at a port
+            workers: Worker processes for ``app``/``asgi_app``
+            threads: Threads per worker for ``app``
+            health_check: ``HealthChecker`` that probes the origin(s)
+                periodically and ejects failing ones from rotation
+            warmup: ``Warmup`` plan run against the origin(s) before the DNS
+                record is created
+            trace: Write the timings of every provisioning step, cleanup
+                phase and API call (``tracer``) to this path as Chrome
+                trace-event JSON, once the site is live and after cleanup
         
         Raises:
             HostError: If configuration is invalid
@@ -53,14 +114,37 @@ class Host:
         if not domain:
             raise HostError("Domain is required")
         
-        if port is None and path is None:
-            raise HostError("Either 'port' or 'path' must be specified")
+        sources = [s for s in (port, path, ports, app, asgi_app) if s is not None]
+        if not sources:
+            raise HostError("Either 'port', 'ports', 'path', 'app' or 'asgi_app' must be specified")
+        
+        if (app is not None or asgi_app is not None) and (len(sources) > 1 or blue_green or health_check):
+            raise HostError(
+                "'app' and 'asgi_app' cannot be combined with other origins, "
+                "blue_green or health_check"
+            )
+        
+        if workers < 1 or threads < 1:
+            raise HostError("'workers' and 'threads' must be at least 1")
         
         if port is not None and path is not None:
             raise HostError("Cannot specify both 'port' and 'path'")
         
-        if port is not None and (port < 1 or port > 65535):
-            raise HostError(f"Invalid port: {port}. Must be between 1 and 65535")
+        if len(sources) > 1:
+            raise HostError("Cannot combine 'ports' with 'port' or 'path'")
+        
+        if ports is not None and not ports:
+            raise HostError("'ports' must contain at least one port")
+        
+        for p in ([port] if port is not None else []) + list(ports or []):
+            if p < 1 or p > 65535:
+                raise HostError(f"Invalid port: {p}. Must be between 1 and 65535")
+        
+        if balance not in STRATEGIES:
+            raise HostError(
+                f"Invalid balance strategy: {balance}. "
+                f"Must be one of: {', '.join(sorted(STRATEGIES))}"
+            )
         
         if path is not None and not os.path.exists(path):
             raise HostError(f"Path does not exist: {path}")
@@ -71,9 +155,21 @@ class Host:
         self.domain = domain
         self.port = port
         self.path = path
+        self.ports = list(ports) if ports is not None else None
+        self.balance = balance
+        self.middleware = list(middleware or [])
+        self.blue_green = blue_green
+        self.app = app if app is not None else asgi_app
+        self.interface = "asgi" if asgi_app is not None else "wsgi"
+        self.workers = workers
+        self.threads = threads
+        self.health_check = health_check
+        self.warmup = warmup
+        self.trace = trace
         
         # Initialize components
-        self.cf = Cloudflare(api_token)
+        self.tracer = Tracer()
+        self.cf = Cloudflare(api_token, tracer=self.tracer)
         self.cloudflared = Cloudflared()
         
         # State tracking
@@ -82,6 +178,11 @@ class Host:
         self.zone_id: Optional[str] = None
         self.credentials_path: Optional[str] = None
         self.static_server_process = None
+        self.proxy: Optional[ReverseProxy] = None
+        self.admin: Optional[ReverseProxy] = None
+        self.admin_file: Optional[str] = None
+        self.backend_ports: List[int] = []
+        self.app_server: Optional[AppServer] = None
         
         # Register cleanup handlers
         atexit.register(self.cleanup)
@@ -94,10 +195,15 @@ class Host:
         
         This method:
         1. Validates the local server or starts static server
-        2. Creates Cloudflare tunnel
-        3. Creates DNS record
-        4. Starts cloudflared process
-        5. Monitors and keeps alive
+        2. Warms up the origin (if ``warmup`` is set)
+        3. Creates Cloudflare tunnel and configures its route
+        4. Creates DNS record
+        5. Starts cloudflared process and waits for it to connect
+        6. Monitors and keeps alive
+        
+        Steps that don't depend on each other run concurrently: the zone
+        lookup, tunnel creation, cloudflared download and origin startup
+        all begin at once (see ``_provision``).
         
         Raises:
             HostError: If setup fails
@@ -106,29 +212,15 @@ class Host:
             print(f"[HOSTIFY] Starting tunnel for {self.domain}")
             print("=" * 60)
             
-            # Step 1: Setup local server
-            self._setup_local_server()
-            
-            # Step 2: Create tunnel
-            print(f"\n[+] Creating Cloudflare tunnel...")
-            self._create_tunnel()
-            
-            # Step 3: Create DNS record
-            print(f"[+] Setting up DNS for {self.domain}...")
-            self._create_dns()
-            
-            # Step 4: Start tunnel
-            print(f"[+] Starting tunnel connection...")
-            self._start_tunnel()
-            
-            # Step 5: Wait for tunnel to be ready
-            print(f"[+] Waiting for tunnel to connect...")
-            time.sleep(5)  # Give tunnel time to establish
+            started = time.perf_counter()
+            self._provision()
+            self._write_trace()
             
             # Success!
             print("\n" + "=" * 60)
             print(f"[SUCCESS] Your site is now live at:")
             print(f"   https://{self.domain}")
+            print(f"   (ready in {time.perf_counter() - started:.1f}s)")
             print("=" * 60)
             print("\n[INFO] Press Ctrl+C to stop the tunnel and clean up\n")
             
@@ -143,6 +235,59 @@ class Host:
             self.cleanup()
             raise HostError(f"Failed to start hosting: {str(e)}")
     
+    def _provision(self, max_workers: Optional[int] = None) -> Dict[str, Tuple[float, float]]:
+        """
+        Bring up the origin, tunnel, DNS record and cloudflared.
+        
+        Each step starts as soon as the steps it needs are done:
+        
+        - origin, zone, tunnel, binary: nothing
+        - warmup: origin
+        - route: tunnel, origin
+        - dns: zone, tunnel, and warmup (or origin)
+        - start: binary, tunnel, origin
+        - ready: start
+        
+        so startup takes as long as the slowest chain instead of the sum
+        of all steps. Only a static file server is started alongside the
+        other steps. An app server or an existing port is set up first,
+        so a missing server fails before any API call and app workers
+        are forked before other threads are running.
+        
+        Args:
+            max_workers: Most steps running at once (1 runs them in order)
+        
+        Returns:
+            Start and end of each step in seconds since provisioning began
+        """
+        graph = StepGraph(self.tracer)
+        local: Tuple[str, ...] = ()
+        if self.path:
+            graph.add("origin", self._setup_local_server)
+            local = ("origin",)
+        graph.add("zone", self._find_dns)
+        graph.add("tunnel", self._create_tunnel)
+        graph.add("binary", self._fetch_cloudflared)
+        if self.warmup:
+            graph.add("warmup", self._warm_up, needs=local)
+        origin = ("warmup",) if self.warmup else local
+        graph.add("route", self._configure_route, needs=("tunnel",) + local)
+        graph.add("dns", self._create_dns, needs=("zone", "tunnel") + origin)
+        graph.add("start", self._start_tunnel, needs=("binary", "tunnel") + local)
+        graph.add("ready", self._wait_for_tunnel, needs=("start",))
+        
+        with self.tracer.span("provision"):
+            if not self.path:
+                with self.tracer.span("origin"):
+                    self._setup_local_server()
+            print(f"[+] Provisioning {self.domain} ({len(graph)} steps, independent ones concurrently)...")
+            timings = graph.run(max_workers)
+        
+        path = graph.critical_path()
+        steps = " > ".join(f"{name} {timings[name][1] - timings[name][0]:.1f}s" for name in path)
+        print(f"    [INFO] Critical path ({timings[path[-1]][1]:.1f}s): {steps}")
+        return timings
+    
     def _setup_local_server(self) -> None:
         """Setup or validate local server."""
         if self.path:
@@ -157,10 +302,9 @@ class Host:
             
             self.static_server_process = start_static_server(self.path, self.port)
             
-            # Give server more time to start and retry validation
-            max_retries = 5
-            for i in range(max_retries):
-                time.sleep(1)
+            # Poll until the server accepts connections (up to 5s)
+            for i in range(50):
+                time.sleep(0.1)
                 if validate_server(self.port):
                     break
             else:
@@ -172,17 +316,262 @@ class Host:
             
             print(f"    [OK] Server running on http://localhost:{self.port}")
         
+        elif self.app is not None:
+            self._start_app_server()
+            return
+        
         else:
-            # Validate existing server
-            print(f"[+] Checking for server on port {self.port}...")
-            
-            if not validate_server(self.port):
+            # Validate existing server(s)
+            for backend_port in self.ports or [self.port]:
+                print(f"[+] Checking for server on port {backend_port}...")
+                
+                if not validate_server(backend_port):
+                    raise HostError(
+                        f"No server found on port {backend_port}. "
+                        f"Make sure your application is running first."
+                    )
+                
+                print(f"    [OK] Server detected on http://localhost:{backend_port}")
+        
+        if self.ports or self.middleware or self.blue_green or self.health_check:
+            self._start_proxy()
+    
+    def _start_proxy(self) -> None:
+        """Put the local proxy in front of the origin(s) and point the tunnel at it."""
+        self.backend_ports = self.ports or [self.port]
+        
+        if len(self.backend_ports) > 1:
+            print(f"[+] Starting load balancer ({self.balance}) for {len(self.backend_ports)} backends...")
+        else:
+            print(f"[+] Starting local proxy...")
+        
+        try:
+            self.proxy = ReverseProxy(
+                BackendPool.from_ports(self.backend_ports, self.balance),
+                middleware=self.middleware
+            )
+            self.port = self.proxy.start()
+            self._start_admin()
+            if self.health_check:
+                self._start_health_check()
+        except (ProxyError, OSError, ValueError) as e:
+            raise HostError(str(e))
+        
+        print(f"    [OK] Local proxy running on http://localhost:{self.port}")
+    
+    def _start_health_check(self) -> None:
+        """Run periodic health checks on the proxy's event loop."""
+        checker = self.health_check
+        checker.pool = self.proxy.upstream
+        if checker.on_change is None:
+            checker.on_change = self._health_changed
+        self.proxy.call(checker.start())
+        print(f"    [OK] Health checks: GET {checker.path} every {checker.interval:g}s")
+    
+    @staticmethod
+    def _health_changed(backend: Backend, healthy: bool) -> None:
+        if healthy:
+            print(f"[OK] Origin on port {backend.port} is healthy again, back in rotation")
+        else:
+            print(f"[WARN] Origin on port {backend.port} failed health checks, taken out of rotation")
+    
+    def _start_app_server(self) -> None:
+        """Serve the WSGI/ASGI app in-process and point the tunnel at it."""
+        workers = f"{self.workers} worker{'s' if self.workers > 1 else ''}"
+        print(f"[+] Starting {self.interface.upper()} app server ({workers})...")
+        
+        try:
+            self.app_server = AppServer(
+                self.app,
+                self.interface,
+                workers=self.workers,
+                threads=self.threads,
+                middleware=self.middleware
+            )
+            self.port = self.app_server.start()
+        except (ProxyError, OSError) as e:
+            raise HostError(str(e))
+        
+        print(f"    [OK] App running on http://localhost:{self.port}")
+    
+    def _warm_up(self) -> None:
+        """Request the warm-up URLs until the origin's response times settle."""
+        ports = self.backend_ports or [self.port]
+        print(f"[+] Warming up origin...")
+        
+        def report(stats: Dict) -> None:
+            print(
+                f"    [INFO] Round {stats['round']}: p50 {stats['p50_ms']:.1f}ms, "
+                f"p95 {stats['p95_ms']:.1f}ms, max {stats['max_ms']:.1f}ms "
+                f"({stats['requests']} requests, {stats['errors']} errors)"
+            )
+        
+        self.warmup.run(ports, self.domain, on_round=report)
+        if self.warmup.settled:
+            print(f"    [OK] Origin warm after {len(self.warmup.rounds)} rounds ({self.warmup.duration:.1f}s)")
+        else:
+            print(f"    [WARN] Response times still changing after {len(self.warmup.rounds)} rounds, going live anyway")
+    
+    def _start_admin(self) -> None:
+        """Start the loopback control endpoint used by the CLI."""
+        api = AdminAPI(new_token())
+        api.route("POST", "/switch", self._admin_switch)
+        api.route("GET", "/status", self._admin_status)
+        api.route("GET", "/metrics", self._admin_metrics)
+        
+        self.admin = ReverseProxy(api)
+        self.proxy.call(self.admin.start_async())
+        self.admin_file = write_control_file(self.domain, self.admin.port, api.token)
+    
+    async def _admin_switch(self, payload: Dict):
+        ports = payload.get("ports") or [payload.get("port")]
+        try:
+            result = await self._switch_origin(
+                self._validate_ports(ports),
+                payload.get("health_path", "/"),
+                float(payload.get("drain_timeout", 30.0)),
+                float(payload.get("ready_timeout", 30.0))
+            )
+        except HostError as e:
+            return 409, {"error": str(e)}
+        return 200, result
+    
+    async def _admin_status(self, payload: Dict):
+        return 200, {
+            "domain": self.domain,
+            "proxy_port": self.port,
+            "backends": [
+                {"port": b.port, "active": b.active, "requests": b.requests, "healthy": b.healthy}
+                for b in self.proxy.upstream.backends
+            ],
+        }
+    
+    async def _admin_metrics(self, payload: Dict):
+        stage = self._metrics_stage()
+        if stage is None:
+            return 404, {"error": "No Metrics stage in middleware"}
+        return 200, stage.snapshot()
+    
+    def _metrics_stage(self) -> Optional[Metrics]:
+        for stage in self.middleware:
+            if isinstance(stage, Metrics):
+                return stage
+        return None
+    
+    def metrics(self) -> Dict:
+        """
+        Latency histograms, status counts and slow requests recorded so far.
+        
+        Needs a :class:`hostify.metrics.Metrics` stage in ``middleware``.
+        With ``app`` and ``workers`` above 1 every worker process keeps its
+        own numbers, which are not available here.
+        
+        Returns:
+            Dict as returned by ``Metrics.snapshot()``
+        
+        Raises:
+            HostError: If no Metrics stage is configured
+        """
+        stage = self._metrics_stage()
+        if stage is None:
+            raise HostError("No Metrics stage in middleware")
+        
+        # Read on the proxy's loop so the numbers aren't changing underneath
+        proxy = self.proxy or (self.app_server.server if self.app_server else None)
+        if proxy is not None and proxy.loop is not None and proxy.loop.is_running():
+            async def snapshot():
+                return stage.snapshot()
+            return proxy.call(snapshot(), timeout=5)
+        return stage.snapshot()
+    
+    def switch_origin(
+        self,
+        new_port: Union[int, List[int]],
+        health_path: str = "/",
+        drain_timeout: float = 30.0,
+        ready_timeout: float = 30.0
+    ) -> Dict:
+        """
+        Move traffic to a new origin without restarting the tunnel.
+        
+        The new origin is health-checked first. Once it passes, new requests
+        go to it immediately while requests already running on the old
+        origin are allowed to finish. The old origin can be stopped once
+        this method returns.
+        
+        Args:
+            new_port: Port (or list of ports) of the new origin
+            health_path: Path probed on the new origin before switching
+            drain_timeout: Seconds to wait for the old origin to go idle
+            ready_timeout: Seconds to wait for the new origin to pass
+        
+        Returns:
+            Dict with the new ``ports`` and whether the old origin ``drained``
+        
+        Raises:
+            HostError: If no local proxy is running or the new origin is unhealthy
+        """
+        if not self.proxy:
+            raise HostError(
+                "switch_origin() needs the local proxy. "
+                "Create Host with blue_green=True and call serve() first."
+            )
+        
+        ports = self._validate_ports([new_port] if isinstance(new_port, int) else new_port)
+        timeout = ready_timeout + drain_timeout + 10
+        return self.proxy.call(
+            self._switch_origin(ports, health_path, drain_timeout, ready_timeout),
+            timeout=timeout
+        )
+    
+    async def _switch_origin(
+        self,
+        ports: List[int],
+        health_path: str,
+        drain_timeout: float,
+        ready_timeout: float
+    ) -> Dict:
+        pool = self.proxy.upstream
+        current = {b.port: b for b in pool.backends}
+        backends = [current.get(p) or Backend(p) for p in ports]
+        # Backends already in the pool keep serving if the switch is aborted
+        created = [b for b in backends if b.port not in current]
+        
+        print(f"\n[+] Switching origin to port(s) {', '.join(map(str, ports))}...")
+        for backend in backends:
+            if not await wait_until_healthy(backend, health_path, ready_timeout):
+                for new in created:
+                    await new.close()
                 raise HostError(
-                    f"No server found on port {self.port}. "
-                    f"Make sure your application is running first."
+                    f"New origin on port {backend.port} did not pass its health check "
+                    f"(GET {health_path}) within {ready_timeout:.0f}s"
                 )
-            
-            print(f"    [OK] Server detected on http://localhost:{self.port}")
+        print(f"    [OK] New origin is healthy")
+        
+        old_ports = [b.port for b in pool.backends]
+        drained = await pool.replace(backends, drain_timeout)
+        self.backend_ports = ports
+        
+        print(f"    [OK] Traffic moved from port(s) {', '.join(map(str, old_ports))}")
+        if drained:
+            print(f"    [OK] Old origin drained, safe to stop")
+        else:
+            print(f"    [WARN] Old origin still had requests after {drain_timeout:.0f}s")
+        
+        return {"ports": ports, "previous_ports": old_ports, "drained": drained}
+    
+    @staticmethod
+    def _validate_ports(ports) -> List[int]:
+        try:
+            ports = [int(p) for p in ports]
+        except (TypeError, ValueError):
+            raise HostError(f"Invalid port list: {ports}")
+        if not ports:
+            raise HostError("At least one port is required")
+        for p in ports:
+            if p < 1 or p > 65535:
+                raise HostError(f"Invalid port: {p}. Must be between 1 and 65535")
+        return ports
     
     def _create_tunnel(self) -> None:
         """Create Cloudflare tunnel."""
@@ -198,9 +587,13 @@ class Host:
             
             print(f"    [OK] Tunnel created: {self.tunnel_id}")
             print(f"    [OK] Credentials saved: {self.credentials_path}")
-            
-            # Configure tunnel route
-            print(f"    [+] Configuring tunnel route...")
+        
+        except CloudflareAPIError as e:
+            raise HostError(f"Failed to create tunnel: {str(e)}")
+    
+    def _configure_route(self) -> None:
+        """Point the tunnel's ingress for the domain at the local origin."""
+        try:
             self.cf.configure_tunnel_route(
                 self.tunnel_id,
                 self.domain,
@@ -211,8 +604,8 @@ class Host:
         except CloudflareAPIError as e:
             raise HostError(f"Failed to create tunnel: {str(e)}")
     
-    def _create_dns(self) -> None:
-        """Create DNS record."""
+    def _find_dns(self) -> None:
+        """Look up the zone and any existing DNS record for the domain."""
         try:
             # Get zone ID
             self.zone_id = self.cf.get_zone_id(self.domain)
@@ -223,18 +616,33 @@ class Host:
                 print(f"    [WARN] DNS record already exists for {self.domain}")
                 print(f"    [INFO] Existing record will be used")
                 self.dns_record_id = existing["id"]
-            else:
-                # Create new record
-                self.dns_record_id = self.cf.create_dns_record(
-                    self.zone_id,
-                    self.domain,
-                    self.tunnel_id
-                )
-                print(f"    [OK] DNS record created: {self.dns_record_id}")
         
         except CloudflareAPIError as e:
             raise HostError(f"Failed to create DNS record: {str(e)}")
     
+    def _create_dns(self) -> None:
+        """Create DNS record unless ``_find_dns`` found one."""
+        if self.dns_record_id:
+            return
+        
+        try:
+            self.dns_record_id = self.cf.create_dns_record(
+                self.zone_id,
+                self.domain,
+                self.tunnel_id
+            )
+            print(f"    [OK] DNS record created: {self.dns_record_id}")
+        
+        except CloudflareAPIError as e:
+            raise HostError(f"Failed to create DNS record: {str(e)}")
+    
+    def _fetch_cloudflared(self) -> None:
+        """Download the cloudflared binary unless it is cached already."""
+        try:
+            self.cloudflared.get_binary_path()
+        except CloudflaredError as e:
+            raise HostError(f"Failed to start tunnel: {str(e)}")
+    
     def _start_tunnel(self) -> None:
         """Start cloudflared tunnel process."""
         try:
@@ -249,6 +657,15 @@ class Host:
         except CloudflaredError as e:
             raise HostError(f"Failed to start tunnel: {str(e)}")
     
+    def _wait_for_tunnel(self) -> None:
+        """Wait for cloudflared to register a connection with the edge."""
+        if self.cloudflared.wait_until_ready(self.TUNNEL_READY_TIMEOUT):
+            print(f"    [OK] Tunnel connected")
+        elif not self.cloudflared.is_running():
+            raise HostError("Failed to start tunnel: cloudflared exited before connecting")
+        else:
+            print(f"    [WARN] Tunnel not connected after {self.TUNNEL_READY_TIMEOUT:.0f}s, continuing anyway")
+    
     def _keep_alive(self) -> None:
         """Keep the tunnel alive and monitor status."""
         try:
@@ -258,13 +675,17 @@ class Host:
                     print("[INFO] Attempting to restart...")
                     
                     self._start_tunnel()
-                    time.sleep(5)
                     
-                    if self.cloudflared.is_running():
+                    if self.cloudflared.wait_until_ready(self.TUNNEL_READY_TIMEOUT):
                         print("[OK] Tunnel restarted successfully")
+                    elif self.cloudflared.is_running():
+                        print("[WARN] Tunnel restarted but not connected yet")
                     else:
                         raise HostError("Failed to restart tunnel")
                 
+                if self.app_server and self.app_server.ensure_workers():
+                    print("[WARN] App worker exited unexpectedly, restarted")
+                
                 time.sleep(10)  # Check every 10 seconds
         
         except KeyboardInterrupt:
@@ -279,58 +700,112 @@ class Host:
         2. Deletes DNS record
         3. Deletes tunnel
         4. Stops static server if running
+        5. Stops local proxy if running
+        6. Stops in-process app server if running
         """
         print("\n[CLEANUP] Cleaning up resources...")
         
         # Stop cloudflared
         if self.cloudflared:
-            try:
-                self.cloudflared.stop_tunnel()
-                print("    [OK] Stopped tunnel process")
-            except Exception as e:
-                print(f"    [WARN] Error stopping tunnel: {str(e)}")
+            with self.tracer.span("cloudflared", "cleanup"):
+                try:
+                    self.cloudflared.stop_tunnel()
+                    print("    [OK] Stopped tunnel process")
+                except Exception as e:
+                    print(f"    [WARN] Error stopping tunnel: {str(e)}")
         
         # Delete DNS record
         if self.dns_record_id and self.zone_id:
-            try:
-                # Only delete if we created it (not existing)
-                self.cf.delete_dns_record(self.zone_id, self.dns_record_id)
-                print("    [OK] Deleted DNS record")
-            except Exception as e:
-                # If it's already deleted (404), that's fine - no warning needed
-                error_str = str(e)
-                if "404" in error_str or "not found" in error_str.lower():
-                    print("    [OK] DNS record already deleted")
-                else:
-                    print(f"    [WARN] Error deleting DNS record: {error_str}")
+            with self.tracer.span("dns", "cleanup"):
+                try:
+                    # Only delete if we created it (not existing)
+                    self.cf.delete_dns_record(self.zone_id, self.dns_record_id)
+                    print("    [OK] Deleted DNS record")
+                except Exception as e:
+                    # If it's already deleted (404), that's fine - no warning needed
+                    error_str = str(e)
+                    if "404" in error_str or "not found" in error_str.lower():
+                        print("    [OK] DNS record already deleted")
+                    else:
+                        print(f"    [WARN] Error deleting DNS record: {error_str}")
         
         # Delete tunnel
         if self.tunnel_id:
-            try:
-                self.cf.delete_tunnel(self.tunnel_id, force=True)
-                print("    [OK] Deleted tunnel")
-            except Exception as e:
-                print(f"    [WARN] Error deleting tunnel: {str(e)}")
+            with self.tracer.span("tunnel", "cleanup"):
+                try:
+                    self.cf.delete_tunnel(self.tunnel_id, force=True)
+                    print("    [OK] Deleted tunnel")
+                except Exception as e:
+                    print(f"    [WARN] Error deleting tunnel: {str(e)}")
+        
+        # No more API calls from here on
+        self.cf.close()
         
         # Delete credentials file
         if self.credentials_path and os.path.exists(self.credentials_path):
-            try:
-                os.remove(self.credentials_path)
-                print("    [OK] Deleted credentials file")
-            except Exception as e:
-                print(f"    [WARN] Error deleting credentials: {str(e)}")
+            with self.tracer.span("credentials", "cleanup"):
+                try:
+                    os.remove(self.credentials_path)
+                    print("    [OK] Deleted credentials file")
+                except Exception as e:
+                    print(f"    [WARN] Error deleting credentials: {str(e)}")
         
         # Stop static server
         if self.static_server_process:
-            try:
-                self.static_server_process.terminate()
-                self.static_server_process.wait(timeout=5)
-                print("    [OK] Stopped static file server")
-            except Exception as e:
-                print(f"    [WARN] Error stopping static server: {str(e)}")
+            with self.tracer.span("static server", "cleanup"):
+                try:
+                    self.static_server_process.terminate()
+                    self.static_server_process.wait(timeout=5)
+                    print("    [OK] Stopped static file server")
+                except Exception as e:
+                    print(f"    [WARN] Error stopping static server: {str(e)}")
+        
+        # Stop local proxy
+        if self.proxy:
+            with self.tracer.span("proxy", "cleanup"):
+                for line in self.proxy.summary():
+                    print(f"    [INFO] {line}")
+                if self.health_check:
+                    print(f"    [INFO] {self.health_check.summary()}")
+                try:
+                    if self.health_check:
+                        self.proxy.call(self.health_check.close(), timeout=5)
+                    if self.admin:
+                        self.proxy.call(self.admin.stop_async(), timeout=5)
+                        self.admin = None
+                    if self.admin_file and os.path.exists(self.admin_file):
+                        os.remove(self.admin_file)
+                    self.proxy.stop()
+                    self.proxy = None
+                    print("    [OK] Stopped local proxy")
+                except Exception as e:
+                    print(f"    [WARN] Error stopping local proxy: {str(e)}")
         
+        # Stop app server
+        if self.app_server:
+            with self.tracer.span("app server", "cleanup"):
+                for line in self.app_server.summary():
+                    print(f"    [INFO] {line}")
+                try:
+                    self.app_server.stop()
+                    self.app_server = None
+                    print("    [OK] Stopped app server")
+                except Exception as e:
+                    print(f"    [WARN] Error stopping app server: {str(e)}")
+        
+        self._write_trace()
         print("\n[SUCCESS] Cleanup complete!\n")
     
+    def _write_trace(self) -> None:
+        """Write the trace file if ``trace`` is set."""
+        if not self.trace:
+            return
+        try:
+            self.tracer.write(self.trace)
+            print(f"    [OK] Trace written to {self.trace} ({len(self.tracer.spans)} spans)")
+        except OSError as e:
+            print(f"    [WARN] Error writing trace: {str(e)}")
+    
     def _signal_handler(self, signum, frame):
         """Handle interrupt signals."""
         raise KeyboardInterrupt
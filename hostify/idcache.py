@@ -0,0 +1,107 @@
+"""
+On-disk cache of Cloudflare account and zone IDs.
+
+Looking up the account and the zone costs two API round trips before any
+real work can start, and their IDs practically never change. :class:`IDCache`
+keeps them in a small JSON file under ``~/.hostify`` so that every
+``hostify`` run after the first skips those lookups. The file is replaced
+atomically and updated under a file lock, so concurrent processes never see
+a torn file or lose each other's entries.
+"""
+
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: atomic replace only, concurrent updates may drop an entry
+    fcntl = None
+
+
+DEFAULT_PATH = "~/.hostify/ids.json"
+
+
+class IDCache:
+    """
+    TTL'd key/value store for IDs, shared by all processes of the user.
+
+    Entries are namespaced by a fingerprint of the API token, because
+    different tokens can see different accounts and zones.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, ttl: float = 7 * 24 * 3600, token: str = ""):
+        """
+        Initialize ID cache.
+
+        Args:
+            path: Cache file
+            ttl: Seconds an entry stays valid
+            token: API token the entries belong to
+        """
+        self.path = os.path.expanduser(path)
+        self.ttl = ttl
+        self.namespace = hashlib.sha256(token.encode("utf-8")).hexdigest()[:16]
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached value for ``key``, or None if missing or expired."""
+        entry = self._read().get(self._key(key))
+        if not entry or entry.get("expires", 0) <= time.time():
+            return None
+        return entry.get("value")
+
+    def set(self, values: Dict[str, str]) -> None:
+        """Store ``values`` (key -> ID), each valid for ``ttl`` seconds."""
+        expires = time.time() + self.ttl
+        with self._update() as entries:
+            for key, value in values.items():
+                entries[self._key(key)] = {"value": value, "expires": expires}
+
+    def invalidate(self, keys: Iterable[str]) -> None:
+        """Drop ``keys`` from the cache."""
+        with self._update() as entries:
+            for key in keys:
+                entries.pop(self._key(key), None)
+
+    # -- helpers -----------------------------------------------------------
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _read(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    @contextmanager
+    def _update(self):
+        """Read-modify-write the cache file under an exclusive lock."""
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            lock = open(f"{self.path}.lock", "a")
+        except OSError:
+            # Read-only home: run without the cache
+            yield {}
+            return
+        try:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            now = time.time()
+            entries = {k: v for k, v in self._read().items() if isinstance(v, dict) and v.get("expires", 0) > now}
+            yield entries
+
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+        finally:
+            lock.close()
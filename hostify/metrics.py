@@ -0,0 +1,289 @@
+"""
+Request metrics stage for the local proxy.
+
+:class:`Metrics` records how long the origin takes per route in fixed-size
+log-linear histograms (the HDR histogram layout), counts status codes and
+upstream connection setup time, and keeps the full timing breakdown of the
+most recent slow requests in a ring buffer. Memory stays bounded however
+long the proxy runs: each histogram is a fixed array of counters and the
+number of routes and slow samples is capped.
+"""
+
+import re
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional, Sequence
+
+from .balancer import request_timing
+from .proxy import Body, Request, Response
+
+
+# Path segments that identify a record rather than a route (/users/123)
+_ID_SEGMENT = re.compile(r"^(\d+|[0-9a-fA-F-]{16,}|[0-9a-fA-F]{8,})$")
+
+
+class LatencyHistogram:
+    """
+    Log-linear latency histogram with better than 2% relative precision.
+
+    Values are kept in microseconds. Below 64us every value has its own
+    counter; above, every power of two is split into 32 equal sub-buckets,
+    so 1024 counters cover 64 + 30 * 32 of them, up to 2**36us (about 19
+    hours). Longer values are counted in the last bucket.
+    """
+
+    SUB_BUCKET_BITS = 6
+    BUCKETS = 1024
+
+    def __init__(self):
+        self.counts: List[int] = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.min = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        """Add one measurement."""
+        if self.count == 0 or seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.count += 1
+        self.total += seconds
+        self.counts[self._index(max(0, int(seconds * 1e6)))] += 1
+
+    def percentile(self, q: float) -> float:
+        """Value (seconds) at quantile ``q`` (0-1); 0 if empty."""
+        if not self.count:
+            return 0.0
+        rank = max(1, int(q * self.count + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.max, self._value(index) / 1e6)
+        return self.max
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        """Add all measurements of ``other`` to this histogram."""
+        if not other.count:
+            return
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.min = other.min if not self.count else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.count += other.count
+        self.total += other.total
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(0.50) * 1000,
+            "p90_ms": self.percentile(0.90) * 1000,
+            "p99_ms": self.percentile(0.99) * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+    @classmethod
+    def _index(cls, micros: int) -> int:
+        bits = cls.SUB_BUCKET_BITS
+        if micros < (1 << bits):
+            return micros
+        shift = micros.bit_length() - bits
+        index = (1 << bits) + (shift - 1) * (1 << (bits - 1)) + (micros >> shift) - (1 << (bits - 1))
+        return min(index, cls.BUCKETS - 1)
+
+    @classmethod
+    def _value(cls, index: int) -> float:
+        """Midpoint (microseconds) of the range counted at ``index``."""
+        bits = cls.SUB_BUCKET_BITS
+        if index < (1 << bits):
+            return float(index)
+        shift, offset = divmod(index - (1 << bits), 1 << (bits - 1))
+        low = (offset + (1 << (bits - 1))) << (shift + 1)
+        return low + (1 << shift)
+
+
+class Metrics:
+    """
+    Measuring stage for :class:`hostify.proxy.ReverseProxy`.
+
+    For every request it records, per route:
+
+    - total time until the response body was relayed,
+    - time until the origin sent the response head,
+    - the status code,
+
+    plus how long opening upstream connections took. Requests slower than
+    ``slow_threshold`` seconds keep their full breakdown in a ring buffer of
+    the last ``slow_capacity``.
+
+    Routes are the first ``route_depth`` path segments, with numeric and
+    hash-like segments replaced by ``:id``; pass ``routes`` (path prefixes)
+    to group explicitly instead. At most ``max_routes`` routes are tracked,
+    the rest are counted under ``"other"``.
+
+    Put it last in the middleware list to time the origin alone, or first to
+    include the other stages (cache hits, shed requests).
+    """
+
+    def __init__(
+        self,
+        slow_threshold: float = 1.0,
+        slow_capacity: int = 100,
+        routes: Optional[Sequence[str]] = None,
+        route_depth: int = 2,
+        max_routes: int = 100
+    ):
+        """
+        Initialize metrics.
+
+        Args:
+            slow_threshold: Seconds above which a request is sampled as slow
+            slow_capacity: Slow requests kept (oldest are dropped)
+            routes: Path prefixes to group requests by
+            route_depth: Path segments forming a route when ``routes`` is not given
+            max_routes: Most routes tracked separately
+        """
+        self.slow_threshold = slow_threshold
+        self.routes = sorted(routes, key=len, reverse=True) if routes else None
+        self.route_depth = route_depth
+        self.max_routes = max_routes
+
+        self.latency: Dict[str, LatencyHistogram] = {}
+        self.head_latency: Dict[str, LatencyHistogram] = {}
+        self.connect = LatencyHistogram()
+        self.statuses: Counter = Counter()
+        self.slow: Deque[Dict[str, object]] = deque(maxlen=slow_capacity)
+        self.requests = 0
+        self.slow_requests = 0
+        self.reused = 0
+
+    # -- stage protocol ----------------------------------------------------
+
+    async def handle(self, request: Request, call_next) -> Response:
+        timing: Dict[str, object] = {}
+        token = request_timing.set(timing)
+        started = time.perf_counter()
+        wall = time.time()
+        try:
+            response = await call_next(request)
+        except BaseException:
+            self.statuses["error"] += 1
+            raise
+        finally:
+            request_timing.reset(token)
+
+        head = time.perf_counter() - started
+        route = self.route(request.path)
+
+        def done(completed: bool) -> None:
+            total = time.perf_counter() - started
+            self._record(request, response.status, route, timing, wall, head, total, completed)
+
+        if response.upgraded is not None:
+            done(True)
+            return response
+        source = response.body
+        response.body = Body(source, source.length, done)
+        return response
+
+    def summary(self) -> str:
+        overall = self.overall()
+        return (
+            f"Latency: p50 {overall.percentile(0.5) * 1000:.1f}ms, "
+            f"p99 {overall.percentile(0.99) * 1000:.1f}ms over {self.requests} requests, "
+            f"{self.slow_requests} slower than {self.slow_threshold:g}s"
+        )
+
+    def stats(self) -> Dict[str, float]:
+        overall = self.overall()
+        return {
+            "requests": self.requests,
+            "slow": self.slow_requests,
+            "p50_ms": overall.percentile(0.50) * 1000,
+            "p99_ms": overall.percentile(0.99) * 1000,
+            "connect_p99_ms": self.connect.percentile(0.99) * 1000,
+            "reused_ratio": self.reused / self.requests if self.requests else 0.0,
+        }
+
+    # -- queries -----------------------------------------------------------
+
+    def route(self, path: str) -> str:
+        """Route ``path`` is counted under."""
+        if self.routes is not None:
+            for prefix in self.routes:
+                if path.startswith(prefix):
+                    return prefix
+            return "other"
+        segments = [s for s in path.split("/") if s][:self.route_depth]
+        return "/" + "/".join(":id" if _ID_SEGMENT.match(s) else s for s in segments)
+
+    def overall(self) -> LatencyHistogram:
+        """All routes merged into one histogram."""
+        merged = LatencyHistogram()
+        for histogram in self.latency.values():
+            merged.merge(histogram)
+        return merged
+
+    def snapshot(self) -> Dict[str, object]:
+        """Everything recorded so far, as JSON-serialisable data."""
+        return {
+            "requests": self.requests,
+            "overall": self.overall().snapshot(),
+            "routes": {
+                route: dict(histogram.snapshot(), head_p50_ms=self.head_latency[route].percentile(0.5) * 1000)
+                for route, histogram in sorted(self.latency.items())
+            },
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items(), key=str)},
+            "connect": dict(self.connect.snapshot(), reused=self.reused),
+            "slow_threshold_ms": self.slow_threshold * 1000,
+            "slow": list(self.slow),
+        }
+
+    # -- helpers -----------------------------------------------------------
+
+    def _record(
+        self,
+        request: Request,
+        status: int,
+        route: str,
+        timing: Dict[str, object],
+        wall: float,
+        head: float,
+        total: float,
+        completed: bool
+    ) -> None:
+        if route not in self.latency:
+            if len(self.latency) >= self.max_routes:
+                route = "other"
+            if route not in self.latency:
+                self.latency[route] = LatencyHistogram()
+                self.head_latency[route] = LatencyHistogram()
+
+        self.requests += 1
+        self.statuses[status] += 1
+        self.latency[route].record(total)
+        self.head_latency[route].record(head)
+        connect = timing.get("connect")
+        if connect is not None:
+            self.connect.record(connect)
+        if timing.get("reused"):
+            self.reused += 1
+
+        if total >= self.slow_threshold:
+            self.slow_requests += 1
+            self.slow.append({
+                "time": wall,
+                "method": request.method,
+                "target": request.target,
+                "route": route,
+                "status": status,
+                "backend": timing.get("backend"),
+                "reused": timing.get("reused"),
+                "connect_ms": (connect or 0.0) * 1000,
+                "head_ms": head * 1000,
+                "body_ms": (total - head) * 1000,
+                "total_ms": total * 1000,
+                "completed": completed,
+            })
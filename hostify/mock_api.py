@@ -0,0 +1,707 @@
+"""
+Local stand-in for the parts of the Cloudflare API hostify uses.
+
+:class:`MockCloudflareAPI` serves the account, zone, tunnel, tunnel
+configuration and DNS record endpoints from memory, so :class:`Host` and
+:class:`hostify.cloudflare.Cloudflare` can be tested and benchmarked
+without an account or network access. Point a client at ``base_url``
+(``Cloudflare(base_url=...)``, or the ``CLOUDFLARE_API_BASE_URL``
+environment variable for ``Host`` and the CLI).
+
+Slow, failing and throttling APIs can be simulated: every call can be
+delayed (``latency``, ``jitter``), a share of calls can fail with a
+``502`` (``error_rate``), calls beyond a request budget are answered with
+``429`` and ``Retry-After`` (``rate_limit``), and :meth:`fail` scripts
+specific errors. The stand-in also serves a fake ``cloudflared`` to
+download, which only answers its readiness check.
+
+Run it on its own with::
+
+    python -m hostify.mock_api --port 8787 --zone example.com --latency-ms 100
+"""
+
+import argparse
+import collections
+import copy
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl
+
+
+API_PREFIX = "/client/v4"
+
+# Fake cloudflared served at /__mock/cloudflared: waits ``connect_delay``
+# seconds, as if connecting to the edge, then answers GET /ready on the
+# metrics address hostify passes it
+CLOUDFLARED_SCRIPT = """#!{python}
+import sys, time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+host, port = sys.argv[sys.argv.index("--metrics") + 1].rsplit(":", 1)
+time.sleep({connect_delay})
+
+class Ready(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200 if self.path == "/ready" else 404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+HTTPServer((host, int(port)), Ready).serve_forever()
+"""
+
+
+class APIError(Exception):
+    """Error answer of a stand-in endpoint."""
+
+    def __init__(self, status: int, code: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+
+
+class MockCloudflareAPI:
+    """
+    In-memory Cloudflare API served over HTTP on localhost::
+
+        with MockCloudflareAPI(zones=["example.com"], latency=0.05) as api:
+            cf = Cloudflare("token", base_url=api.base_url)
+            cf.get_zone_id("app.example.com")
+            api.stats()["calls"]  # 1
+
+    Call counts are kept per endpoint (``"GET /zones/:id/dns_records"``),
+    along with the connections opened and the errors injected.
+    """
+
+    def __init__(
+        self,
+        zones: Sequence[str] = ("example.com",),
+        token: Optional[str] = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit: Optional[Tuple[int, float]] = None,
+        download_delay: float = 0.0,
+        connect_delay: float = 0.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seed: Optional[int] = None
+    ):
+        """
+        Initialize stand-in API (call :meth:`start` to serve it).
+
+        Args:
+            zones: Names of the account's active zones
+            token: API token calls must carry (default: any)
+            latency: Seconds added to every API call
+            jitter: Up to this many seconds more, picked at random per call
+            error_rate: Share of API calls answered with ``502 Bad Gateway``
+            rate_limit: (requests, seconds): calls beyond ``requests`` in any
+                ``seconds`` are answered with ``429`` and ``Retry-After``
+            download_delay: Seconds the cloudflared download takes
+            connect_delay: Seconds the fake cloudflared takes to be ready
+            host: Address to listen on
+            port: Port to listen on (default: any free port)
+            seed: Seed for the jitter and injected errors
+        """
+        if not 0 <= error_rate <= 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        if rate_limit is not None and (rate_limit[0] < 1 or rate_limit[1] <= 0):
+            raise ValueError("rate_limit must allow at least one request in a positive window")
+        self.token = token
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.download_delay = download_delay
+        self.connect_delay = connect_delay
+        self.address = (host, port)
+
+        self._lock = threading.Lock()
+        self.account = {"id": self._new_id(), "name": "Mock account"}
+        self.zones: Dict[str, Dict] = {}
+        self.tunnels: Dict[str, Dict] = {}
+        self.configurations: Dict[str, Dict] = {}
+        self.records: Dict[str, Dict[str, Dict]] = {}
+        # Record IDs by zone and name, for name filters and conflict checks
+        self._names: Dict[str, Dict[str, Dict[str, None]]] = {}
+        for name in zones:
+            self.add_zone(name)
+
+        self._random = random.Random(seed)
+        self._failures: List[Dict] = []
+        self._recent: collections.deque = collections.deque()
+        self._counts: collections.Counter = collections.Counter()
+        self._endpoints: collections.Counter = collections.Counter()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._routes = self._build_routes()
+
+    # -- lifecycle -----------------------------------------------------------
+
+    def start(self) -> str:
+        """
+        Serve the API in a background thread.
+
+        Returns:
+            The API base URL
+        """
+        self._server = ThreadingHTTPServer(self.address, self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-cloudflare-api", daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def serve_forever(self) -> None:
+        """Serve the API in this thread until interrupted."""
+        self._server = ThreadingHTTPServer(self.address, self._handler())
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def stop(self) -> None:
+        """Stop serving."""
+        if self._server:
+            if self._thread:
+                self._server.shutdown()
+                self._thread.join()
+                self._thread = None
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "MockCloudflareAPI":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    @property
+    def url(self) -> str:
+        """Root URL of the running server."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def base_url(self) -> str:
+        """API base URL to pass as ``Cloudflare(base_url=...)``."""
+        return self.url + API_PREFIX
+
+    @property
+    def cloudflared_url(self) -> str:
+        """Where the fake cloudflared binary is downloaded from."""
+        return self.url + "/__mock/cloudflared"
+
+    # -- state and injection -------------------------------------------------
+
+    def add_zone(self, name: str, status: str = "active") -> str:
+        """Add a zone to the account and return its ID."""
+        zone_id = self._new_id()
+        with self._lock:
+            self.zones[zone_id] = {
+                "id": zone_id,
+                "name": name.lower().rstrip("."),
+                "status": status,
+                "account": {"id": self.account["id"], "name": self.account["name"]},
+            }
+            self.records[zone_id] = {}
+            self._names[zone_id] = collections.defaultdict(dict)
+        return zone_id
+
+    def add_dns_record(self, zone_id: str, name: str, content: str, record_type: str = "CNAME", proxied: bool = True) -> Dict:
+        """Add a DNS record to a zone directly, without an API call."""
+        with self._lock:
+            return self._create_record(zone_id, {"type": record_type, "name": name, "content": content, "proxied": proxied})
+
+    def fail(
+        self,
+        method: str,
+        path: str,
+        status: int,
+        code: int,
+        message: str = "Injected error",
+        times: int = 1,
+        headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        """
+        Answer the next matching calls with an error.
+
+        Args:
+            method: HTTP method to match ("*" for any)
+            path: Regular expression searched for in the path below the
+                API prefix (e.g. ``"/cfd_tunnel$"``)
+            status: HTTP status of the error
+            code: Cloudflare error code
+            message: Error message
+            times: Matching calls to fail
+            headers: Extra response headers (e.g. ``{"Retry-After": "1"}``)
+        """
+        with self._lock:
+            self._failures.append({
+                "method": method.upper(),
+                "path": re.compile(path),
+                "status": status,
+                "code": code,
+                "message": message,
+                "times": times,
+                "headers": dict(headers or {}),
+            })
+
+    def stats(self) -> Dict:
+        """
+        Calls served so far.
+
+        Returns:
+            ``calls`` (API calls, including failed ones), ``connections``,
+            ``bytes`` (response bodies), ``injected_errors``,
+            ``rate_limited`` and ``endpoints`` (calls per endpoint)
+        """
+        with self._lock:
+            stats = {key: self._counts[key] for key in ("calls", "connections", "bytes", "injected_errors", "rate_limited")}
+            stats["endpoints"] = dict(sorted(self._endpoints.items()))
+        return stats
+
+    def active_tunnels(self) -> List[Dict]:
+        """Tunnels not deleted yet."""
+        with self._lock:
+            return [copy.deepcopy(t) for t in self.tunnels.values() if t["deleted_at"] is None]
+
+    def dns_records(self, zone_id: Optional[str] = None) -> List[Dict]:
+        """DNS records of one zone, or of every zone."""
+        with self._lock:
+            zones = [zone_id] if zone_id else list(self.records)
+            return [copy.deepcopy(r) for zone in zones for r in self.records.get(zone, {}).values()]
+
+    # -- HTTP ----------------------------------------------------------------
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Head and body go out in separate writes; without this, Nagle
+            # plus delayed ACKs add ~40ms to every keep-alive response
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                api._count("connections")
+                super().setup()
+
+            def respond(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                status, headers, body = api._dispatch(self.command, self.path, self.headers, raw)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = respond
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def _dispatch(self, method: str, target: str, headers, raw: bytes) -> Tuple[int, Dict[str, str], bytes]:
+        path, _, query = target.partition("?")
+        if path == "/__mock/stats":
+            return 200, {"Content-Type": "application/json"}, json.dumps(self.stats()).encode()
+        if path == "/__mock/cloudflared":
+            time.sleep(self.download_delay)
+            script = CLOUDFLARED_SCRIPT.format(python=sys.executable, connect_delay=self.connect_delay)
+            return 200, {"Content-Type": "application/octet-stream"}, script.encode()
+        if not path.startswith(API_PREFIX + "/"):
+            return 404, {"Content-Type": "text/plain"}, b"Not found"
+        path = path[len(API_PREFIX):]
+
+        with self._lock:
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            broken = self.error_rate and self._random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+
+        route, handler, args = self._match(method, path)
+        self._count("calls")
+        with self._lock:
+            self._endpoints[f"{method} {route}"] += 1
+
+        extra: Dict[str, str] = {}
+        try:
+            retry_after = self._throttle()
+            if retry_after is not None:
+                self._count("rate_limited")
+                extra["Retry-After"] = str(retry_after)
+                raise APIError(429, 971, "Please wait and consider throttling your request speed")
+            failure = self._scripted_failure(method, path)
+            if failure:
+                self._count("injected_errors")
+                extra.update(failure["headers"])
+                raise APIError(failure["status"], failure["code"], failure["message"])
+            if broken:
+                self._count("injected_errors")
+                body = b"<html><body><h1>502 Bad Gateway</h1></body></html>"
+                self._count("bytes", len(body))
+                return 502, {"Content-Type": "text/html"}, body
+            self._authorize(headers.get("Authorization"))
+            if handler is None:
+                raise APIError(404, 7000, "No route for that URI")
+            params = dict(parse_qsl(query))
+            payload = json.loads(raw) if raw else {}
+            with self._lock:
+                result = copy.deepcopy(handler(params, payload, *args))
+            status = 200
+            envelope = {"success": True, "errors": [], "messages": []}
+            if isinstance(result, tuple):
+                result, envelope["result_info"] = result
+            envelope["result"] = result
+        except APIError as e:
+            status = e.status
+            envelope = {"success": False, "errors": [{"code": e.code, "message": str(e)}], "messages": [], "result": None}
+        except ValueError:
+            status = 400
+            envelope = {"success": False, "errors": [{"code": 6007, "message": "Malformed JSON in request body"}], "messages": [], "result": None}
+
+        body = json.dumps(envelope).encode()
+        self._count("bytes", len(body))
+        return status, dict(extra, **{"Content-Type": "application/json"}), body
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counts[key] += amount
+
+    def _throttle(self) -> Optional[int]:
+        """Seconds the caller must wait if this call is over the limit, else None."""
+        if not self.rate_limit:
+            return None
+        requests, window = self.rate_limit
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and self._recent[0] <= now - window:
+                self._recent.popleft()
+            if len(self._recent) >= requests:
+                return max(1, math.ceil(self._recent[0] + window - now))
+            self._recent.append(now)
+        return None
+
+    def _scripted_failure(self, method: str, path: str) -> Optional[Dict]:
+        with self._lock:
+            for failure in self._failures:
+                if failure["times"] > 0 and failure["method"] in ("*", method) and failure["path"].search(path):
+                    failure["times"] -= 1
+                    return failure
+        return None
+
+    def _authorize(self, header: Optional[str]) -> None:
+        if self.token is not None and header != f"Bearer {self.token}":
+            raise APIError(400, 6003, "Invalid request headers")
+
+    def _match(self, method: str, path: str) -> Tuple[str, Optional[Callable], Tuple]:
+        for route_method, pattern, route, handler in self._routes:
+            match = pattern.fullmatch(path)
+            if match and route_method == method:
+                return route, handler, match.groups()
+        return path, None, ()
+
+    def _build_routes(self):
+        routes = [
+            ("GET", "/accounts", self._list_accounts),
+            ("GET", "/zones", self._list_zones),
+            ("GET", "/zones/:id", self._get_zone),
+            ("GET", "/accounts/:id/cfd_tunnel", self._list_tunnels),
+            ("POST", "/accounts/:id/cfd_tunnel", self._create_tunnel),
+            ("GET", "/accounts/:id/cfd_tunnel/:id", self._get_tunnel),
+            ("DELETE", "/accounts/:id/cfd_tunnel/:id", self._delete_tunnel),
+            ("DELETE", "/accounts/:id/cfd_tunnel/:id/connections", self._delete_connections),
+            ("GET", "/accounts/:id/cfd_tunnel/:id/configurations", self._get_configuration),
+            ("PUT", "/accounts/:id/cfd_tunnel/:id/configurations", self._put_configuration),
+            ("GET", "/zones/:id/dns_records", self._list_records),
+            ("POST", "/zones/:id/dns_records", self._post_record),
+            ("POST", "/zones/:id/dns_records/batch", self._batch_records),
+            ("GET", "/zones/:id/dns_records/:id", self._get_record),
+            ("PATCH", "/zones/:id/dns_records/:id", self._patch_record),
+            ("PUT", "/zones/:id/dns_records/:id", self._put_record),
+            ("DELETE", "/zones/:id/dns_records/:id", self._delete_record),
+        ]
+        return [
+            (method, re.compile(re.escape(route).replace(":id", "([^/]+)")), route, handler)
+            for method, route, handler in routes
+        ]
+
+    # -- endpoints (called with the lock held) ------------------------------
+
+    def _list_accounts(self, params, payload):
+        return _page([self.account], params, 20)
+
+    def _list_zones(self, params, payload):
+        zones = [
+            z for z in self.zones.values()
+            if z["name"] == params.get("name", z["name"]) and z["status"] == params.get("status", z["status"])
+        ]
+        return _page(zones, params, 20)
+
+    def _get_zone(self, params, payload, zone_id):
+        return self._zone(zone_id)
+
+    def _list_tunnels(self, params, payload, account_id):
+        self._check_account(account_id)
+        tunnels = list(self.tunnels.values())
+        if "name" in params:
+            tunnels = [t for t in tunnels if t["name"] == params["name"]]
+        if params.get("is_deleted") == "false":
+            tunnels = [t for t in tunnels if t["deleted_at"] is None]
+        return _page(tunnels, params, 20)
+
+    def _create_tunnel(self, params, payload, account_id):
+        self._check_account(account_id)
+        if not payload.get("name") or not payload.get("tunnel_secret"):
+            raise APIError(400, 1001, "Tunnel name and secret are required")
+        if any(t["name"] == payload["name"] and t["deleted_at"] is None for t in self.tunnels.values()):
+            raise APIError(409, 1013, "You already have a tunnel with this name")
+        tunnel = {
+            "id": str(uuid.UUID(self._new_id())),
+            "account_tag": account_id,
+            "name": payload["name"],
+            "created_at": _now(),
+            "deleted_at": None,
+            "connections": [],
+            "status": "inactive",
+        }
+        self.tunnels[tunnel["id"]] = tunnel
+        return tunnel
+
+    def _get_tunnel(self, params, payload, account_id, tunnel_id):
+        return self._tunnel(account_id, tunnel_id)
+
+    def _delete_tunnel(self, params, payload, account_id, tunnel_id):
+        tunnel = self._tunnel(account_id, tunnel_id)
+        tunnel["deleted_at"] = tunnel["deleted_at"] or _now()
+        return tunnel
+
+    def _delete_connections(self, params, payload, account_id, tunnel_id):
+        self._tunnel(account_id, tunnel_id)["connections"] = []
+        return None
+
+    def _get_configuration(self, params, payload, account_id, tunnel_id):
+        self._tunnel(account_id, tunnel_id)
+        return self.configurations.get(tunnel_id, {"tunnel_id": tunnel_id, "version": 0, "config": None})
+
+    def _put_configuration(self, params, payload, account_id, tunnel_id):
+        self._tunnel(account_id, tunnel_id)
+        version = self.configurations.get(tunnel_id, {}).get("version", 0) + 1
+        self.configurations[tunnel_id] = {"tunnel_id": tunnel_id, "version": version, "config": payload.get("config")}
+        return self.configurations[tunnel_id]
+
+    def _list_records(self, params, payload, zone_id):
+        records = self._zone_records(zone_id)
+        if "name" in params:
+            records = [records[record_id] for record_id in self._names[zone_id].get(params["name"], ())]
+        else:
+            records = list(records.values())
+        for field in ("type", "name", "content"):
+            if field in params:
+                records = [r for r in records if r[field] == params[field]]
+        return _page(records, params, 100)
+
+    def _post_record(self, params, payload, zone_id):
+        self._zone_records(zone_id)
+        return self._create_record(zone_id, payload)
+
+    def _get_record(self, params, payload, zone_id, record_id):
+        return self._record(zone_id, record_id)
+
+    def _patch_record(self, params, payload, zone_id, record_id):
+        return self._update_record(zone_id, record_id, payload, replace=False)
+
+    def _put_record(self, params, payload, zone_id, record_id):
+        return self._update_record(zone_id, record_id, payload, replace=True)
+
+    def _delete_record(self, params, payload, zone_id, record_id):
+        self._remove_record(self._record(zone_id, record_id))
+        return {"id": record_id}
+
+    def _batch_records(self, params, payload, zone_id):
+        # All or nothing, like the real endpoint: roll back on any error
+        saved = copy.deepcopy(self._zone_records(zone_id))
+        try:
+            result = {"deletes": [], "patches": [], "puts": [], "posts": []}
+            for delete in payload.get("deletes", []):
+                record = self._record(zone_id, delete.get("id", ""))
+                self._remove_record(record)
+                result["deletes"].append(record)
+            for patch in payload.get("patches", []):
+                result["patches"].append(self._update_record(zone_id, patch.get("id", ""), patch, replace=False))
+            for put in payload.get("puts", []):
+                result["puts"].append(self._update_record(zone_id, put.get("id", ""), put, replace=True))
+            for post in payload.get("posts", []):
+                result["posts"].append(self._create_record(zone_id, post))
+            return result
+        except APIError:
+            self.records[zone_id] = saved
+            self._names[zone_id] = collections.defaultdict(dict)
+            for record in saved.values():
+                self._names[zone_id][record["name"]][record["id"]] = None
+            raise
+
+    # -- helpers -------------------------------------------------------------
+
+    def _new_id(self) -> str:
+        return uuid.uuid4().hex
+
+    def _check_account(self, account_id: str) -> None:
+        if account_id != self.account["id"]:
+            raise APIError(403, 9109, "Unauthorized to access requested resource")
+
+    def _zone(self, zone_id: str) -> Dict:
+        if zone_id not in self.zones:
+            raise APIError(400, 7003, f"Could not route to /zones/{zone_id}, perhaps your object identifier is invalid?")
+        return self.zones[zone_id]
+
+    def _zone_records(self, zone_id: str) -> Dict[str, Dict]:
+        return self.records[self._zone(zone_id)["id"]]
+
+    def _tunnel(self, account_id: str, tunnel_id: str) -> Dict:
+        self._check_account(account_id)
+        if tunnel_id not in self.tunnels:
+            raise APIError(404, 1003, "Tunnel not found")
+        return self.tunnels[tunnel_id]
+
+    def _record(self, zone_id: str, record_id: str) -> Dict:
+        records = self._zone_records(zone_id)
+        if record_id not in records:
+            raise APIError(404, 81044, "Record does not exist.")
+        return records[record_id]
+
+    def _check_conflict(self, zone_id: str, name: str, record_type: str) -> None:
+        for record_id in self._names[zone_id].get(name, ()):
+            if "CNAME" in (self.records[zone_id][record_id]["type"], record_type):
+                raise APIError(400, 81053, "An A, AAAA, or CNAME record with that host already exists.")
+
+    def _remove_record(self, record: Dict) -> None:
+        del self.records[record["zone_id"]][record["id"]]
+        self._names[record["zone_id"]][record["name"]].pop(record["id"], None)
+
+    def _create_record(self, zone_id: str, fields: Dict) -> Dict:
+        zone = self._zone(zone_id)
+        if not fields.get("type") or not fields.get("name") or not fields.get("content"):
+            raise APIError(400, 9005, "DNS record type, name and content are required")
+        name = _full_name(fields["name"], zone["name"])
+        self._check_conflict(zone_id, name, fields["type"])
+        record = {
+            "id": self._new_id(),
+            "zone_id": zone_id,
+            "zone_name": zone["name"],
+            "name": name,
+            "type": fields["type"],
+            "content": fields["content"],
+            "proxied": bool(fields.get("proxied", False)),
+            "ttl": fields.get("ttl", 1),
+            "comment": fields.get("comment"),
+            "created_on": _now(),
+            "modified_on": _now(),
+        }
+        self.records[zone_id][record["id"]] = record
+        self._names[zone_id][name][record["id"]] = None
+        return record
+
+    def _update_record(self, zone_id: str, record_id: str, fields: Dict, replace: bool) -> Dict:
+        record = self._record(zone_id, record_id)
+        if replace and (not fields.get("type") or not fields.get("name") or not fields.get("content")):
+            raise APIError(400, 9005, "DNS record type, name and content are required")
+        name = _full_name(fields.get("name", record["name"]), record["zone_name"])
+        if name != record["name"]:
+            self._check_conflict(zone_id, name, fields.get("type", record["type"]))
+            self._names[zone_id][record["name"]].pop(record_id, None)
+            self._names[zone_id][name][record_id] = None
+            record["name"] = name
+        for field in ("type", "content", "proxied", "ttl", "comment"):
+            if field in fields:
+                record[field] = fields[field]
+        record["modified_on"] = _now()
+        return record
+
+
+def _page(items: List[Dict], params: Dict[str, str], default_per_page: int):
+    try:
+        page = max(1, int(params.get("page", 1)))
+        per_page = max(1, int(params.get("per_page", default_per_page)))
+    except ValueError:
+        raise APIError(400, 1001, "Invalid pagination parameters")
+    chunk = [copy.deepcopy(item) for item in items[(page - 1) * per_page:page * per_page]]
+    return chunk, {
+        "page": page,
+        "per_page": per_page,
+        "count": len(chunk),
+        "total_count": len(items),
+        "total_pages": max(1, math.ceil(len(items) / per_page)),
+    }
+
+
+def _full_name(name: str, zone_name: str) -> str:
+    name = name.lower().rstrip(".")
+    if name == "@":
+        return zone_name
+    if name == zone_name or name.endswith("." + zone_name):
+        return name
+    return f"{name}.{zone_name}"
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Serve the stand-in from the command line."""
+    parser = argparse.ArgumentParser(
+        prog="python -m hostify.mock_api",
+        description="Local stand-in for the Cloudflare API endpoints hostify uses"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--zone", action="append", dest="zones", help="Zone of the account (repeatable, default: example.com)")
+    parser.add_argument("--token", help="API token calls must carry (default: any)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added to every API call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Up to this much more per call, at random")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of calls answered with 502")
+    parser.add_argument("--rate-limit", nargs=2, type=float, metavar=("REQUESTS", "SECONDS"), help="Answer calls over this budget with 429")
+    parser.add_argument("--download-ms", type=float, default=0.0, help="Time the cloudflared download takes")
+    parser.add_argument("--connect-ms", type=float, default=0.0, help="Time the fake cloudflared takes to be ready")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    api = MockCloudflareAPI(
+        zones=args.zones or ["example.com"],
+        token=args.token,
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate,
+        rate_limit=(int(args.rate_limit[0]), args.rate_limit[1]) if args.rate_limit else None,
+        download_delay=args.download_ms / 1000,
+        connect_delay=args.connect_ms / 1000,
+        host=args.host,
+        port=args.port,
+        seed=args.seed
+    )
+    print(f"Cloudflare API stand-in on http://{args.host}:{args.port}{API_PREFIX}")
+    print(f"  export CLOUDFLARE_API_BASE_URL=http://{args.host}:{args.port}{API_PREFIX}")
+    try:
+        api.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
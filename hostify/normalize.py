@@ -0,0 +1,222 @@
+"""
+Cache-key normalization stage for the local proxy.
+
+Cloudflare's edge cache keys on the full URL, query string included, and
+won't store a response that sets a cookie. A static file linked from a
+newsletter (``?utm_source=...``) or served by a framework that attaches a
+session cookie to every response therefore ends up cached once per
+campaign link, or not at all. :class:`CacheKeyNormalizer` canonicalises
+request URLs and strips what keeps asset responses out of the edge cache.
+"""
+
+from typing import Dict, Iterable, Optional, Sequence
+
+from .cache import parse_cache_control
+from .proxy import Body, Headers, Request, Response
+
+
+# Query parameters added by ad and analytics platforms. They never change
+# what the origin returns; a trailing ``*`` matches any suffix.
+TRACKING_PARAMS = (
+    "utm_*",
+    "fbclid",
+    "gclid",
+    "dclid",
+    "gbraid",
+    "wbraid",
+    "msclkid",
+    "yclid",
+    "twclid",
+    "igshid",
+    "mc_cid",
+    "mc_eid",
+    "_ga",
+    "_gl",
+    "_hsenc",
+    "_hsmi",
+)
+
+# File extensions Cloudflare caches without a cache rule
+EDGE_CACHED_EXTENSIONS = frozenset((
+    "7z", "apk", "avi", "avif", "bin", "bmp", "bz2", "class", "css", "csv",
+    "dmg", "doc", "docx", "ejs", "eot", "eps", "exe", "flac", "gif", "gz",
+    "ico", "iso", "jar", "jpeg", "jpg", "js", "mid", "midi", "mkv", "mp3",
+    "mp4", "ogg", "otf", "pdf", "pict", "pls", "png", "ppt", "pptx", "ps",
+    "rar", "svg", "svgz", "swf", "tar", "tif", "tiff", "ttf", "webm", "webp",
+    "woff", "woff2", "xls", "xlsx", "zip", "zst",
+))
+
+# Statuses Cloudflare stores by default
+EDGE_CACHED_STATUSES = frozenset((200, 206, 301, 302, 303, 404, 410))
+
+# Request headers that asset responses commonly name in Vary without the
+# content depending on them
+SPURIOUS_VARY = ("cookie", "user-agent", "*")
+
+
+def extension(path: str) -> str:
+    """Lower-cased file extension of the last path segment ('' if none)."""
+    name = path.rsplit("/", 1)[-1]
+    return name.rsplit(".", 1)[1].lower() if "." in name else ""
+
+
+def edge_cacheable(request: Request, response: Response) -> bool:
+    """
+    Whether Cloudflare's default cache behaviour would store ``response``.
+
+    Cache rules configured in the dashboard can widen this; without them
+    only responses for static file extensions are cached, and only when they
+    set no cookie and don't forbid caching.
+    """
+    if request.method not in ("GET", "HEAD") or response.status not in EDGE_CACHED_STATUSES:
+        return False
+    if extension(request.path) not in EDGE_CACHED_EXTENSIONS:
+        return False
+    if "set-cookie" in response.headers or "*" in response.headers.tokens("vary"):
+        return False
+
+    directives = parse_cache_control(response.headers.get("cache-control"))
+    if "private" in directives or "no-store" in directives or "no-cache" in directives:
+        return False
+    return directives.get("s-maxage", directives.get("max-age")) != "0"
+
+
+class CacheKeyNormalizer:
+    """
+    URL and response normalization stage for :class:`hostify.proxy.ReverseProxy`.
+
+    On ``GET``/``HEAD`` requests under ``paths`` it removes tracking query
+    parameters (``strip_params``) and sorts the remaining ones by name, so
+    that every spelling of a URL reaches the origin and the other stages in
+    the same form. With ``redirect=True`` the visitor is sent a ``301`` to
+    that form instead, which also collapses the edge cache keys, at the
+    cost of one extra round trip for links carrying tracking parameters.
+
+    Responses for static assets (``asset_extensions``) lose their
+    ``Set-Cookie`` headers and the ``Vary`` names in ``vary_ignore``, and
+    gain ``Vary: Accept-Encoding`` when they are encoded.
+
+    Put it first in the middleware list so that caching and coalescing see
+    normalised URLs.
+    """
+
+    def __init__(
+        self,
+        strip_params: Sequence[str] = TRACKING_PARAMS,
+        sort_query: bool = True,
+        redirect: bool = False,
+        paths: Optional[Sequence[str]] = None,
+        asset_extensions: Iterable[str] = EDGE_CACHED_EXTENSIONS,
+        strip_asset_cookies: bool = True,
+        vary_ignore: Sequence[str] = SPURIOUS_VARY
+    ):
+        """
+        Initialize normalizer.
+
+        Args:
+            strip_params: Query parameter names to drop (``*`` suffix matches
+                any ending)
+            sort_query: Sort the remaining query parameters by name
+            redirect: Redirect to the normalised URL instead of rewriting
+            paths: Path prefixes to normalise (default: all)
+            asset_extensions: File extensions treated as static assets
+            strip_asset_cookies: Drop ``Set-Cookie`` from asset responses
+            vary_ignore: Header names removed from ``Vary`` on asset responses
+        """
+        names = [name.lower() for name in strip_params]
+        self.strip_names = frozenset(name for name in names if not name.endswith("*"))
+        self.strip_prefixes = tuple(name[:-1] for name in names if name.endswith("*"))
+        self.sort_query = sort_query
+        self.redirect = redirect
+        self.paths = tuple(paths) if paths else None
+        self.asset_extensions = frozenset(ext.lower().lstrip(".") for ext in asset_extensions)
+        self.strip_asset_cookies = strip_asset_cookies
+        self.vary_ignore = frozenset(name.lower() for name in vary_ignore)
+
+        self.responses = 0
+        self.rewritten = 0
+        self.redirected = 0
+        self.cookies_stripped = 0
+        # Responses the edge would cache as the origin sent them / as relayed
+        self.cacheable_before = 0
+        self.cacheable_after = 0
+
+    # -- stage protocol ----------------------------------------------------
+
+    async def handle(self, request: Request, call_next) -> Response:
+        if request.method not in ("GET", "HEAD") or request.upgrade:
+            return await call_next(request)
+        if self.paths is not None and not request.path.startswith(self.paths):
+            return await call_next(request)
+
+        target = self.normalize_target(request.target)
+        if target != request.target:
+            if self.redirect:
+                self.redirected += 1
+                headers = Headers([("Location", target), ("Cache-Control", "public, max-age=86400")])
+                return Response(301, headers, Body.empty())
+            self.rewritten += 1
+            request.target = target
+
+        response = await call_next(request)
+        self.responses += 1
+        if edge_cacheable(request, response):
+            self.cacheable_before += 1
+        if extension(request.path) in self.asset_extensions:
+            self._clean_asset(response)
+        if edge_cacheable(request, response):
+            self.cacheable_after += 1
+        return response
+
+    def summary(self) -> str:
+        return (
+            f"Cache keys: {self.rewritten + self.redirected} URLs normalised, "
+            f"edge-cacheable responses {self._ratio(self.cacheable_before):.0%} -> "
+            f"{self._ratio(self.cacheable_after):.0%} of {self.responses}"
+        )
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "responses": self.responses,
+            "rewritten": self.rewritten,
+            "redirected": self.redirected,
+            "cookies_stripped": self.cookies_stripped,
+            "cacheable_ratio_before": self._ratio(self.cacheable_before),
+            "cacheable_ratio_after": self._ratio(self.cacheable_after),
+        }
+
+    # -- normalization -----------------------------------------------------
+
+    def normalize_target(self, target: str) -> str:
+        """Return ``target`` without tracking parameters, sorted by name."""
+        path, sep, query = target.partition("?")
+        if not sep:
+            return target
+
+        kept = [pair for pair in query.split("&") if pair and not self._tracking(pair)]
+        if self.sort_query:
+            # Stable, so repeated names keep their relative order
+            kept.sort(key=lambda pair: pair.split("=", 1)[0])
+        return f"{path}?{'&'.join(kept)}" if kept else path
+
+    def _tracking(self, pair: str) -> bool:
+        name = pair.split("=", 1)[0].lower()
+        return name in self.strip_names or name.startswith(self.strip_prefixes)
+
+    def _clean_asset(self, response: Response) -> None:
+        headers = response.headers
+        if self.strip_asset_cookies and "set-cookie" in headers:
+            headers.remove("set-cookie")
+            self.cookies_stripped += 1
+
+        names = [name.strip() for value in headers.get_all("vary") for name in value.split(",") if name.strip()]
+        vary = [name for name in names if name.lower() not in self.vary_ignore]
+        if "content-encoding" in headers and "accept-encoding" not in (name.lower() for name in vary):
+            vary.append("Accept-Encoding")
+        if vary != names:
+            headers.remove("vary")
+            if vary:
+                headers.set("Vary", ", ".join(vary))
+
+    def _ratio(self, count: int) -> float:
+        return count / self.responses if self.responses else 0.0
@@ -0,0 +1,172 @@
+"""
+Dependency-ordered, concurrent execution of startup steps.
+
+Bringing a site live takes a handful of slow steps (starting the origin,
+API calls, downloading cloudflared) and most of them don't depend on each
+other. :class:`StepGraph` starts every step as soon as the steps it needs
+have finished, on a small thread pool, so startup takes as long as the
+longest chain of dependent steps instead of the sum of all of them.
+"""
+
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .trace import Tracer
+
+
+class StepGraph:
+    """
+    Steps and the steps each of them needs, run concurrently in dependency order::
+
+        graph = StepGraph()
+        graph.add("tunnel", create_tunnel)
+        graph.add("zone", find_zone)
+        graph.add("dns", create_dns, needs=("tunnel", "zone"))
+        graph.run()
+    """
+
+    def __init__(self, tracer: Optional[Tracer] = None):
+        """
+        Initialize empty step graph.
+
+        Args:
+            tracer: Records each step as a span (category "step")
+        """
+        self._steps: Dict[str, Tuple[Callable[[], None], Tuple[str, ...]]] = {}
+        self.timings: Dict[str, Tuple[float, float]] = {}
+        self.tracer = tracer
+
+    def __len__(self) -> int:
+        return len(self._steps)
+
+    def add(self, name: str, function: Callable[[], None], needs: Iterable[str] = ()) -> None:
+        """
+        Add a step.
+
+        Args:
+            name: Unique step name
+            function: Called without arguments to run the step
+            needs: Names of steps that must finish first; they have to be
+                added before this one, which also rules out cycles
+
+        Raises:
+            ValueError: If ``name`` is taken or a needed step is unknown
+        """
+        needs = tuple(needs)
+        if name in self._steps:
+            raise ValueError(f"Duplicate step: {name}")
+        unknown = [need for need in needs if need not in self._steps]
+        if unknown:
+            raise ValueError(f"Step {name} needs unknown step(s): {', '.join(unknown)}")
+        self._steps[name] = (function, needs)
+
+    def run(self, max_workers: Optional[int] = None) -> Dict[str, Tuple[float, float]]:
+        """
+        Run every step once its needed steps have finished.
+
+        When a step fails no further steps are started; steps already
+        running are waited for, so whatever they set up can be cleaned up,
+        and then the first error is raised. Lines the steps print are kept
+        whole rather than interleaved.
+
+        Args:
+            max_workers: Most steps running at once (default: no limit). With
+                1 the steps run one after another in the order they were added.
+
+        Returns:
+            Start and end of each step that ran, in seconds since the run began
+            (also kept in ``timings``)
+        """
+        self.timings = {}
+        pending = dict(self._steps)
+        finished = set()
+        running = {}
+        error: Optional[BaseException] = None
+        began = time.perf_counter()
+
+        def timed(name: str, function: Callable[[], None]) -> None:
+            started = time.perf_counter() - began
+            try:
+                with self.tracer.span(name, "step") if self.tracer else nullcontext():
+                    function()
+            finally:
+                self.timings[name] = (started, time.perf_counter() - began)
+
+        stdout, sys.stdout = sys.stdout, _WholeLines(sys.stdout)
+        try:
+            with ThreadPoolExecutor(max_workers or max(1, len(pending)), thread_name_prefix="hostify-step") as pool:
+                while True:
+                    if error is None:
+                        for name, (function, needs) in list(pending.items()):
+                            if all(need in finished for need in needs):
+                                del pending[name]
+                                running[pool.submit(timed, name, function)] = name
+                    if not running:
+                        break
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        try:
+                            future.result()
+                        except BaseException as e:
+                            error = error or e
+                        else:
+                            finished.add(name)
+        finally:
+            sys.stdout = stdout
+
+        if error is not None:
+            raise error
+        return self.timings
+
+    def critical_path(self) -> List[str]:
+        """
+        The chain of steps that decided how long the last run took.
+
+        Starts from the step that finished last and follows, at each step,
+        the needed step that finished last, i.e. the one it waited for.
+
+        Returns:
+            Step names, first to last (empty before a run)
+        """
+        if not self.timings:
+            return []
+        name = max(self.timings, key=lambda step: self.timings[step][1])
+        path = [name]
+        while True:
+            needs = [need for need in self._steps[name][1] if need in self.timings]
+            if not needs:
+                return path[::-1]
+            name = max(needs, key=lambda step: self.timings[step][1])
+            path.append(name)
+
+
+class _WholeLines:
+    """Stand-in for ``sys.stdout`` that writes each thread's output a line at a time."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._lock = threading.Lock()
+        self._partial = threading.local()
+
+    def write(self, text: str) -> int:
+        lines, newline, rest = (getattr(self._partial, "text", "") + text).rpartition("\n")
+        self._partial.text = rest
+        if newline:
+            with self._lock:
+                self._stream.write(lines + newline)
+        return len(text)
+
+    def flush(self) -> None:
+        # Progress output without a newline still shows when flushed
+        text, self._partial.text = getattr(self._partial, "text", ""), ""
+        with self._lock:
+            self._stream.write(text)
+            self._stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
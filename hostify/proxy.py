@@ -0,0 +1,863 @@
+"""
+Local asyncio reverse proxy that sits between cloudflared and the origin.
+
+The proxy speaks plain HTTP/1.1 on both sides. Request and response bodies
+are streamed chunk by chunk through :class:`Body` objects, so nothing is
+buffered unless a stage explicitly asks for it with ``read()``. Writers wait
+for the receiving socket to drain, so a slow receiver throttles the sender
+all the way back to its socket and uploads and downloads of any size pass
+through in constant memory.
+
+Optional features are written as middleware stages. A stage is any object
+with an ``async handle(request, call_next)`` method that returns a
+:class:`Response`, usually by awaiting ``call_next(request)``. Stages may
+also define ``async start()`` and ``async close()``, which run when the
+proxy starts and stops, and ``summary()``, which returns a one-line report.
+"""
+
+import asyncio
+import threading
+from typing import AsyncIterator, Awaitable, Callable, Iterable, List, Optional, Sequence, Tuple
+
+from .relay import STREAM_BUFFER, relay
+
+
+# Size of the chunks read from sockets and handed to the next hop
+CHUNK_SIZE = 64 * 1024
+
+# Largest request/response head we are willing to parse
+MAX_HEAD_SIZE = 64 * 1024
+
+# Headers that only apply to a single connection and are never forwarded
+HOP_BY_HOP = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "proxy-connection",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+}
+
+REASONS = {
+    100: "Continue",
+    101: "Switching Protocols",
+    200: "OK",
+    204: "No Content",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    429: "Too Many Requests",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+    502: "Bad Gateway",
+    503: "Service Unavailable",
+    504: "Gateway Timeout",
+}
+
+
+class ProxyError(Exception):
+    """Custom exception for proxy errors."""
+    pass
+
+
+class UpstreamError(ProxyError):
+    """Raised when the origin cannot be reached or answers with garbage."""
+    pass
+
+
+class Headers:
+    """
+    Ordered, case-insensitive multi-dict of HTTP headers.
+
+    Names keep the casing they arrived with so they are forwarded unchanged.
+    """
+
+    def __init__(self, items: Optional[Iterable[Tuple[str, str]]] = None):
+        self._items: List[Tuple[str, str]] = list(items or [])
+
+    def get(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        """Return the first value for ``name``, or ``default``."""
+        name = name.lower()
+        for key, value in self._items:
+            if key.lower() == name:
+                return value
+        return default
+
+    def get_all(self, name: str) -> List[str]:
+        """Return every value for ``name`` in arrival order."""
+        name = name.lower()
+        return [value for key, value in self._items if key.lower() == name]
+
+    def add(self, name: str, value: str) -> None:
+        """Append a header without touching existing values."""
+        self._items.append((name, value))
+
+    def set(self, name: str, value: str) -> None:
+        """Replace all values of ``name`` with a single value."""
+        self.remove(name)
+        self._items.append((name, value))
+
+    def remove(self, name: str) -> None:
+        """Drop all values of ``name``."""
+        name = name.lower()
+        self._items = [(k, v) for k, v in self._items if k.lower() != name]
+
+    def tokens(self, name: str) -> List[str]:
+        """Return the lower-cased comma separated tokens of ``name``."""
+        result = []
+        for value in self.get_all(name):
+            result.extend(t.strip().lower() for t in value.split(",") if t.strip())
+        return result
+
+    def copy(self) -> "Headers":
+        return Headers(self._items)
+
+    def items(self) -> List[Tuple[str, str]]:
+        return list(self._items)
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __repr__(self) -> str:
+        return f"Headers({self._items!r})"
+
+
+class Body:
+    """
+    Single-use asynchronous byte stream.
+
+    ``length`` is the exact size when known (Content-Length) and ``None`` for
+    streams of unknown size. ``on_close`` is called exactly once with
+    ``True`` if the stream was read to the end and ``False`` if it was
+    abandoned, which lets the owner decide whether the underlying connection
+    can be reused. ``source`` is the body this one was derived from (by a
+    stage that rewrites the stream); it is closed together with this one.
+    """
+
+    def __init__(
+        self,
+        chunks: AsyncIterator[bytes],
+        length: Optional[int] = None,
+        on_close: Optional[Callable[[bool], None]] = None,
+        source: Optional["Body"] = None
+    ):
+        self._chunks = chunks
+        self.length = length
+        self._on_close = on_close
+        self.source = source
+        self.consumed = False
+        self.closed = False
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Body":
+        """Create a body that yields ``data`` in one chunk."""
+        return cls(_iter_bytes(data), length=len(data))
+
+    @classmethod
+    def empty(cls, on_close: Optional[Callable[[bool], None]] = None) -> "Body":
+        """Create a body with no content."""
+        return cls(_iter_bytes(b""), 0, on_close)
+
+    def __aiter__(self) -> "Body":
+        return self
+
+    async def __anext__(self) -> bytes:
+        if self.closed:
+            raise StopAsyncIteration
+        try:
+            return await self._chunks.__anext__()
+        except StopAsyncIteration:
+            self.consumed = True
+            await self.aclose()
+            raise
+        except BaseException:
+            await self.aclose()
+            raise
+
+    async def read(self) -> bytes:
+        """Read the remaining stream into memory."""
+        return b"".join([chunk async for chunk in self])
+
+    async def aclose(self) -> None:
+        """Stop the stream and notify the owner."""
+        if self.closed:
+            return
+        self.closed = True
+        if not self.consumed and hasattr(self._chunks, "aclose"):
+            try:
+                await self._chunks.aclose()
+            except Exception:
+                pass
+        if self._on_close:
+            self._on_close(self.consumed)
+        if self.source is not None:
+            await self.source.aclose()
+
+
+class Request:
+    """An HTTP request travelling through the proxy."""
+
+    def __init__(
+        self,
+        method: str,
+        target: str,
+        headers: Optional[Headers] = None,
+        body: Optional[Body] = None,
+        version: str = "HTTP/1.1",
+        client: Optional[Tuple[str, int]] = None
+    ):
+        self.method = method.upper()
+        self.target = target
+        self.headers = headers if headers is not None else Headers()
+        self.body = body if body is not None else Body.empty()
+        self.version = version
+        self.client = client
+
+    @property
+    def path(self) -> str:
+        """Target without the query string."""
+        return self.target.split("?", 1)[0]
+
+    @property
+    def query(self) -> str:
+        """Raw query string (without ``?``)."""
+        parts = self.target.split("?", 1)
+        return parts[1] if len(parts) > 1 else ""
+
+    @property
+    def keep_alive(self) -> bool:
+        """Whether the client wants to reuse the connection."""
+        tokens = self.headers.tokens("connection")
+        if self.version == "HTTP/1.0":
+            return "keep-alive" in tokens
+        return "close" not in tokens
+
+    @property
+    def upgrade(self) -> Optional[str]:
+        """Protocol the client asks to switch to (e.g. ``websocket``), if any."""
+        if "upgrade" not in self.headers.tokens("connection"):
+            return None
+        return self.headers.get("upgrade") or None
+
+    async def read(self) -> bytes:
+        """Buffer the body so it can be replayed."""
+        data = await self.body.read()
+        self.body = Body.from_bytes(data)
+        return data
+
+    def __repr__(self) -> str:
+        return f"<Request {self.method} {self.target}>"
+
+
+class Response:
+    """
+    An HTTP response travelling back through the proxy.
+
+    ``upgraded`` holds the origin connection's reader and writer when the
+    origin agreed to switch protocols (``101``); the proxy then relays raw
+    bytes over it and closes the response when the stream ends.
+    """
+
+    def __init__(
+        self,
+        status: int,
+        headers: Optional[Headers] = None,
+        body: Optional[Body] = None,
+        reason: Optional[str] = None
+    ):
+        self.status = status
+        self.reason = reason or REASONS.get(status, "")
+        self.headers = headers if headers is not None else Headers()
+        self.body = body if body is not None else Body.empty()
+        self.upgraded: Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = None
+
+    @classmethod
+    def text(cls, status: int, message: str, headers: Optional[Headers] = None) -> "Response":
+        """Build a small plain-text response generated by the proxy itself."""
+        headers = headers.copy() if headers is not None else Headers()
+        headers.set("Content-Type", "text/plain; charset=utf-8")
+        return cls(status, headers, Body.from_bytes(message.encode("utf-8")))
+
+    async def read(self) -> bytes:
+        """Buffer the body so it can be replayed."""
+        data = await self.body.read()
+        self.body = Body.from_bytes(data)
+        return data
+
+    async def aclose(self) -> None:
+        """Release the body (and the upstream connection behind it)."""
+        await self.body.aclose()
+
+    def __repr__(self) -> str:
+        return f"<Response {self.status}>"
+
+
+Handler = Callable[[Request], Awaitable[Response]]
+
+
+def build_chain(stages: Sequence, upstream: Handler) -> Handler:
+    """
+    Compose middleware ``stages`` around ``upstream``.
+
+    The first stage sees the request first and the response last.
+    """
+    handler = upstream
+    for stage in reversed(list(stages)):
+        handler = _bind(stage, handler)
+    return handler
+
+
+def _bind(stage, call_next: Handler) -> Handler:
+    async def handle(request: Request) -> Response:
+        return await stage.handle(request, call_next)
+    return handle
+
+
+# ---------------------------------------------------------------------------
+# Wire format helpers
+# ---------------------------------------------------------------------------
+
+async def _iter_bytes(data: bytes) -> AsyncIterator[bytes]:
+    if data:
+        yield data
+
+
+async def iter_fixed(reader: asyncio.StreamReader, length: int) -> AsyncIterator[bytes]:
+    """Yield exactly ``length`` bytes from ``reader``."""
+    remaining = length
+    while remaining > 0:
+        chunk = await reader.read(min(remaining, CHUNK_SIZE))
+        if not chunk:
+            raise UpstreamError("Connection closed before the body was complete")
+        remaining -= len(chunk)
+        yield chunk
+
+
+async def iter_chunked(reader: asyncio.StreamReader) -> AsyncIterator[bytes]:
+    """Decode a ``Transfer-Encoding: chunked`` stream."""
+    while True:
+        line = await reader.readuntil(b"\r\n")
+        try:
+            size = int(line.split(b";", 1)[0].strip(), 16)
+        except ValueError:
+            raise ProxyError(f"Invalid chunk size line: {line!r}")
+
+        if size == 0:
+            # Skip trailers up to the terminating blank line
+            while (await reader.readuntil(b"\r\n")) != b"\r\n":
+                pass
+            return
+
+        remaining = size
+        while remaining > 0:
+            chunk = await reader.read(min(remaining, CHUNK_SIZE))
+            if not chunk:
+                raise UpstreamError("Connection closed inside a chunk")
+            remaining -= len(chunk)
+            yield chunk
+        await reader.readexactly(2)
+
+
+async def iter_until_eof(reader: asyncio.StreamReader) -> AsyncIterator[bytes]:
+    """Yield everything until the peer closes the connection."""
+    while True:
+        chunk = await reader.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_head(data: bytes) -> Tuple[str, Headers]:
+    """
+    Split a raw message head into its start line and headers.
+
+    Args:
+        data: Bytes up to and including the blank line
+
+    Returns:
+        Tuple of (start_line, headers)
+
+    Raises:
+        ProxyError: If the head is malformed
+    """
+    try:
+        text = data.decode("latin-1")
+    except UnicodeDecodeError:
+        raise ProxyError("Undecodable message head")
+
+    lines = text.split("\r\n")
+    start_line = lines[0]
+    headers = Headers()
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, sep, value = line.partition(":")
+        if not sep or not name or name != name.strip():
+            raise ProxyError(f"Malformed header line: {line!r}")
+        headers.add(name, value.strip())
+
+    return start_line, headers
+
+
+def encode_head(start_line: str, headers: Headers) -> bytes:
+    """Serialise a start line and headers, including the blank line."""
+    lines = [start_line]
+    lines.extend(f"{name}: {value}" for name, value in headers)
+    lines.append("\r\n")
+    return "\r\n".join(lines).encode("latin-1")
+
+
+def strip_hop_by_hop(headers: Headers) -> Headers:
+    """Return a copy of ``headers`` without connection-level headers."""
+    named = set(headers.tokens("connection"))
+    return Headers(
+        (k, v) for k, v in headers
+        if k.lower() not in HOP_BY_HOP and k.lower() not in named
+    )
+
+
+def upgrade_headers(headers: Headers, protocol: Optional[str]) -> Headers:
+    """
+    Strip connection-level headers, keeping an ``Upgrade`` handshake intact.
+
+    Args:
+        headers: Message headers
+        protocol: Value of the ``Upgrade`` header to keep (None for none)
+
+    Returns:
+        Headers safe to forward to the next hop
+    """
+    headers = strip_hop_by_hop(headers)
+    if protocol:
+        headers.set("Connection", "Upgrade")
+        headers.set("Upgrade", protocol)
+    return headers
+
+
+def body_from_headers(
+    headers: Headers,
+    reader: asyncio.StreamReader,
+    on_close: Optional[Callable[[bool], None]] = None,
+    until_eof: bool = False
+) -> Body:
+    """
+    Build a streaming :class:`Body` using the framing described by ``headers``.
+
+    Args:
+        headers: Message headers (Transfer-Encoding / Content-Length)
+        reader: Stream the body is read from
+        on_close: Completion callback passed to :class:`Body`
+        until_eof: Read until EOF when no framing header is present
+            (responses); requests without framing have no body
+
+    Returns:
+        Body object
+    """
+    if "chunked" in headers.tokens("transfer-encoding"):
+        return Body(iter_chunked(reader), None, on_close)
+
+    content_length = headers.get("content-length")
+    if content_length is not None:
+        try:
+            length = int(content_length)
+        except ValueError:
+            raise ProxyError(f"Invalid Content-Length: {content_length!r}")
+        if length < 0:
+            raise ProxyError(f"Invalid Content-Length: {content_length!r}")
+        return Body(iter_fixed(reader, length), length, on_close)
+
+    if until_eof:
+        return Body(iter_until_eof(reader), None, on_close)
+
+    return Body.empty(on_close)
+
+
+async def write_body(writer: asyncio.StreamWriter, body: Body, chunked: bool) -> None:
+    """
+    Stream ``body`` into ``writer``, waiting for the socket to drain between
+    chunks so a slow reader throttles the producer.
+    """
+    async for chunk in body:
+        if not chunk:
+            continue
+        if chunked:
+            writer.write(b"%x\r\n" % len(chunk))
+            writer.write(chunk)
+            writer.write(b"\r\n")
+        else:
+            writer.write(chunk)
+        await writer.drain()
+    if chunked:
+        writer.write(b"0\r\n\r\n")
+    await writer.drain()
+
+
+async def _continue_first(writer: asyncio.StreamWriter, body: Body) -> AsyncIterator[bytes]:
+    """Send ``100 Continue`` to the client, then yield ``body``."""
+    writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+    await writer.drain()
+    async for chunk in body:
+        yield chunk
+
+
+def response_has_body(method: str, status: int) -> bool:
+    """Whether a response to ``method`` with ``status`` carries a body."""
+    return not (method == "HEAD" or status in (204, 304) or 100 <= status < 200)
+
+
+# ---------------------------------------------------------------------------
+# Server
+# ---------------------------------------------------------------------------
+
+class ReverseProxy:
+    """
+    Asyncio HTTP/1.1 reverse proxy.
+
+    ``upstream`` is any object with an ``async send(request) -> Response``
+    method, such as :class:`hostify.balancer.Backend` or
+    :class:`hostify.balancer.BackendPool`. ``middleware`` stages run in
+    order in front of it. Optional ``start()``/``close()`` coroutines on
+    stages and upstream run when the proxy starts and stops.
+
+    The proxy can run inside an existing event loop (``start_async`` /
+    ``stop_async``) or on a private loop in a daemon thread (``start`` /
+    ``stop``), which is how :class:`hostify.Host` uses it.
+
+    When the origin answers a request carrying ``Upgrade`` (WebSocket and
+    the like) with ``101 Switching Protocols``, the connection becomes a
+    plain byte stream relayed by :func:`hostify.relay.relay`. ``streams``
+    counts those that are currently open.
+    """
+
+    def __init__(
+        self,
+        upstream,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        idle_timeout: float = 75.0,
+        middleware: Optional[Sequence] = None,
+        sock=None,
+        stream_buffer: int = STREAM_BUFFER
+    ):
+        """
+        Initialize proxy.
+
+        Args:
+            upstream: Object with ``async send(request)`` returning a Response
+            host: Interface to listen on
+            port: Port to listen on (0 picks a free port)
+            idle_timeout: Seconds an idle keep-alive client connection is kept
+            middleware: Stages to run in front of ``upstream``, outermost first
+            sock: Already bound listening socket to use instead of host/port
+            stream_buffer: Bytes buffered for a slow receiver (per body or
+                per direction of an upgraded stream) before the sender is paused
+        """
+        self.upstream = upstream
+        self.host = host
+        self.port = port
+        self.idle_timeout = idle_timeout
+        self.middleware = list(middleware or [])
+        self.sock = sock
+        self.stream_buffer = stream_buffer
+        self._handler = build_chain(self.middleware, self._send_upstream)
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._clients: set = set()
+
+        self.streams = 0
+        self.streams_total = 0
+        self.stream_bytes = 0
+
+    # -- lifecycle ---------------------------------------------------------
+
+    async def start_async(self) -> int:
+        """
+        Start listening on the current event loop.
+
+        Returns:
+            Port the proxy is bound to
+        """
+        self.loop = asyncio.get_running_loop()
+        for component in self.middleware + [self.upstream]:
+            start = getattr(component, "start", None)
+            if start:
+                await start()
+
+        if self.sock is not None:
+            self._server = await asyncio.start_server(
+                self._handle_client,
+                sock=self.sock,
+                limit=MAX_HEAD_SIZE
+            )
+        else:
+            self._server = await asyncio.start_server(
+                self._handle_client,
+                self.host,
+                self.port,
+                limit=MAX_HEAD_SIZE
+            )
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop_async(self) -> None:
+        """Stop listening and close client and upstream connections."""
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+        for writer in list(self._clients):
+            writer.close()
+
+        for component in self.middleware + [self.upstream]:
+            close = getattr(component, "close", None)
+            if close:
+                await close()
+
+    def start(self, timeout: float = 10.0) -> int:
+        """
+        Start the proxy on a background thread.
+
+        Args:
+            timeout: Seconds to wait for the listener to come up
+
+        Returns:
+            Port the proxy is bound to
+
+        Raises:
+            ProxyError: If the proxy fails to start
+        """
+        started = threading.Event()
+        errors: List[BaseException] = []
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                loop.run_until_complete(self.start_async())
+            except BaseException as e:
+                errors.append(e)
+                started.set()
+                loop.close()
+                return
+            started.set()
+            try:
+                loop.run_forever()
+            finally:
+                loop.run_until_complete(loop.shutdown_asyncgens())
+                loop.close()
+
+        self._thread = threading.Thread(target=run, name="hostify-proxy", daemon=True)
+        self._thread.start()
+
+        if not started.wait(timeout):
+            raise ProxyError("Timed out starting local proxy")
+        if errors:
+            raise ProxyError(f"Failed to start local proxy: {errors[0]}")
+
+        return self.port
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop a proxy started with :meth:`start`."""
+        if not self.loop or not self._thread:
+            return
+
+        try:
+            self.call(self.stop_async(), timeout=timeout)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def call(self, coro, timeout: Optional[float] = None):
+        """
+        Run a coroutine on the proxy loop from another thread.
+
+        Args:
+            coro: Coroutine to run
+            timeout: Seconds to wait for the result
+
+        Returns:
+            The coroutine's result
+        """
+        if not self.loop:
+            raise ProxyError("Proxy is not running")
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        return future.result(timeout)
+
+    def summary(self) -> List[str]:
+        """One-line reports from every stage that provides one."""
+        lines = []
+        for stage in self.middleware:
+            summary = getattr(stage, "summary", None)
+            if summary:
+                lines.append(summary())
+        if self.streams_total:
+            lines.append(
+                f"Upgraded streams: {self.streams} open, {self.streams_total} total, "
+                f"{self.stream_bytes / (1024 * 1024):.1f} MB relayed"
+            )
+        return lines
+
+    # -- request handling --------------------------------------------------
+
+    async def _send_upstream(self, request: Request) -> Response:
+        return await self.upstream.send(request)
+
+    async def handle(self, request: Request) -> Response:
+        """
+        Produce a response for ``request``.
+
+        Upstream failures are turned into gateway errors so that a broken
+        origin never takes the client connection down with it.
+        """
+        try:
+            return await self._handler(request)
+        except asyncio.TimeoutError:
+            return Response.text(504, "Origin timed out\n")
+        except (ProxyError, OSError) as e:
+            return Response.text(502, f"Bad gateway: {e}\n")
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._clients.add(writer)
+        client = writer.get_extra_info("peername")
+        writer.transport.set_write_buffer_limits(high=self.stream_buffer)
+
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.idle_timeout)
+                except asyncio.LimitOverrunError:
+                    await self._write_error(writer, 431)
+                    break
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+
+                try:
+                    request = self._parse_request(head, reader, writer, client)
+                except ProxyError:
+                    await self._write_error(writer, 400)
+                    break
+
+                response = await self.handle(request)
+                if response.upgraded is not None:
+                    await self._relay_upgraded(reader, writer, request, response)
+                    break
+                keep_alive = await self._write_response(writer, request, response)
+
+                # An unread request body would desync the connection
+                if not request.body.consumed and request.body.length != 0:
+                    break
+                if not keep_alive:
+                    break
+
+        except (ConnectionError, asyncio.IncompleteReadError, ProxyError):
+            pass
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+    def _parse_request(
+        self,
+        head: bytes,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        client
+    ) -> Request:
+        start_line, headers = parse_head(head[:-4])
+        parts = start_line.split(" ")
+        if len(parts) != 3 or not parts[2].startswith("HTTP/1."):
+            raise ProxyError(f"Malformed request line: {start_line!r}")
+
+        method, target, version = parts
+        body = body_from_headers(headers, reader)
+        if "100-continue" in headers.tokens("expect") and version == "HTTP/1.1" and body.length != 0:
+            # Only invite the upload once something actually reads it, so a
+            # request answered early (429, 503, cache hit) is never sent
+            body = Body(_continue_first(writer, body), body.length, source=body)
+        return Request(method, target, headers, body, version, client)
+
+    async def _write_response(
+        self,
+        writer: asyncio.StreamWriter,
+        request: Request,
+        response: Response
+    ) -> bool:
+        """
+        Send ``response`` to the client.
+
+        Returns:
+            True if the client connection can be reused
+        """
+        keep_alive = request.keep_alive
+        headers = strip_hop_by_hop(response.headers)
+        has_body = response_has_body(request.method, response.status)
+        chunked = False
+
+        if has_body:
+            headers.remove("content-length")
+            if response.body.length is not None:
+                headers.set("Content-Length", str(response.body.length))
+            elif request.version == "HTTP/1.1":
+                headers.set("Transfer-Encoding", "chunked")
+                chunked = True
+            else:
+                keep_alive = False
+
+        headers.set("Connection", "keep-alive" if keep_alive else "close")
+
+        try:
+            writer.write(encode_head(f"HTTP/1.1 {response.status} {response.reason}", headers))
+            if has_body:
+                await write_body(writer, response.body, chunked)
+            else:
+                await writer.drain()
+        except (ProxyError, asyncio.IncompleteReadError):
+            # Origin broke mid-body; the only honest signal left is closing
+            return False
+        finally:
+            await response.aclose()
+
+        return keep_alive and (response.body.consumed or not has_body)
+
+    async def _relay_upgraded(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        request: Request,
+        response: Response
+    ) -> None:
+        """Confirm a protocol switch to the client and relay the stream."""
+        headers = upgrade_headers(response.headers, response.headers.get("upgrade") or request.upgrade)
+        self.streams += 1
+        self.streams_total += 1
+        try:
+            writer.write(encode_head(f"HTTP/1.1 {response.status} {response.reason}", headers))
+            sent, received = await relay((reader, writer), response.upgraded, self.stream_buffer)
+            self.stream_bytes += sent + received
+        finally:
+            self.streams -= 1
+            await response.aclose()
+
+    async def _write_error(self, writer: asyncio.StreamWriter, status: int) -> None:
+        response = Response.text(status, f"{status} {REASONS.get(status, '')}\n")
+        headers = response.headers.copy()
+        headers.set("Content-Length", str(response.body.length))
+        headers.set("Connection", "close")
+        try:
+            writer.write(encode_head(f"HTTP/1.1 {status} {response.reason}", headers))
+            writer.write(await response.body.read())
+            await writer.drain()
+        except ConnectionError:
+            pass
@@ -0,0 +1,180 @@
+"""
+Per-client rate limiting stage for the local proxy.
+
+Every request arrives from cloudflared on localhost, so the origin sees the
+same address for everyone. Cloudflare passes the visitor's address in the
+``CF-Connecting-IP`` header; :class:`RateLimiter` keeps token buckets per
+visitor (and optionally per route) and answers clients that exceed them
+with ``429 Too Many Requests`` before the origin does any work.
+"""
+
+import ipaddress
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .proxy import Headers, Request, Response
+
+
+class RateLimiter:
+    """
+    Token bucket rate limiting stage for :class:`hostify.proxy.ReverseProxy`.
+
+    Each client gets a bucket of ``burst`` tokens that refills at ``rate``
+    tokens per second, and every request takes one token. ``routes`` adds
+    stricter buckets for path prefixes, e.g. ``{"/login": (0.2, 5)}``; a
+    request under such a prefix needs a token from both buckets.
+
+    Buckets are kept in one LRU table of at most ``max_clients`` entries.
+    Buckets idle for ``idle_ttl`` seconds are dropped, so memory stays
+    bounded no matter how many addresses a scraper rotates through.
+    IPv6 clients are grouped by ``ipv6_prefix`` since a single host
+    usually owns a whole /64.
+    """
+
+    def __init__(
+        self,
+        rate: float = 10.0,
+        burst: int = 20,
+        routes: Optional[Dict[str, Tuple[float, int]]] = None,
+        max_clients: int = 100000,
+        idle_ttl: float = 600.0,
+        ipv6_prefix: int = 64,
+        header: str = "CF-Connecting-IP"
+    ):
+        """
+        Initialize rate limiter.
+
+        Args:
+            rate: Requests per second each client may make on average
+            burst: Requests a client may make at once
+            routes: Path prefix -> (rate, burst) for stricter per-route limits
+            max_clients: Most buckets (per client and per client and route)
+                kept in memory
+            idle_ttl: Seconds after which an unused bucket is forgotten
+            ipv6_prefix: Prefix length IPv6 addresses are grouped by
+            header: Request header holding the client address
+        """
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive and burst at least 1")
+        if max_clients < 1:
+            raise ValueError("max_clients must be at least 1")
+
+        self.rate = rate
+        self.burst = burst
+        # Longest prefix first so the most specific route wins
+        self.routes: List[Tuple[str, float, int]] = sorted(
+            ((prefix, float(r), int(b)) for prefix, (r, b) in (routes or {}).items()),
+            key=lambda route: len(route[0]),
+            reverse=True
+        )
+        self.max_clients = max_clients
+        self.idle_ttl = idle_ttl
+        self.ipv6_prefix = ipv6_prefix
+        self.header = header
+
+        # client -> [tokens, last update] for the client-wide bucket and
+        # (client, route prefix) -> [...] for route buckets
+        self._buckets: "OrderedDict[object, List[float]]" = OrderedDict()
+
+        self.allowed = 0
+        self.limited = 0
+        self.evicted = 0
+
+    # -- stage protocol ----------------------------------------------------
+
+    async def handle(self, request: Request, call_next) -> Response:
+        allowed, retry_after = self.allow(self.client_key(request), request.path)
+        if not allowed:
+            headers = Headers([("Retry-After", str(max(1, math.ceil(retry_after))))])
+            return Response.text(429, "Too many requests, slow down\n", headers)
+        return await call_next(request)
+
+    def summary(self) -> str:
+        return (
+            f"Rate limiting: {self.allowed} allowed, {self.limited} limited, "
+            f"{len(self._buckets)} buckets in memory ({self.evicted} evicted)"
+        )
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "buckets": len(self._buckets),
+            "evicted": self.evicted,
+        }
+
+    # -- limiting ----------------------------------------------------------
+
+    def client_key(self, request: Request) -> str:
+        """Address used to tell clients apart."""
+        address = request.headers.get(self.header)
+        if not address:
+            return request.client[0] if request.client else "unknown"
+        address = address.strip()
+        if ":" in address:
+            try:
+                network = ipaddress.IPv6Network(f"{address}/{self.ipv6_prefix}", strict=False)
+                return str(network.network_address)
+            except ValueError:
+                pass
+        return address
+
+    def allow(self, client: str, path: str = "/", now: Optional[float] = None) -> Tuple[bool, float]:
+        """
+        Take a token for one request.
+
+        Args:
+            client: Client key (see ``client_key``)
+            path: Request path, matched against ``routes``
+            now: Current ``time.monotonic()`` value
+
+        Returns:
+            Tuple of (allowed, seconds until the next token)
+        """
+        if now is None:
+            now = time.monotonic()
+        self._expire(now)
+
+        buckets = [self._bucket(client, self.rate, self.burst, now)]
+        for prefix, rate, burst in self.routes:
+            if path.startswith(prefix):
+                buckets.append(self._bucket((client, prefix), rate, burst, now))
+                break
+
+        wait = 0.0
+        for bucket, rate in buckets:
+            if bucket[0] < 1.0:
+                wait = max(wait, (1.0 - bucket[0]) / rate)
+        if wait:
+            self.limited += 1
+            return False, wait
+
+        for bucket, _ in buckets:
+            bucket[0] -= 1.0
+        self.allowed += 1
+        return True, 0.0
+
+    def _bucket(self, key, rate: float, burst: int, now: float):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [float(burst), now]
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+                self.evicted += 1
+        else:
+            bucket[0] = min(float(burst), bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            self._buckets.move_to_end(key)
+        return bucket, rate
+
+    def _expire(self, now: float) -> None:
+        # The table is in last-use order, so idle buckets sit at the front
+        buckets = self._buckets
+        while buckets:
+            key = next(iter(buckets))
+            if now - buckets[key][1] < self.idle_ttl:
+                break
+            del buckets[key]
@@ -0,0 +1,140 @@
+"""
+Byte relay for upgraded connections (WebSocket, h2c and other protocols
+switched to with ``101 Switching Protocols``).
+
+Once both sides have agreed to switch protocols the proxy no longer needs
+to understand the traffic. Instead of a pair of coroutines copying chunks,
+the two sockets' transports are handed to small protocol objects that write
+whatever one side receives straight into the other. That costs one callback
+per socket read, no matter how many messages the read contains, and an idle
+stream costs no task, no coroutine frame and no read buffer.
+"""
+
+import asyncio
+from typing import Optional, Tuple
+
+
+# Default bytes allowed to pile up for a slow receiver before the sender is paused
+STREAM_BUFFER = 256 * 1024
+
+
+class _Pipe(asyncio.Protocol):
+    """Forwards everything one transport receives into its peer."""
+
+    __slots__ = ("relay", "transport", "peer", "bytes", "eof")
+
+    def __init__(self, relay: "_Relay", transport: asyncio.Transport):
+        self.relay = relay
+        self.transport = transport
+        self.peer: Optional["_Pipe"] = None
+        self.bytes = 0
+        self.eof = False
+
+    def data_received(self, data: bytes) -> None:
+        self.bytes += len(data)
+        self.peer.transport.write(data)
+
+    def eof_received(self) -> bool:
+        # Pass the half-close on; the stream ends once both sides are done
+        self.eof = True
+        if self.peer.eof:
+            self.relay.finish()
+        elif self.peer.transport.can_write_eof():
+            self.peer.transport.write_eof()
+        return True
+
+    # This transport's send buffer is over the limit: stop reading from the peer
+    def pause_writing(self) -> None:
+        self.peer.transport.pause_reading()
+
+    def resume_writing(self) -> None:
+        self.peer.transport.resume_reading()
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self.relay.finish()
+
+
+class _Relay:
+    __slots__ = ("client", "upstream", "done")
+
+    def __init__(self, client: asyncio.Transport, upstream: asyncio.Transport):
+        self.done = asyncio.get_running_loop().create_future()
+        self.client = _Pipe(self, client)
+        self.upstream = _Pipe(self, upstream)
+        self.client.peer = self.upstream
+        self.upstream.peer = self.client
+
+    def finish(self) -> None:
+        for pipe in (self.client, self.upstream):
+            pipe.transport.close()
+        if not self.done.done():
+            self.done.set_result(None)
+
+
+def _take_buffered(reader: asyncio.StreamReader) -> Tuple[bytes, bool]:
+    """
+    Empty what ``reader`` already holds.
+
+    The stream reader may have read past the message head (a client sending
+    its first frame without waiting for the 101, or an origin greeting right
+    after it); those bytes have to be relayed before anything else.
+
+    Returns:
+        Tuple of (buffered bytes, whether the peer already closed its side)
+    """
+    # StreamReader has no public way to take its buffer without awaiting
+    data = bytes(reader._buffer)
+    reader._buffer.clear()
+    return data, reader.at_eof()
+
+
+async def relay(
+    client: Tuple[asyncio.StreamReader, asyncio.StreamWriter],
+    upstream: Tuple[asyncio.StreamReader, asyncio.StreamWriter],
+    buffer_size: int = STREAM_BUFFER
+) -> Tuple[int, int]:
+    """
+    Move bytes both ways between two connections until both are done.
+
+    Each transport keeps at most about ``buffer_size`` unsent bytes; past that
+    the other side's transport stops reading until the slow receiver has
+    caught up, so one stalled client cannot make the proxy buffer an
+    origin's entire output (and vice versa).
+
+    Args:
+        client: Reader and writer of the client connection
+        upstream: Reader and writer of the origin connection
+        buffer_size: Largest send buffer per direction, in bytes
+
+    Returns:
+        Tuple of (bytes sent by the client, bytes sent by the origin)
+    """
+    pending = [_take_buffered(client[0]), _take_buffered(upstream[0])]
+    client_transport = client[1].transport
+    upstream_transport = upstream[1].transport
+
+    state = _Relay(client_transport, upstream_transport)
+    for pipe in (state.client, state.upstream):
+        pipe.transport.set_write_buffer_limits(high=buffer_size)
+        pipe.transport.set_protocol(pipe)
+
+    for pipe in (state.client, state.upstream):
+        if pipe.transport.is_closing():
+            state.finish()
+        else:
+            # The stream reader may have paused reading when its buffer
+            # filled; new reads are only delivered on the next loop pass
+            pipe.transport.resume_reading()
+    for pipe, (data, at_eof) in zip((state.client, state.upstream), pending):
+        if state.done.done():
+            break
+        if data:
+            pipe.data_received(data)
+        if at_eof:
+            pipe.eof_received()
+
+    try:
+        await state.done
+    finally:
+        state.finish()
+    return state.client.bytes, state.upstream.bytes
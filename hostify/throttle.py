@@ -0,0 +1,101 @@
+"""
+Client-side pacing for Cloudflare API calls.
+
+Cloudflare allows 1200 API requests per user in any five minutes and
+answers the rest with ``429 Too Many Requests``. :class:`TokenBucket` paces
+calls below that limit; buckets from :func:`shared_bucket` are shared by
+every client of a process that uses the same API token, so concurrent
+threads draw from one budget. :func:`backoff_delay` and
+:func:`retry_after` compute how long to wait before a retry.
+"""
+
+import hashlib
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+
+# Rate and burst that keep any five-minute window within 1200 requests
+# (rate * 300 + burst)
+ACCOUNT_RATE_LIMIT = (3.5, 150)
+
+
+class TokenBucket:
+    """Thread-safe token bucket whose :meth:`acquire` blocks until a token is free."""
+
+    def __init__(self, rate: float, burst: int):
+        """
+        Initialize token bucket.
+
+        Args:
+            rate: Tokens added per second
+            burst: Most tokens held at once
+        """
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive and burst at least 1")
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Take one token, sleeping until one is available.
+
+        Returns:
+            Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds: float) -> None:
+        """Hand out no tokens for ``seconds`` (the API asked us to back off)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+_buckets: Dict[Tuple[str, float, int], TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def shared_bucket(token: str, rate: float, burst: int) -> TokenBucket:
+    """The process-wide bucket for API ``token`` with this rate and burst."""
+    key = (hashlib.sha256(token.encode("utf-8")).hexdigest(), rate, burst)
+    with _buckets_lock:
+        if key not in _buckets:
+            _buckets[key] = TokenBucket(rate, burst)
+        return _buckets[key]
+
+
+def backoff_delay(attempt: int, base: float, cap: float, rng=random) -> float:
+    """Full-jitter exponential backoff for retry number ``attempt`` (0-based)."""
+    return rng.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a ``Retry-After`` header (seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
@@ -0,0 +1,89 @@
+"""
+Timing spans for provisioning and teardown.
+
+:class:`Tracer` records where ``Host.serve()`` and ``Host.cleanup()`` spend
+their time: every startup step, every cleanup phase and every Cloudflare
+API call becomes a span with its start, end, thread and details such as
+the endpoint, response status and retries. A trace exports as Chrome
+trace-event JSON, which chrome://tracing and https://ui.perfetto.dev
+show as a timeline with one row per thread.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+
+class Tracer:
+    """Thread-safe recorder of timed spans."""
+
+    def __init__(self):
+        """Initialize empty tracer; span times count from now."""
+        self.spans: List[Dict] = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, category: str = "host", **args) -> Iterator[Dict]:
+        """
+        Record the ``with`` block as a span.
+
+        Args:
+            name: What the block does (e.g. "tunnel" or "GET /zones")
+            category: Kind of span ("step", "api", "cleanup", ...)
+            **args: Details shown with the span
+
+        Yields:
+            The span's details; the block may add to them (e.g. the status).
+            An exception leaving the block is added as ``error``.
+        """
+        thread = threading.current_thread()
+        span = {
+            "name": name,
+            "category": category,
+            "start": time.perf_counter() - self._origin,
+            "end": None,
+            "thread": thread.ident,
+            "thread_name": thread.name,
+            "args": dict(args),
+        }
+        try:
+            yield span["args"]
+        except BaseException as e:
+            span["args"]["error"] = str(e) or type(e).__name__
+            raise
+        finally:
+            span["end"] = time.perf_counter() - self._origin
+            with self._lock:
+                self.spans.append(span)
+
+    def to_chrome(self) -> Dict:
+        """The spans as a Chrome trace-event document."""
+        pid = os.getpid()
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["start"])
+        events = []
+        threads = {}
+        for span in spans:
+            threads.setdefault(span["thread"], span["thread_name"])
+            events.append({
+                "name": span["name"],
+                "cat": span["category"],
+                "ph": "X",
+                "ts": round(span["start"] * 1e6),
+                "dur": round((span["end"] - span["start"]) * 1e6),
+                "pid": pid,
+                "tid": span["thread"],
+                "args": span["args"],
+            })
+        for tid, thread_name in threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread_name}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, path: str) -> None:
+        """Write the spans to ``path`` as Chrome trace-event JSON."""
+        with open(path, "w") as f:
+            json.dump(self.to_chrome(), f, indent=1, default=str)
@@ -0,0 +1,234 @@
+"""
+Origin warm-up before a site goes public.
+
+A freshly started application is slow for its first requests: code paths
+get imported or JIT-compiled, templates compiled, connection pools opened
+and caches filled. :class:`Warmup` sends those first requests itself, in
+rounds over a list of URLs (or the site's sitemap), until response times
+stop improving. :class:`hostify.Host` runs it before creating the DNS
+record, so real visitors only ever reach a warm origin.
+"""
+
+import asyncio
+import time
+import xml.etree.ElementTree as ElementTree
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from .balancer import Backend
+from .proxy import Headers, ProxyError, Request
+
+
+class Warmup:
+    """
+    Warm-up plan for a local origin.
+
+    Every round requests each URL once from every origin port,
+    ``concurrency`` at a time. Warm-up ends once the median response time
+    of ``stable_rounds`` rounds in a row is within ``tolerance`` of the
+    round before, after ``max_rounds`` rounds, or after ``timeout`` seconds,
+    whichever comes first. Several stable rounds are required because an
+    origin can be equally slow for its first few passes before it speeds
+    up. The per-round latencies are kept in ``rounds``.
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str] = ("/",),
+        sitemap: Optional[str] = None,
+        concurrency: int = 4,
+        stable_rounds: int = 2,
+        max_rounds: int = 10,
+        tolerance: float = 0.1,
+        timeout: float = 60.0,
+        request_timeout: float = 10.0,
+        max_urls: int = 200
+    ):
+        """
+        Initialize warm-up plan.
+
+        Args:
+            urls: Paths to request (e.g. ``["/", "/search?q=x"]``)
+            sitemap: Path of a sitemap on the origin whose URLs are added
+                (e.g. ``"/sitemap.xml"``)
+            concurrency: Requests in flight at once
+            stable_rounds: Consecutive rounds that must match the one before
+            max_rounds: Rounds run at most
+            tolerance: Relative change in median latency between two rounds
+                below which the origin counts as warm
+            timeout: Seconds the whole warm-up may take
+            request_timeout: Seconds a single request may take
+            max_urls: Most URLs requested per round
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        if not 1 <= stable_rounds < max_rounds:
+            raise ValueError("Rounds must satisfy 1 <= stable_rounds < max_rounds")
+
+        self.urls = list(urls)
+        self.sitemap = sitemap
+        self.concurrency = concurrency
+        self.stable_rounds = stable_rounds
+        self.max_rounds = max_rounds
+        self.tolerance = tolerance
+        self.timeout = timeout
+        self.request_timeout = request_timeout
+        self.max_urls = max_urls
+
+        # One entry per round: p50/p95/max latency in ms, requests, errors
+        self.rounds: List[Dict[str, float]] = []
+        self.settled = False
+        self.duration = 0.0
+
+    def run(self, ports: Sequence[int], host: str = "localhost", on_round=None) -> List[Dict[str, float]]:
+        """
+        Warm up the origins on ``ports`` (blocking).
+
+        Args:
+            ports: Local ports of the origin servers
+            host: ``Host`` header to send, normally the public domain
+            on_round: Called with each round's statistics as it completes
+
+        Returns:
+            Per-round statistics
+        """
+        return asyncio.run(self.run_async(ports, host, on_round))
+
+    async def run_async(self, ports: Sequence[int], host: str = "localhost", on_round=None) -> List[Dict[str, float]]:
+        """Coroutine version of :meth:`run`."""
+        backends = [
+            Backend(port, connect_timeout=self.request_timeout, read_timeout=self.request_timeout)
+            for port in ports
+        ]
+        started = time.monotonic()
+        self.rounds = []
+        self.settled = False
+        try:
+            urls = await self._collect_urls(backends[0], host)
+            work = [(backend, url) for url in urls for backend in backends]
+            while len(self.rounds) < self.max_rounds:
+                stats = await self._round(host, work)
+                self.rounds.append(stats)
+                if on_round:
+                    on_round(stats)
+                if self._has_settled() or time.monotonic() - started >= self.timeout:
+                    break
+        finally:
+            for backend in backends:
+                await backend.close()
+            self.duration = time.monotonic() - started
+        return self.rounds
+
+    def summary(self) -> str:
+        if not self.rounds:
+            return "Warm-up: not run"
+        first, last = self.rounds[0], self.rounds[-1]
+        state = "settled" if self.settled else "not settled"
+        return (
+            f"Warm-up: {len(self.rounds)} rounds in {self.duration:.1f}s ({state}), "
+            f"p50 {first['p50_ms']:.1f}ms -> {last['p50_ms']:.1f}ms"
+        )
+
+    # -- helpers -----------------------------------------------------------
+
+    def _has_settled(self) -> bool:
+        window = self.rounds[-(self.stable_rounds + 1):]
+        if len(window) <= self.stable_rounds:
+            return False
+        # A round with failed requests says nothing about warm response
+        # times; one where every request failed even reports a p50 of 0
+        if any(r["errors"] or not r["requests"] for r in window):
+            self.settled = False
+            return False
+        recent = [r["p50_ms"] for r in window]
+        self.settled = all(
+            abs(current - previous) <= self.tolerance * max(previous, 1e-3)
+            for previous, current in zip(recent, recent[1:])
+        )
+        return self.settled
+
+    async def _fetch(self, backend: Backend, host: str, target: str) -> Tuple[int, bytes]:
+        request = Request("GET", target, Headers([("Host", host), ("User-Agent", "hostify-warmup")]))
+
+        async def exchange() -> Tuple[int, bytes]:
+            response = await backend.send(request)
+            try:
+                return response.status, await response.body.read()
+            finally:
+                await response.aclose()
+
+        return await asyncio.wait_for(exchange(), self.request_timeout)
+
+    async def _collect_urls(self, backend: Backend, host: str) -> List[str]:
+        urls = list(self.urls)
+        sitemaps = [self.sitemap] if self.sitemap else []
+        # Follow one level of sitemap index
+        for depth in range(2):
+            nested = []
+            for sitemap in sitemaps:
+                try:
+                    status, body = await self._fetch(backend, host, sitemap)
+                except (ProxyError, OSError, EOFError, asyncio.TimeoutError):
+                    continue
+                if status != 200:
+                    continue
+                for target in _sitemap_locations(body):
+                    if target.endswith(".xml") and depth == 0:
+                        nested.append(target)
+                    else:
+                        urls.append(target)
+            sitemaps = nested
+
+        unique = list(dict.fromkeys(urls))
+        return unique[:self.max_urls]
+
+    async def _round(self, host: str, work: List[Tuple[Backend, str]]) -> Dict[str, float]:
+        latencies: List[float] = []
+        errors = 0
+        queue = list(reversed(work))
+
+        async def worker():
+            nonlocal errors
+            while queue:
+                backend, target = queue.pop()
+                started = time.perf_counter()
+                try:
+                    status, _ = await self._fetch(backend, host, target)
+                except (ProxyError, OSError, EOFError, asyncio.TimeoutError):
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+                if status >= 500:
+                    errors += 1
+
+        await asyncio.gather(*[worker() for _ in range(min(self.concurrency, len(work)))])
+        latencies.sort()
+
+        def pick(q: float) -> float:
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0.0
+
+        return {
+            "round": len(self.rounds) + 1,
+            "requests": len(work),
+            "errors": errors,
+            "p50_ms": pick(0.5),
+            "p95_ms": pick(0.95),
+            "max_ms": pick(1.0),
+        }
+
+
+def _sitemap_locations(data: bytes) -> List[str]:
+    """Paths (with query) of every ``<loc>`` in a sitemap or sitemap index."""
+    try:
+        root = ElementTree.fromstring(data)
+    except ElementTree.ParseError:
+        return []
+    targets = []
+    for element in root.iter():
+        if element.tag.rsplit("}", 1)[-1] == "loc" and element.text:
+            parts = urlsplit(element.text.strip())
+            target = parts.path or "/"
+            if parts.query:
+                target += f"?{parts.query}"
+            targets.append(target)
+    return targets
@@ -0,0 +1,66 @@
+"""
+Longest-suffix lookup of the Cloudflare zone a hostname belongs to.
+
+A hostname's zone can't be derived from the name itself: ``example.co.uk``
+has three labels and ``dev.example.com`` may be a zone of its own,
+delegated from ``example.com``. :class:`ZoneIndex` holds every zone of the
+account in a trie keyed by labels from right to left, so a hostname
+resolves to its most specific zone in one walk down the trie, without an
+API call.
+"""
+
+from typing import Dict, Iterable, Optional, Tuple
+
+
+# Trie key under which a node stores its zone; hostname labels are never empty
+_ZONE = ""
+
+
+class ZoneIndex:
+    """Reversed-label suffix trie of zone names."""
+
+    def __init__(self, zones: Iterable[Dict] = ()):
+        """
+        Initialize zone index.
+
+        Args:
+            zones: Zone dictionaries as returned by the API (``name``, ``id``
+                and optionally ``status``). For a name listed twice an active
+                zone is preferred.
+        """
+        self._root: Dict = {}
+        self.size = 0
+        for zone in sorted(zones, key=lambda zone: zone.get("status") == "active"):
+            self.add(zone["name"], zone["id"])
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, name: str, zone_id: str) -> None:
+        """Add (or replace) zone ``name``."""
+        node = self._root
+        for label in reversed(_labels(name)):
+            node = node.setdefault(label, {})
+        if _ZONE not in node:
+            self.size += 1
+        node[_ZONE] = (name.lower().rstrip("."), zone_id)
+
+    def match(self, hostname: str) -> Optional[Tuple[str, str]]:
+        """
+        Find the most specific zone ``hostname`` belongs to.
+
+        Returns:
+            (zone name, zone ID), or None if no zone is a suffix of ``hostname``
+        """
+        node = self._root
+        found = None
+        for label in reversed(_labels(hostname)):
+            node = node.get(label)
+            if node is None:
+                break
+            found = node.get(_ZONE, found)
+        return found
+
+
+def _labels(name: str):
+    return [label for label in name.lower().rstrip(".").split(".") if label]
@@ -28,6 +28,9 @@ setup(
     install_requires=[
         "requests>=2.28.0",
     ],
+    extras_require={
+        "zstd": ["zstandard>=0.21"],
+    },
     entry_points={
         "console_scripts": [
             "hostify=hostify.cli:main",
@@ -0,0 +1,512 @@
+"""
+Tests for the Cloudflare API client and tunnel provisioning.
+
+The API is replaced by a small in-process HTTP server and cloudflared by a
+script that only answers its readiness check, so the tests need no network
+access and no Cloudflare account.
+"""
+
+import asyncio
+import atexit
+import json
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+from hostify.async_cloudflare import AsyncCloudflare
+from hostify.cloudflare import Cloudflare, CloudflareAPIError
+from hostify.host import Host, HostError
+
+
+class Failure:
+    """What a stand-in API handler returns to make the call fail."""
+
+    def __init__(self, status, code, message="error", headers=None):
+        self.status = status
+        self.error = {"code": code, "message": message}
+        self.headers = headers or {}
+
+
+FAKE_CLOUDFLARED = """#!{python}
+import sys, time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+host, port = sys.argv[sys.argv.index("--metrics") + 1].rsplit(":", 1)
+time.sleep({connect_delay})
+
+class Ready(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200 if self.path == "/ready" else 404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+HTTPServer((host, int(port)), Ready).serve_forever()
+"""
+
+
+def start_api(handler):
+    """
+    Start a stand-in Cloudflare API in a background thread.
+
+    ``handler(method, path, query, body)`` returns the ``result`` of the
+    call, a (result, result_info) tuple for list calls, or a
+    :class:`Failure`; ``query`` is a dict. Returns (server, base_url, stats); ``stats`` counts connections
+    and requests.
+    """
+    stats = {"connections": 0, "requests": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            stats["connections"] += 1
+            super().setup()
+
+        def respond(self):
+            stats["requests"] += 1
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length)) if length else None
+            path, _, query = self.path.partition("?")
+            result = handler(self.command, path, dict(parse_qsl(query)), body)
+            envelope = {"success": True, "errors": []}
+            status, headers = 200, {}
+            if isinstance(result, Failure):
+                status, envelope = result.status, {"success": False, "errors": [result.error]}
+                headers = result.headers
+                result = None
+            elif isinstance(result, tuple):
+                result, envelope["result_info"] = result
+            envelope["result"] = result
+            payload = json.dumps(envelope).encode()
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        do_GET = do_POST = do_PUT = do_DELETE = respond
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/client/v4", stats
+
+
+def test_calls_share_one_keep_alive_connection():
+    seen = []
+
+    def handler(method, path, query, body):
+        seen.append((method, path))
+        if path.endswith("/accounts"):
+            return [{"id": "acc"}]
+        if path.endswith("/cfd_tunnel"):
+            return {"id": "tun"}
+        return {}
+
+    server, base_url, stats = start_api(handler)
+    try:
+        with Cloudflare("token", base_url=base_url, pool_size=2, id_cache=False) as cf:
+            tunnel_id, credentials = cf.create_tunnel("t")
+            cf.configure_tunnel_route(tunnel_id, "app.example.com", "http://localhost:1")
+            cf.delete_tunnel(tunnel_id, force=True)
+        assert tunnel_id == "tun" and credentials["AccountTag"] == "acc"
+        assert seen[0] == ("GET", "/client/v4/accounts")
+        assert stats["requests"] == 5
+        assert stats["connections"] == 1
+    finally:
+        server.shutdown()
+
+
+def test_list_calls_paginate_lazily_and_lookups_filter_server_side():
+    records = [
+        {"id": f"r{i}", "type": "A" if i % 2 else "CNAME", "name": f"host{i}.example.com", "content": "x"}
+        for i in range(250)
+    ]
+    queries = []
+
+    def handler(method, path, query, body):
+        queries.append(query)
+        matches = [
+            r for r in records
+            if r["name"] == query.get("name", r["name"]) and r["type"] == query.get("type", r["type"])
+        ]
+        page, per_page = int(query["page"]), int(query["per_page"])
+        pages = max(1, -(-len(matches) // per_page))
+        return matches[(page - 1) * per_page:page * per_page], {"page": page, "total_pages": pages}
+
+    server, base_url, stats = start_api(handler)
+    try:
+        with Cloudflare("token", base_url=base_url, id_cache=False) as cf:
+            # Pages are only fetched as the iterator is consumed
+            first = next(cf.iter_dns_records("z"))
+            assert first["id"] == "r0" and stats["requests"] == 1
+            assert len(cf.list_dns_records("z")) == 250
+            assert stats["requests"] == 4
+            assert [r["id"] for r in cf.iter_dns_records("z", "A", per_page=50)][:2] == ["r1", "r3"]
+
+            # The last record is past the first page but found in one request
+            before = stats["requests"]
+            found = cf.find_existing_record("z", "host249.example.com")
+            assert found["id"] == "r249" and stats["requests"] == before + 1
+            assert queries[-1]["name"] == "host249.example.com"
+            assert cf.find_existing_record("z", "host249.example.com", record_type="CNAME") is None
+            assert cf.find_existing_record("z", "missing.example.com") is None
+    finally:
+        server.shutdown()
+
+
+def test_account_and_zone_ids_are_cached_on_disk_until_invalid(tmp_path):
+    state = {"zone": "zone-1"}
+    seen = []
+
+    def handler(method, path, query, body):
+        seen.append(path.replace("/client/v4", ""))
+        if path.endswith("/accounts"):
+            return [{"id": "acc"}]
+        if path.endswith("/zones"):
+            return ([{"id": state["zone"], "name": "example.com"}], {"page": 1, "total_pages": 1})
+        if f"/zones/{state['zone']}/" not in path:
+            return Failure(400, 7003, "Could not route, perhaps your object identifier is invalid?")
+        return ([], {"page": 1, "total_pages": 1})
+
+    server, base_url, stats = start_api(handler)
+    options = dict(base_url=base_url, id_cache_path=str(tmp_path / "ids.json"))
+    try:
+        with Cloudflare("token", **options) as cf:
+            assert cf.get_account_id() == "acc"
+            assert cf.get_zone_id("app.example.com") == "zone-1"
+        assert seen == ["/accounts", "/zones"]
+
+        # A later process resolves both without touching the API
+        with Cloudflare("token", **options) as cf:
+            assert cf.get_account_id() == "acc"
+            assert cf.get_zone_id("app.example.com") == "zone-1"
+        assert len(seen) == 2
+        # Other tokens don't share entries
+        with Cloudflare("other-token", **options) as cf:
+            assert cf.get_account_id() == "acc"
+        assert len(seen) == 3
+
+        # The zone is re-created: the stale ID is dropped on the first error
+        state["zone"] = "zone-2"
+        with Cloudflare("token", **options) as cf:
+            zone_id = cf.get_zone_id("app.example.com")
+            try:
+                cf.find_existing_record(zone_id, "app.example.com")
+                raise AssertionError("stale zone ID was accepted")
+            except CloudflareAPIError as e:
+                assert e.status == 400 and e.codes == (7003,)
+        with Cloudflare("token", **options) as cf:
+            assert cf.get_zone_id("app.example.com") == "zone-2"
+            assert cf.find_existing_record("zone-2", "app.example.com") is None
+        assert seen[-2:] == ["/zones", "/zones/zone-2/dns_records"]
+    finally:
+        server.shutdown()
+
+
+def test_zones_resolve_by_longest_suffix_without_extra_calls():
+    zones = [
+        {"id": "com", "name": "example.com", "status": "active"},
+        {"id": "dev", "name": "dev.example.com", "status": "active"},
+        {"id": "uk", "name": "example.co.uk", "status": "active"},
+        {"id": "old", "name": "example.org", "status": "moved"},
+        {"id": "org", "name": "example.org", "status": "active"},
+    ] + [{"id": f"z{i}", "name": f"site{i}.net", "status": "active"} for i in range(120)]
+    pages = []
+
+    def handler(method, path, query, body):
+        page, per_page = int(query["page"]), int(query["per_page"])
+        pages.append(page)
+        return zones[(page - 1) * per_page:page * per_page], {"page": page, "total_pages": -(-len(zones) // per_page)}
+
+    server, base_url, stats = start_api(handler)
+    try:
+        with Cloudflare("token", base_url=base_url, id_cache=False) as cf:
+            assert cf.get_zone_id("app.example.co.uk") == "uk"
+            assert pages == [1, 2, 3]
+            assert cf.get_zone_id("api.dev.example.com") == "dev"
+            assert cf.get_zone_id("dev.example.com") == "dev"
+            assert cf.get_zone_id("www.example.com") == "com"
+            assert cf.get_zone_id("Example.ORG.") == "org"
+            assert all(cf.get_zone_id(f"h{i}.site{i % 120}.net") == f"z{i % 120}" for i in range(1000))
+            assert stats["requests"] == 3
+            try:
+                cf.get_zone_id("example.net")
+                raise AssertionError("matched a zone the account doesn't have")
+            except CloudflareAPIError as e:
+                assert "example.net" in str(e)
+            # A miss lists the zones again once, so zones added later are found
+            assert stats["requests"] == 6
+            zones.append({"id": "net", "name": "example.net", "status": "active"})
+            assert cf.get_zone_id("www.example.net") == "net"
+            assert stats["requests"] == 9
+            assert cf.get_zone_id("example.com") == "com" and stats["requests"] == 9
+    finally:
+        server.shutdown()
+
+
+def test_retries_throttled_and_transient_failures_with_backoff():
+    failures = {}
+    calls = []
+
+    def handler(method, path, query, body):
+        calls.append((method, path))
+        pending = failures.get((method, path))
+        if pending:
+            return pending.pop(0)
+        return {"id": "rec"}
+
+    server, base_url, stats = start_api(handler)
+    options = dict(base_url=base_url, id_cache=False, backoff=0.01, rate_limit=None)
+    try:
+        with Cloudflare("token", **options) as cf:
+            # 429s are retried for any method, after Retry-After
+            record = "/client/v4/zones/z/dns_records"
+            failures[("POST", record)] = [
+                Failure(429, 971, "Please wait and consider throttling your request speed", {"Retry-After": "0.2"}),
+                Failure(429, 971, "Please wait", {"Retry-After": "0"}),
+            ]
+            started = time.monotonic()
+            assert cf.create_dns_record("z", "app.example.com", "t") == "rec"
+            assert time.monotonic() - started >= 0.2
+            assert cf.stats()["retries"] == 2 and cf.stats()["rate_limited"] == 2
+
+            # 5xx is retried for idempotent calls only
+            failures[("DELETE", record + "/r1")] = [Failure(503, 0), Failure(502, 0)]
+            cf.delete_dns_record("z", "r1")
+            failures[("POST", record)] = [Failure(503, 0)]
+            try:
+                cf.create_dns_record("z", "app.example.com", "t")
+                raise AssertionError("non-idempotent call was retried")
+            except CloudflareAPIError as e:
+                assert e.status == 503
+            assert calls.count(("POST", record)) == 4
+
+        # Retries are bounded
+        with Cloudflare("token", max_retries=1, **options) as cf:
+            failures[("DELETE", record + "/r2")] = [Failure(429, 971)] * 3
+            try:
+                cf.delete_dns_record("z", "r2")
+                raise AssertionError("gave up too late")
+            except CloudflareAPIError as e:
+                assert e.status == 429 and e.codes == (971,)
+            assert cf.stats()["retries"] == 1
+    finally:
+        server.shutdown()
+
+
+def test_shared_rate_limiter_paces_clients_of_one_token():
+    server, base_url, stats = start_api(lambda *args: {"id": "x"})
+    options = dict(base_url=base_url, id_cache=False, rate_limit=(50.0, 2))
+    try:
+        first = Cloudflare("paced-token", **options)
+        second = Cloudflare("paced-token", **options)
+        assert first.rate_limiter is second.rate_limiter
+        started = time.monotonic()
+        for cf in (first, second) * 3:
+            cf.delete_dns_record("z", "r")
+        # Two calls from the burst, the other four at 50/s
+        assert time.monotonic() - started >= 0.07
+        assert first.stats()["throttled"] + second.stats()["throttled"] == 4
+        first.close()
+        second.close()
+    finally:
+        server.shutdown()
+
+
+def test_async_client_runs_calls_concurrently_on_shared_connections():
+    records = {}
+    lock = threading.Lock()
+
+    def handler(method, path, query, body):
+        time.sleep(0.1)
+        with lock:
+            if method == "POST":
+                record_id = f"r{len(records)}"
+                records[record_id] = dict(body, id=record_id)
+                return records[record_id]
+            if method == "DELETE":
+                return {"id": records.pop(path.rsplit("/", 1)[-1])["id"]}
+            page, per_page = int(query["page"]), int(query["per_page"])
+            items = sorted(records.values(), key=lambda r: int(r["id"][1:]))
+            return items[(page - 1) * per_page:page * per_page], {"page": page, "total_pages": -(-len(items) // per_page)}
+
+    server, base_url, stats = start_api(handler)
+
+    async def scenario():
+        async with AsyncCloudflare("token", concurrency=8, base_url=base_url, id_cache=False, rate_limit=None) as cf:
+            started = time.monotonic()
+            ids = await asyncio.gather(*[cf.create_dns_record("z", f"h{i}.example.com", "t") for i in range(24)])
+            elapsed = time.monotonic() - started
+            names = [record["name"] async for record in cf.iter_dns_records("z", per_page=10)]
+            await asyncio.gather(*[cf.delete_dns_record("z", record_id) for record_id in ids])
+            return ids, elapsed, names
+
+    try:
+        ids, elapsed, names = asyncio.run(scenario())
+        assert len(set(ids)) == 24
+        # Three waves of eight instead of 24 calls in a row
+        assert 0.3 <= elapsed < 1.5
+        assert sorted(names) == sorted(f"h{i}.example.com" for i in range(24))
+        assert records == {}
+        assert stats["connections"] <= 8
+    finally:
+        server.shutdown()
+
+
+def test_dns_batch_chunks_and_isolates_rejected_records():
+    records = {f"old{i}": {"id": f"old{i}", "name": f"old{i}.example.com", "content": "a"} for i in range(5)}
+    batches = []
+    truncated = []
+    lock = threading.Lock()
+
+    def handler(method, path, query, body):
+        assert path.endswith("/dns_records/batch")
+        batches.append(sum(len(body.get(kind, [])) for kind in ("deletes", "patches", "posts")))
+        with lock:
+            # All or nothing, like the real endpoint
+            if any(not post.get("content") for post in body.get("posts", [])):
+                return Failure(400, 9005, "Content for CNAME record is invalid.")
+            if any(patch["id"] not in records for patch in body.get("patches", [])):
+                return Failure(400, 81044, "Record does not exist.")
+            deleted = [records.pop(d["id"]) for d in body.get("deletes", [])]
+            patched = []
+            for patch in body.get("patches", []):
+                records[patch["id"]].update(patch)
+                patched.append(records[patch["id"]])
+            created = []
+            for post in body.get("posts", []):
+                record = dict(post, id=f"new{len(records)}-{len(created)}-{len(batches)}")
+                records[record["id"]] = record
+                created.append(record)
+        if truncated:
+            return {"posts": created[:1]}
+        return {"deletes": deleted, "patches": patched, "posts": created}
+
+    server, base_url, stats = start_api(handler)
+    creates = [{"type": "CNAME", "name": f"h{i}.example.com", "content": "t.cfargotunnel.com"} for i in range(450)]
+    creates[250]["content"] = ""
+    try:
+        with Cloudflare("token", base_url=base_url, id_cache=False, rate_limit=None) as cf:
+            result = cf.apply_dns_batch(
+                "z",
+                creates=creates,
+                deletes=["old0", {"id": "old1"}],
+                patches=[{"id": "old2", "content": "b"}, {"id": "gone", "content": "b"}],
+            )
+
+            # Changes missing from the response are reported as errors, not as applied
+            truncated.append(True)
+            unconfirmed = cf.apply_dns_batch("z", creates=creates[:2], deletes=["old3"])
+            assert unconfirmed["deleted"] == [None] and unconfirmed["created"][1] is None
+            assert unconfirmed["created"][0]["name"] == "h0.example.com"
+            assert sorted((e["operation"], e["index"]) for e in unconfirmed["errors"]) == [("create", 1), ("delete", 0)]
+            truncated.clear()
+        assert result["deleted"] == ["old0", "old1"]
+        assert result["patched"][0]["content"] == "b" and result["patched"][1] is None
+        assert sum(r is not None for r in result["created"]) == 449 and result["created"][250] is None
+        assert result["created"][0]["name"] == "h0.example.com"
+        failed = sorted((e["operation"], e["index"], e["error"].codes) for e in result["errors"])
+        assert failed == [("create", 250, (9005,)), ("patch", 1, (81044,))]
+        assert len(records) == 2 + 449 + 2
+        # 454 changes in three chunks of at most 200, plus the splits that
+        # isolate the two bad changes
+        assert batches[:1] == [200] and max(batches) == 200
+        assert len(batches) < 3 + 2 * 2 * 8 + 1
+    finally:
+        server.shutdown()
+
+
+def test_host_provisions_independent_steps_concurrently(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    calls = []
+
+    def handler(method, path, query, body):
+        path = path.replace("/client/v4", "")
+        calls.append((method, path))
+        time.sleep(0.1)
+        if path == "/accounts":
+            return [{"id": "acc"}]
+        if path == "/zones":
+            return ([{"id": "zone", "name": "example.com", "status": "active"}], {"page": 1, "total_pages": 1})
+        if path == "/accounts/acc/cfd_tunnel" and method == "POST":
+            return {"id": "tun"}
+        if path == "/zones/zone/dns_records" and method == "GET":
+            return ([], {"page": 1, "total_pages": 1})
+        if path == "/zones/zone/dns_records" and method == "POST":
+            assert body["content"] == "tun.cfargotunnel.com"
+            return {"id": "rec"}
+        return {}
+
+    binary = tmp_path / "cloudflared"
+    binary.write_text(FAKE_CLOUDFLARED.format(python=sys.executable, connect_delay=0.2))
+    binary.chmod(0o755)
+
+    server, base_url, stats = start_api(handler)
+    # The stand-in API doubles as the origin server
+    trace = tmp_path / "trace.json"
+    host = Host(domain="app.example.com", port=server.server_address[1], api_token="token", trace=str(trace))
+    host.cf = Cloudflare("token", base_url=base_url, id_cache=False, rate_limit=None, tracer=host.tracer)
+    host.cloudflared._binary_path = str(binary)
+    try:
+        timings = host._provision()
+        assert host.tunnel_id == "tun" and host.zone_id == "zone" and host.dns_record_id == "rec"
+        assert host.cloudflared.is_running()
+
+        # The zone lookup ran alongside tunnel creation, and the DNS record
+        # waited for both
+        assert timings["zone"][0] < timings["tunnel"][1] and timings["tunnel"][0] < timings["zone"][1]
+        assert timings["dns"][0] >= max(timings["zone"][1], timings["tunnel"][1])
+        assert timings["ready"][0] >= timings["start"][1]
+        # Six API calls of 100ms each, but at most three in any chain
+        assert len([c for c in calls if c[0] != "DELETE"]) == 6
+        assert max(end for start, end in timings.values()) < 0.6 + 0.2 + 0.5
+    finally:
+        host.cleanup()
+        atexit.unregister(host.cleanup)
+        server.shutdown()
+    assert not host.cloudflared.is_running()
+    assert ("DELETE", "/zones/zone/dns_records/rec") in calls
+
+    # A port with nothing listening fails before any API call
+    calls.clear()
+    server, base_url, stats = start_api(handler)
+    with socket.socket() as unused:
+        unused.bind(("127.0.0.1", 0))
+        port = unused.getsockname()[1]
+    host = Host(domain="app.example.com", port=port, api_token="token")
+    atexit.unregister(host.cleanup)
+    host.cf = Cloudflare("token", base_url=base_url, id_cache=False, rate_limit=None)
+    try:
+        host._provision()
+        raise AssertionError("missing origin was not reported")
+    except HostError as e:
+        assert "No server found" in str(e)
+    finally:
+        server.shutdown()
+    assert calls == [] and host.tunnel_id is None
+
+    # Steps, API calls and cleanup phases all end up in the Chrome trace
+    events = [e for e in json.loads(trace.read_text())["traceEvents"] if e["ph"] == "X"]
+    by_category = {}
+    for event in events:
+        by_category.setdefault(event["cat"], []).append(event)
+    assert {e["name"] for e in by_category["step"]} == set(timings)
+    api = {e["name"]: e for e in by_category["api"]}
+    assert api["POST /accounts/acc/cfd_tunnel"]["args"] == {
+        "method": "POST", "endpoint": "/accounts/acc/cfd_tunnel", "retries": 0, "status": 200
+    }
+    assert api["POST /accounts/acc/cfd_tunnel"]["dur"] >= 100000
+    assert "DELETE /zones/zone/dns_records/rec" in api
+    assert {"cloudflared", "dns", "tunnel"} <= {e["name"] for e in by_category["cleanup"]}
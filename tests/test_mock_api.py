@@ -0,0 +1,102 @@
+"""
+Tests for the local Cloudflare API stand-in, and for provisioning and
+cleanup end to end against it.
+"""
+
+import atexit
+import platform
+
+from hostify.cloudflare import Cloudflare, CloudflareAPIError
+from hostify.host import Host
+from hostify.mock_api import MockCloudflareAPI
+
+
+def test_host_provisions_and_cleans_up_against_the_stand_in(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    site = tmp_path / "site"
+    site.mkdir()
+    (site / "index.html").write_text("<h1>hello</h1>")
+
+    with MockCloudflareAPI(zones=["example.com", "dev.example.com"], token="token", latency=0.02) as api:
+        monkeypatch.setenv("CLOUDFLARE_API_BASE_URL", api.base_url)
+        host = Host(domain="app.dev.example.com", path=str(site), api_token="token")
+        host.cloudflared.DOWNLOAD_URLS = {platform.system().lower(): api.cloudflared_url}
+        try:
+            host._provision()
+            assert host.cloudflared.is_running()
+            zone_id = next(z for z, zone in api.zones.items() if zone["name"] == "dev.example.com")
+            assert host.zone_id == zone_id
+            [record] = api.dns_records(zone_id)
+            assert record["name"] == "app.dev.example.com"
+            assert record["content"] == f"{host.tunnel_id}.cfargotunnel.com"
+            [tunnel] = api.active_tunnels()
+            assert tunnel["id"] == host.tunnel_id
+            ingress = api.configurations[host.tunnel_id]["config"]["ingress"]
+            assert ingress[0]["hostname"] == "app.dev.example.com"
+            assert ingress[0]["service"] == f"http://localhost:{host.port}"
+        finally:
+            host.cleanup()
+            atexit.unregister(host.cleanup)
+
+        assert api.dns_records() == [] and api.active_tunnels() == []
+        stats = api.stats()
+        assert stats["endpoints"]["POST /accounts/:id/cfd_tunnel"] == 1
+        assert stats["endpoints"]["DELETE /zones/:id/dns_records/:id"] == 1
+        assert stats["injected_errors"] == 0 and stats["connections"] <= 3
+
+
+def test_injected_errors_and_rate_limits_are_retried():
+    with MockCloudflareAPI(error_rate=0.3, seed=7) as api:
+        with Cloudflare("token", base_url=api.base_url, id_cache=False, rate_limit=None, backoff=0.01) as cf:
+            zone_id = cf.get_zone_id("example.com")
+            for i in range(20):
+                assert cf.find_existing_record(zone_id, f"host{i}.example.com") is None
+            assert cf.retries == api.stats()["injected_errors"] > 0
+
+    with MockCloudflareAPI(rate_limit=(3, 0.5)) as api:
+        with Cloudflare("token", base_url=api.base_url, id_cache=False, rate_limit=None) as cf:
+            for _ in range(5):
+                cf.get_account_id()
+                cf._account_id = None
+            assert cf.rate_limited == api.stats()["rate_limited"] > 0
+
+    with MockCloudflareAPI() as api:
+        api.fail("POST", "/cfd_tunnel$", 400, 1013, "You already have a tunnel with this name")
+        with Cloudflare("token", base_url=api.base_url, id_cache=False, rate_limit=None) as cf:
+            try:
+                cf.create_tunnel("t")
+                raise AssertionError("injected error was not raised")
+            except CloudflareAPIError as e:
+                assert e.status == 400 and e.codes == (1013,)
+            # Only the next matching call fails
+            assert cf.create_tunnel("t")[0] == api.active_tunnels()[0]["id"]
+
+
+def test_dns_records_behave_like_the_real_api():
+    with MockCloudflareAPI() as api:
+        zone_id = next(iter(api.zones))
+        for i in range(250):
+            api.add_dns_record(zone_id, f"host{i}", "t.cfargotunnel.com")
+        with Cloudflare("token", base_url=api.base_url, id_cache=False, rate_limit=None) as cf:
+            assert len(cf.list_dns_records(zone_id)) == 250
+            assert cf.find_existing_record(zone_id, "host249.example.com")["name"] == "host249.example.com"
+
+            # A CNAME can't share its name with another record
+            try:
+                cf.create_dns_record(zone_id, "host1.example.com", "tunnel")
+                raise AssertionError("conflicting record was created")
+            except CloudflareAPIError as e:
+                assert e.codes == (81053,)
+
+            # Batches apply all their changes or none
+            doomed = cf.find_existing_record(zone_id, "host0.example.com")["id"]
+            try:
+                cf._make_request("POST", f"/zones/{zone_id}/dns_records/batch", json={
+                    "deletes": [{"id": doomed}],
+                    "posts": [{"type": "CNAME", "name": "host1.example.com", "content": "x"}],
+                })
+                raise AssertionError("conflicting batch was applied")
+            except CloudflareAPIError as e:
+                assert e.codes == (81053,)
+            assert len(api.dns_records(zone_id)) == 250
+            assert cf.find_existing_record(zone_id, "host1.example.com")["content"] == "t.cfargotunnel.com"
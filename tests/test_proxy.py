@@ -0,0 +1,973 @@
+"""
+Tests for the local reverse proxy and its stages.
+
+Backends are tiny in-process asyncio servers so the tests need no network
+access and no Cloudflare account.
+"""
+
+import asyncio
+
+from hostify.balancer import Backend, BackendPool, LeastConnections, PowerOfTwoChoices, RoundRobin
+from hostify.proxy import Headers, Request, ReverseProxy
+
+
+async def start_origin(handler):
+    """
+    Start an HTTP/1.1 origin that answers every request with ``handler``.
+
+    ``handler(method, target, headers, body)`` returns (status, headers, body).
+    """
+    async def serve(reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                method, target, _ = lines[0].split(" ")
+                headers = dict(
+                    (k.strip().lower(), v.strip())
+                    for k, v in (line.split(":", 1) for line in lines[1:] if line)
+                )
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                result = handler(method, target, headers, body)
+                if asyncio.iscoroutine(result):
+                    result = await result
+                status, extra, payload = result
+                out = [f"HTTP/1.1 {status} X", f"Content-Length: {len(payload)}"]
+                out += [f"{k}: {v}" for k, v in extra.items()]
+                writer.write(("\r\n".join(out) + "\r\n\r\n").encode() + payload)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(serve, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+async def start_truncating_origin():
+    """Start an origin whose chunked bodies end without their CRLF and final chunk."""
+    async def serve(reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n5\r\nhello")
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(serve, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+async def fetch(port, method="GET", target="/", headers=None, body=b""):
+    """Send one request on a fresh connection and return (status, headers, body)."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    lines = [f"{method} {target} HTTP/1.1", "Host: test", f"Content-Length: {len(body)}"]
+    lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ")[1])
+    response_headers = dict(
+        (k.strip().lower(), v.strip())
+        for k, v in (line.split(":", 1) for line in lines[1:] if line)
+    )
+    if "content-length" in response_headers:
+        data = await reader.readexactly(int(response_headers["content-length"]))
+    elif response_headers.get("transfer-encoding") == "chunked":
+        data = b""
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).strip(), 16)
+            chunk = await reader.readexactly(size + 2)
+            if size == 0:
+                break
+            data += chunk[:-2]
+    else:
+        data = b""
+    writer.close()
+    return status, response_headers, data
+
+
+def test_strategies():
+    backends = [Backend(1000 + i) for i in range(3)]
+
+    rr = RoundRobin()
+    assert [rr.select(backends).port for _ in range(6)] == [1000, 1001, 1002] * 2
+
+    backends[0].active, backends[1].active, backends[2].active = 5, 1, 3
+    assert LeastConnections().select(backends).port == 1001
+
+    p2c = PowerOfTwoChoices()
+    picks = {p2c.select(backends).port for _ in range(50)}
+    assert 1000 not in picks  # the busiest backend always loses its pairing
+
+
+def test_balances_and_reuses_connections():
+    async def run():
+        servers, ports = [], []
+        for name in ("a", "b"):
+            server, port = await start_origin(
+                lambda m, t, h, b, name=name: (200, {}, name.encode())
+            )
+            servers.append(server)
+            ports.append(port)
+
+        pool = BackendPool.from_ports(ports, "round_robin")
+        proxy = ReverseProxy(pool)
+        proxy_port = await proxy.start_async()
+
+        bodies = [(await fetch(proxy_port))[2] for _ in range(4)]
+        assert bodies == [b"a", b"b", b"a", b"b"]
+        assert [b.connections_opened for b in pool.backends] == [1, 1]
+
+        status, _, _ = await fetch(proxy_port, "POST", "/echo", body=b"payload")
+        assert status == 200
+
+        await proxy.stop_async()
+        for server in servers:
+            server.close()
+
+    asyncio.run(run())
+
+
+def test_fails_over_and_reports_bad_gateway():
+    async def run():
+        server, port = await start_origin(lambda m, t, h, b: (200, {}, b"up"))
+        dead = Backend(1)  # nothing listens on port 1
+
+        proxy = ReverseProxy(BackendPool([dead, Backend(port)]))
+        proxy_port = await proxy.start_async()
+        assert (await fetch(proxy_port))[2] == b"up"
+
+        only_dead = ReverseProxy(Backend(1))
+        dead_port = await only_dead.start_async()
+        assert (await fetch(dead_port))[0] == 502
+
+        await proxy.stop_async()
+        await only_dead.stop_async()
+        server.close()
+
+    asyncio.run(run())
+
+
+def test_headers_are_case_insensitive():
+    headers = Headers([("Content-Type", "text/html"), ("Vary", "Accept"), ("vary", "Cookie")])
+    assert headers.get("content-type") == "text/html"
+    assert headers.tokens("VARY") == ["accept", "cookie"]
+    headers.set("VARY", "*")
+    assert headers.get_all("vary") == ["*"]
+    assert Request("get", "/a?b=1").query == "b=1"
+
+
+def test_cache_honors_cache_control_and_vary(tmp_path):
+    from hostify.cache import ResponseCache
+
+    async def run():
+        calls = []
+
+        def origin(method, target, headers, body):
+            calls.append(target)
+            if target == "/private":
+                return 200, {"Cache-Control": "no-store"}, b"secret"
+            if target == "/swr":
+                return 200, {"Cache-Control": "max-age=0, stale-while-revalidate=60"}, b"swr"
+            if target == "/etag":
+                if headers.get("if-none-match") == '"v1"':
+                    return 304, {"ETag": '"v1"', "Cache-Control": "max-age=0, must-revalidate"}, b""
+                return 200, {"ETag": '"v1"', "Cache-Control": "max-age=0"}, b"etag"
+            encoding = headers.get("accept-encoding", "none")
+            return 200, {"Cache-Control": "max-age=60", "Vary": "Accept-Encoding"}, encoding.encode()
+
+        server, port = await start_origin(origin)
+        cache = ResponseCache(max_bytes=1024 * 1024)
+        proxy = ReverseProxy(Backend(port), middleware=[cache])
+        proxy_port = await proxy.start_async()
+
+        _, headers, body = await fetch(proxy_port, target="/page")
+        assert headers["x-cache"] == "MISS"
+        _, headers, body = await fetch(proxy_port, target="/page")
+        assert headers["x-cache"] == "HIT" and body == b"none"
+        _, _, body = await fetch(proxy_port, target="/page", headers={"Accept-Encoding": "gzip"})
+        assert body == b"gzip"
+        assert calls.count("/page") == 2
+
+        await fetch(proxy_port, target="/private")
+        await fetch(proxy_port, target="/private")
+        assert calls.count("/private") == 2
+
+        await fetch(proxy_port, target="/swr")
+        _, headers, _ = await fetch(proxy_port, target="/swr")
+        assert headers["x-cache"] == "STALE"
+        await asyncio.sleep(0.05)
+        assert calls.count("/swr") == 2  # background revalidation
+
+        # Revalidation updates the stored headers, and the size with them
+        await fetch(proxy_port, target="/etag")
+        _, headers, body = await fetch(proxy_port, target="/etag")
+        assert (headers["x-cache"], body) == ("REVALIDATED", b"etag")
+        assert cache.size == sum(entry.size for entry in cache._memory.values())
+
+        assert cache.hits == 1 and cache.stale_hits == 1
+        await proxy.stop_async()
+
+        # Entries evicted from a tiny memory tier survive on disk
+        disk_cache = ResponseCache(max_bytes=400, disk=True, disk_dir=str(tmp_path))
+        proxy = ReverseProxy(Backend(port), middleware=[disk_cache])
+        proxy_port = await proxy.start_async()
+        await fetch(proxy_port, target="/a")
+        await fetch(proxy_port, target="/b")
+        await asyncio.sleep(0.1)
+        _, headers, _ = await fetch(proxy_port, target="/a")
+        assert headers["x-cache"] == "HIT"
+        assert calls.count("/a") == 1
+
+        await proxy.stop_async()
+        server.close()
+
+    asyncio.run(run())
+
+
+def test_coalescer_collapses_identical_requests():
+    from hostify.coalesce import RequestCoalescer
+
+    async def run():
+        calls = []
+
+        async def origin(method, target, headers, body):
+            calls.append(target)
+            await asyncio.sleep(0.1)
+            if target == "/cookie":
+                return 200, {"Set-Cookie": "a=b"}, b"mine"
+            return 200, {"Cache-Control": "max-age=5"}, b"shared"
+
+        server, port = await start_origin(origin)
+        coalescer = RequestCoalescer(timeout=5)
+        proxy = ReverseProxy(Backend(port), middleware=[coalescer])
+        proxy_port = await proxy.start_async()
+
+        results = await asyncio.gather(*[fetch(proxy_port, target="/hot") for _ in range(20)])
+        assert {r[2] for r in results} == {b"shared"}
+        assert calls.count("/hot") == 1
+        assert coalescer.collapsed == 19
+
+        results = await asyncio.gather(*[fetch(proxy_port, target="/cookie") for _ in range(3)])
+        assert {r[2] for r in results} == {b"mine"}
+        assert calls.count("/cookie") == 3
+
+        await proxy.stop_async()
+        server.close()
+
+        # A failed shared fetch fails every waiter
+        timeout_coalescer = RequestCoalescer(timeout=0.05)
+        slow, slow_port = await start_origin(origin)
+        proxy = ReverseProxy(Backend(slow_port), middleware=[timeout_coalescer])
+        proxy_port = await proxy.start_async()
+        results = await asyncio.gather(*[fetch(proxy_port, target="/slow") for _ in range(5)])
+        assert {r[0] for r in results} == {504}
+        assert timeout_coalescer.timeouts == 1
+
+        await proxy.stop_async()
+        slow.close()
+
+    asyncio.run(run())
+
+
+def test_switchover_drains_old_backend_without_errors():
+    from hostify.health import wait_until_healthy
+
+    async def run():
+        async def slow_blue(method, target, headers, body):
+            await asyncio.sleep(0.2)
+            return 200, {}, b"blue"
+
+        blue, blue_port = await start_origin(slow_blue)
+        green, green_port = await start_origin(lambda m, t, h, b: (200, {}, b"green"))
+
+        pool = BackendPool.from_ports([blue_port])
+        proxy = ReverseProxy(pool)
+        proxy_port = await proxy.start_async()
+
+        in_flight = [asyncio.ensure_future(fetch(proxy_port)) for _ in range(5)]
+        await asyncio.sleep(0.05)
+
+        new = Backend(green_port)
+        assert await wait_until_healthy(new, timeout=2)
+        assert not await wait_until_healthy(Backend(1), timeout=0.2, interval=0.1)
+
+        drained = await pool.replace([new], drain_timeout=5)
+        assert drained
+        assert [r[2] for r in await asyncio.gather(*in_flight)] == [b"blue"] * 5
+        assert (await fetch(proxy_port))[2] == b"green"
+
+        await proxy.stop_async()
+        blue.close()
+        green.close()
+
+    asyncio.run(run())
+
+
+def test_switch_origin_refuses_an_unhealthy_origin(tmp_path, monkeypatch):
+    import atexit
+
+    from hostify.host import Host, HostError
+
+    monkeypatch.setenv("HOME", str(tmp_path))
+
+    async def run(host):
+        live, live_port = await start_origin(lambda m, t, h, b: (200, {}, b"live"))
+        cut, cut_port = await start_truncating_origin()
+        current = Backend(live_port)
+        host.proxy = ReverseProxy(BackendPool([current]))
+        proxy_port = await host.proxy.start_async()
+
+        try:
+            await host._switch_origin([live_port, cut_port], "/health", drain_timeout=0, ready_timeout=0.3)
+            raise AssertionError("unhealthy origin was switched to")
+        except HostError as e:
+            assert "did not pass its health check" in str(e)
+        # The origin that was serving keeps serving
+        assert host.proxy.upstream.backends == [current]
+        assert (await fetch(proxy_port))[2] == b"live"
+
+        await host.proxy.stop_async()
+        live.close()
+        cut.close()
+
+    host = Host(domain="app.example.com", port=1, api_token="token")
+    atexit.unregister(host.cleanup)
+    asyncio.run(run(host))
+
+
+def test_app_server_serves_wsgi_and_asgi_apps():
+    from hostify.appserver import AppServer, ASGIHandler, WSGIHandler
+
+    def wsgi_app(environ, start_response):
+        data = environ["wsgi.input"].read()
+        start_response("201 Created", [("Content-Type", "text/plain")])
+        return [environ["PATH_INFO"].encode(), b" ", environ["QUERY_STRING"].encode(), b" ", data]
+
+    events = []
+
+    async def asgi_app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                events.append(message["type"])
+                await send({"type": message["type"] + ".complete"})
+                if message["type"] == "lifespan.shutdown":
+                    return
+        data = b""
+        while True:
+            message = await receive()
+            data += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"x-app", b"asgi")]})
+        await send({"type": "http.response.body", "body": scope["path"].encode(), "more_body": True})
+        await send({"type": "http.response.body", "body": b" " + data})
+
+    async def run():
+        proxy = ReverseProxy(WSGIHandler(wsgi_app, threads=2))
+        port = await proxy.start_async()
+        status, headers, body = await fetch(port, "POST", "/a%20b?x=1", body=b"payload")
+        assert (status, body) == (201, b"/a b x=1 payload")
+        assert headers["content-type"] == "text/plain"
+        await proxy.stop_async()
+
+        proxy = ReverseProxy(ASGIHandler(asgi_app))
+        port = await proxy.start_async()
+        assert events == ["lifespan.startup"]
+        status, headers, body = await fetch(port, "POST", "/echo", body=b"hi")
+        assert (status, headers["x-app"], body) == (200, "asgi", b"/echo hi")
+        await proxy.stop_async()
+        assert events == ["lifespan.startup", "lifespan.shutdown"]
+
+        # An app that raises answers 500 rather than dropping the connection
+        def broken_wsgi_app(environ, start_response):
+            raise ValueError("boom")
+
+        async def broken_asgi_app(scope, receive, send):
+            if scope["type"] == "lifespan":
+                raise RuntimeError("no lifespan")
+            raise RuntimeError("boom")
+
+        for handler in (WSGIHandler(broken_wsgi_app, threads=1), ASGIHandler(broken_asgi_app)):
+            proxy = ReverseProxy(handler)
+            port = await proxy.start_async()
+            for _ in range(2):
+                status, _, body = await fetch(port, "GET", "/")
+                assert (status, body) == (500, b"Internal Server Error\n")
+            await proxy.stop_async()
+
+    asyncio.run(run())
+
+    # Forked workers share one listening socket
+    server = AppServer(wsgi_app, workers=2)
+    port = server.start()
+    try:
+        for _ in range(4):
+            status, _, body = asyncio.run(fetch(port, "POST", "/w", body=b"x"))
+            assert (status, body) == (201, b"/w  x")
+        server.processes[0].kill()
+        server.processes[0].join()
+        assert server.ensure_workers() == 1
+    finally:
+        server.stop()
+
+
+def test_compressor_streams_gzip_for_compressible_responses():
+    import gzip
+
+    from hostify.compress import Compressor, parse_accept_encoding
+    from hostify.proxy import Body, Response
+
+    assert parse_accept_encoding("gzip;q=0.5, zstd;q=0, *") == {"gzip": 0.5, "zstd": 0.0, "*": 1.0}
+
+    compressor = Compressor(min_size=100, encodings=["gzip"])
+    assert compressor._negotiate("br, gzip;q=0.8") == "gzip"
+    assert compressor._negotiate("gzip;q=0, identity") is None
+
+    text = b'{"items": [' + b", ".join(b"%d" % i for i in range(5000)) + b"]}"
+
+    def origin(method, target, headers, body):
+        if target == "/small":
+            return 200, {"Content-Type": "application/json"}, b"{}"
+        if target == "/png":
+            return 200, {"Content-Type": "image/png"}, text
+        if target == "/encoded":
+            return 200, {"Content-Type": "text/plain", "Content-Encoding": "br"}, text
+        return 200, {"Content-Type": "application/json; charset=utf-8", "ETag": '"v1"'}, text
+
+    async def streamed(request, call_next):
+        # A body of unknown length, delivered in small chunks
+        async def chunks():
+            for i in range(0, len(text), 1000):
+                yield text[i:i + 1000]
+        if request.path == "/stream":
+            return Response(200, Headers([("Content-Type", "text/html")]), Body(chunks()))
+        return await call_next(request)
+
+    class Streamed:
+        handle = staticmethod(streamed)
+
+    async def run():
+        server, port = await start_origin(origin)
+        proxy = ReverseProxy(Backend(port), middleware=[compressor, Streamed()])
+        proxy_port = await proxy.start_async()
+        accept = {"Accept-Encoding": "gzip"}
+
+        status, headers, body = await fetch(proxy_port, headers=accept)
+        assert headers["content-encoding"] == "gzip"
+        assert headers["vary"] == "Accept-Encoding"
+        assert headers["etag"] == 'W/"v1"'
+        assert gzip.decompress(body) == text
+        assert len(body) < len(text) / 2
+
+        status, headers, body = await fetch(proxy_port, target="/stream", headers=accept)
+        assert headers["content-encoding"] == "gzip"
+        assert gzip.decompress(body) == text
+
+        for target in ("/small", "/png", "/encoded"):
+            status, headers, body = await fetch(proxy_port, target=target, headers=accept)
+            assert headers.get("content-encoding") != "gzip"
+        _, headers, body = await fetch(proxy_port)
+        assert "content-encoding" not in headers and body == text
+
+        assert compressor.compressed == 2
+        assert compressor.bytes_in == 2 * len(text)
+        assert compressor.ratio < 0.5
+
+        await proxy.stop_async()
+        server.close()
+
+    asyncio.run(run())
+
+
+def test_health_checker_ejects_and_restores_backends():
+    from hostify.health import HealthChecker
+
+    state = {"status": 500, "delay": 0.0}
+
+    async def flaky(method, target, headers, body):
+        await asyncio.sleep(state["delay"])
+        return state["status"], {}, b"flaky"
+
+    async def run():
+        good, good_port = await start_origin(lambda m, t, h, b: (200, {}, b"good"))
+        bad, bad_port = await start_origin(flaky)
+        pool = BackendPool.from_ports([good_port, bad_port])
+        changes = []
+        checker = HealthChecker(
+            path="/health",
+            interval=0.02,
+            max_latency=0.1,
+            pool=pool,
+            on_change=lambda backend, healthy: changes.append((backend.port, healthy))
+        )
+        proxy = ReverseProxy(pool)
+        proxy_port = await proxy.start_async()
+        await checker.start()
+
+        await asyncio.sleep(0.2)
+        assert changes == [(bad_port, False)]
+        assert [b.port for b in pool.available()] == [good_port]
+        bodies = {(await fetch(proxy_port))[2] for _ in range(6)}
+        assert bodies == {b"good"}
+
+        state["status"] = 200
+        await asyncio.sleep(0.2)
+        assert changes[-1] == (bad_port, True)
+        assert len(pool.available()) == 2
+
+        # Too slow counts as a failure too
+        state["delay"] = 0.2
+        await asyncio.sleep(0.8)
+        assert changes[-1] == (bad_port, False)
+
+        # New backends from a switch are picked up
+        await pool.replace([Backend(good_port)], drain_timeout=0)
+        probes = checker.probes
+        await asyncio.sleep(0.1)
+        assert checker.probes > probes
+        assert checker.stats()["unhealthy"] == []
+
+        await checker.close()
+        await proxy.stop_async()
+        good.close()
+        bad.close()
+
+        # A body cut off mid-stream is a failed probe
+        cut, cut_port = await start_truncating_origin()
+        pool = BackendPool.from_ports([cut_port])
+        checker = HealthChecker(path="/health", interval=0.02, pool=pool)
+        await checker.start()
+        await asyncio.sleep(0.2)
+        assert checker.probes > 0 and not pool.backends[0].healthy
+        await checker.close()
+        cut.close()
+
+    asyncio.run(run())
+
+    # When everything is unhealthy the pool fails open
+    pool = BackendPool.from_ports([1, 2])
+    for backend in pool.backends:
+        backend.healthy = False
+    assert pool.available() == pool.backends
+
+
+def test_concurrency_limiter_sheds_and_adapts():
+    from hostify.concurrency import ConcurrencyLimiter
+
+    busy = {"n": 0}
+
+    async def single_worker(method, target, headers, body):
+        # Latency grows with the number of requests queued at the origin
+        busy["n"] += 1
+        try:
+            await asyncio.sleep(0.005 * busy["n"])
+        finally:
+            busy["n"] -= 1
+        return 200, {}, b"ok"
+
+    async def run():
+        for algorithm in ("gradient", "aimd"):
+            server, port = await start_origin(single_worker)
+            limiter = ConcurrencyLimiter(algorithm=algorithm, initial_limit=30)
+            proxy = ReverseProxy(Backend(port), middleware=[limiter])
+            proxy_port = await proxy.start_async()
+
+            statuses = []
+            for _ in range(10):
+                results = await asyncio.gather(*[fetch(proxy_port) for _ in range(40)])
+                statuses += [r[0] for r in results]
+
+            assert set(statuses) == {200, 503}
+            assert limiter.shed == statuses.count(503)
+            assert limiter.limit < 30
+            assert limiter.in_flight == 0
+
+            results = await asyncio.gather(*[fetch(proxy_port) for _ in range(40)])
+            shed = [r for r in results if r[0] == 503]
+            assert shed and shed[0][1]["retry-after"] == "1"
+
+            await proxy.stop_async()
+            server.close()
+
+    asyncio.run(run())
+
+
+def test_rate_limiter_token_buckets_per_client_and_route():
+    from hostify.ratelimit import RateLimiter
+
+    limiter = RateLimiter(rate=1, burst=3, routes={"/login": (0.1, 1)}, max_clients=4, idle_ttl=60)
+
+    assert [limiter.allow("1.1.1.1", "/", now=0)[0] for _ in range(4)] == [True, True, True, False]
+    assert limiter.allow("2.2.2.2", "/", now=0)[0]
+    allowed, wait = limiter.allow("1.1.1.1", "/", now=0.5)
+    assert not allowed and 0 < wait <= 0.5
+    assert limiter.allow("1.1.1.1", "/", now=1.5)[0]
+
+    # Route buckets are stricter and shared by everything under the prefix
+    assert limiter.allow("3.3.3.3", "/login", now=0)[0]
+    allowed, wait = limiter.allow("3.3.3.3", "/login/verify", now=1)
+    assert not allowed and abs(wait - 9) < 1e-6
+    assert limiter.allow("3.3.3.3", "/", now=1)[0]
+
+    # The table never grows past max_clients and forgets idle clients
+    for i in range(10):
+        limiter.allow(f"10.0.0.{i}", "/", now=2)
+    assert len(limiter._buckets) == 4
+    limiter.allow("4.4.4.4", "/", now=100)
+    assert len(limiter._buckets) == 1
+
+    def request(ip):
+        return Request("GET", "/", Headers([("CF-Connecting-IP", ip)]), client=("127.0.0.1", 1))
+
+    assert limiter.client_key(request("2001:db8:1:2:aaaa::1")) == limiter.client_key(request("2001:db8:1:2::9"))
+    assert limiter.client_key(Request("GET", "/", Headers(), client=("127.0.0.1", 1))) == "127.0.0.1"
+
+    async def run():
+        server, port = await start_origin(lambda m, t, h, b: (200, {}, b"ok"))
+        proxy = ReverseProxy(Backend(port), middleware=[RateLimiter(rate=0.5, burst=2)])
+        proxy_port = await proxy.start_async()
+
+        visitor = {"CF-Connecting-IP": "203.0.113.7"}
+        statuses = [(await fetch(proxy_port, headers=visitor))[0] for _ in range(3)]
+        assert statuses == [200, 200, 429]
+        status, headers, _ = await fetch(proxy_port, headers=visitor)
+        assert status == 429 and headers["retry-after"] == "2"
+        assert (await fetch(proxy_port, headers={"CF-Connecting-IP": "203.0.113.8"}))[0] == 200
+
+        await proxy.stop_async()
+        server.close()
+
+    asyncio.run(run())
+
+
+def test_hedger_races_slow_backend_against_another():
+    import time
+
+    from hostify.hedge import Hedger
+
+    async def stalled(method, target, headers, body):
+        await asyncio.sleep(0.5)
+        return 200, {}, b"slow"
+
+    async def run():
+        slow, slow_port = await start_origin(stalled)
+        fast, fast_port = await start_origin(lambda m, t, h, b: (200, {}, b"fast"))
+        pool = BackendPool.from_ports([slow_port, fast_port])
+        hedger = Hedger(delay=0.05, max_ratio=1.0)
+        proxy = ReverseProxy(pool, middleware=[hedger])
+        proxy_port = await proxy.start_async()
+
+        started = time.monotonic()
+        results = await asyncio.gather(*[fetch(proxy_port) for _ in range(4)])
+        assert time.monotonic() - started < 0.4
+        assert [r[2] for r in results] == [b"fast"] * 4
+        assert hedger.hedged == 2 and hedger.hedge_wins == 2
+
+        # Losers are cancelled, so nothing stays in flight on the slow backend
+        await asyncio.sleep(0.05)
+        assert [b.active for b in pool.backends] == [0, 0]
+
+        # Non-idempotent requests are never duplicated
+        status, _, body = await fetch(proxy_port, "POST", body=b"x")
+        assert hedger.hedged == 2
+
+        # The budget caps hedge volume
+        capped = Hedger(delay=0.01, max_ratio=0.0)
+        capped._budget = 0.0
+        proxy2 = ReverseProxy(pool, middleware=[capped])
+        port2 = await proxy2.start_async()
+        await asyncio.gather(*[fetch(port2) for _ in range(2)])
+        assert capped.hedged == 0 and capped.over_budget == 1
+
+        # When both copies answer at the same moment the loser is closed too
+        closed = []
+
+        class Answer:
+            async def aclose(self):
+                closed.append(self)
+
+        async def answer():
+            return Answer()
+
+        both = [asyncio.ensure_future(answer()) for _ in range(2)]
+        await asyncio.sleep(0)
+        response, winner = await hedger._race(*both)
+        assert closed == [task.result() for task in both if task is not winner]
+
+        await proxy2.stop_async()
+        await proxy.stop_async()
+        slow.close()
+        fast.close()
+
+    asyncio.run(run())
+
+
+def test_upgraded_connections_are_relayed_both_ways():
+    from hostify.concurrency import ConcurrencyLimiter
+
+    async def echo_origin(reader, writer):
+        # Switch protocols, greet, then echo until the client half-closes
+        head = await reader.readuntil(b"\r\n\r\n")
+        assert b"Upgrade: websocket" in head and b"Connection: Upgrade" in head
+        writer.write(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n\r\nhello")
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+        writer.close()
+
+    async def run():
+        server = await asyncio.start_server(echo_origin, "127.0.0.1", 0)
+        backend = Backend(server.sockets[0].getsockname()[1])
+        limiter = ConcurrencyLimiter(initial_limit=1)
+        proxy = ReverseProxy(backend, middleware=[limiter], stream_buffer=16 * 1024)
+        port = await proxy.start_async()
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        # The first frame goes out without waiting for the 101
+        writer.write(
+            b"GET /ws HTTP/1.1\r\nHost: test\r\nConnection: Upgrade\r\nUpgrade: websocket\r\n\r\nearly"
+        )
+        head = await reader.readuntil(b"\r\n\r\n")
+        assert head.startswith(b"HTTP/1.1 101")
+        assert b"Upgrade: websocket" in head
+        assert await reader.readexactly(10) == b"helloearly"
+        assert proxy.streams == 1 and backend.active == 1
+        # Long-lived streams don't hold a concurrency slot
+        assert limiter.in_flight == 0
+
+        # Much more than the stream buffer, read back slowly
+        payload = bytes(range(256)) * 8192
+        writer.write(payload)
+        received = b""
+        while len(received) < len(payload):
+            received += await reader.read(65536)
+            await asyncio.sleep(0.001)
+        assert received == payload
+
+        writer.write_eof()
+        assert await reader.read() == b""
+        writer.close()
+        for _ in range(100):
+            if proxy.streams == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert proxy.streams == 0 and proxy.streams_total == 1
+        assert proxy.stream_bytes == 2 * len(payload) + 15
+        assert backend.active == 0
+        assert proxy.summary()[-1].startswith("Upgraded streams: 0 open, 1 total")
+
+        await proxy.stop_async()
+        server.close()
+
+    asyncio.run(run())
+
+
+def test_large_upload_streams_in_constant_memory():
+    size = 128 * 1024 * 1024
+    chunk = b"x" * 65536
+
+    def rss_mb():
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+        return 0.0
+
+    async def slow_sink(reader, writer):
+        head = await reader.readuntil(b"\r\n\r\n")
+        assert b"Expect" not in head
+        remaining = int(head.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+        received = 0
+        while remaining:
+            data = await reader.read(min(remaining, 65536))
+            remaining -= len(data)
+            received += len(data)
+            if received % (8 * 1024 * 1024) < len(data):
+                await asyncio.sleep(0.005)
+        body = str(received).encode()
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+        await writer.drain()
+        writer.close()
+
+    async def run():
+        server = await asyncio.start_server(slow_sink, "127.0.0.1", 0)
+        proxy = ReverseProxy(Backend(server.sockets[0].getsockname()[1]))
+        port = await proxy.start_async()
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(
+            b"PUT /upload HTTP/1.1\r\nHost: test\r\nContent-Length: %d\r\n"
+            b"Expect: 100-continue\r\n\r\n" % size
+        )
+        assert await reader.readuntil(b"\r\n\r\n") == b"HTTP/1.1 100 Continue\r\n\r\n"
+
+        baseline = peak = rss_mb()
+        for sent in range(0, size, len(chunk)):
+            writer.write(chunk)
+            await writer.drain()
+            if sent % (4 * 1024 * 1024) == 0:
+                peak = max(peak, rss_mb())
+
+        head = await reader.readuntil(b"\r\n\r\n")
+        assert head.startswith(b"HTTP/1.1 200")
+        assert await reader.readexactly(len(str(size))) == str(size).encode()
+        writer.close()
+        # Client, proxy and origin share this process; none may hold the body
+        assert peak - baseline < 16
+
+        await proxy.stop_async()
+        server.close()
+
+    asyncio.run(run())
+
+
+def test_cache_key_normalizer_canonicalises_urls_and_assets():
+    from hostify.normalize import CacheKeyNormalizer
+
+    seen = []
+
+    def origin(method, target, headers, body):
+        seen.append(target)
+        extra = {"Set-Cookie": "session=abc", "Vary": "Cookie, User-Agent"}
+        if target.startswith("/app.js"):
+            extra["Content-Encoding"] = "gzip"
+        return 200, extra, b"content"
+
+    async def run():
+        server, port = await start_origin(origin)
+        normalizer = CacheKeyNormalizer()
+        proxy = ReverseProxy(Backend(port), middleware=[normalizer])
+        proxy_port = await proxy.start_async()
+
+        status, headers, _ = await fetch(proxy_port, target="/app.js?v=2&utm_source=mail&fbclid=x&a=1&a=0")
+        assert seen[-1] == "/app.js?a=1&a=0&v=2"
+        assert "set-cookie" not in headers and headers["vary"] == "Accept-Encoding"
+
+        # Pages keep their cookies; only the URL is normalised
+        status, headers, _ = await fetch(proxy_port, target="/page?utm_campaign=x")
+        assert seen[-1] == "/page" and headers["set-cookie"] == "session=abc"
+
+        assert normalizer.rewritten == 2 and normalizer.cookies_stripped == 1
+        assert normalizer.stats()["cacheable_ratio_before"] == 0.0
+        assert normalizer.stats()["cacheable_ratio_after"] == 0.5
+        await proxy.stop_async()
+
+        redirect = CacheKeyNormalizer(redirect=True, paths=["/static/"])
+        proxy = ReverseProxy(Backend(port), middleware=[redirect])
+        proxy_port = await proxy.start_async()
+        status, headers, _ = await fetch(proxy_port, target="/static/logo.png?gclid=1&b=2")
+        assert status == 301 and headers["location"] == "/static/logo.png?b=2"
+        await fetch(proxy_port, target="/other?gclid=1")
+        assert seen[-1] == "/other?gclid=1"
+        await proxy.stop_async()
+        server.close()
+
+    asyncio.run(run())
+
+
+def test_warmup_runs_rounds_until_latency_settles():
+    from hostify.warmup import Warmup
+
+    hits = {}
+    index = (
+        b'<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        b"<sitemap><loc>https://app.example.com/pages.xml</loc></sitemap></sitemapindex>"
+    )
+    pages = (
+        b'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        b"<url><loc>https://app.example.com/a</loc></url>"
+        b"<url><loc>https://app.example.com/b?x=1</loc></url></urlset>"
+    )
+
+    async def cold_origin(method, target, headers, body):
+        assert headers["host"] == "app.example.com"
+        if target == "/sitemap.xml":
+            return 200, {}, index
+        if target == "/pages.xml":
+            return 200, {}, pages
+        # Slow on the first two visits of every URL, fast afterwards
+        hits[target] = hits.get(target, 0) + 1
+        await asyncio.sleep(0.05 if hits[target] <= 2 else 0.002)
+        return 200, {}, b"ok"
+
+    async def run():
+        server, port = await start_origin(cold_origin)
+        warmup = Warmup(urls=["/"], sitemap="/sitemap.xml", concurrency=2, tolerance=0.5)
+        rounds = []
+        await warmup.run_async([port], "app.example.com", on_round=rounds.append)
+        server.close()
+
+        assert sorted(hits) == ["/", "/a", "/b?x=1"]
+        assert warmup.settled and rounds == warmup.rounds
+        assert 3 <= len(rounds) <= 5
+        assert rounds[0]["p50_ms"] > 40 and rounds[-1]["p50_ms"] < 40
+        assert all(r["requests"] == 3 and r["errors"] == 0 for r in rounds)
+        assert "settled" in warmup.summary()
+
+    asyncio.run(run())
+
+
+def test_warmup_counts_truncated_responses_as_errors():
+    from hostify.warmup import Warmup
+
+    async def run():
+        server, port = await start_truncating_origin()
+        warmup = Warmup(urls=["/"], sitemap="/sitemap.xml", stable_rounds=1, max_rounds=2)
+        await warmup.run_async([port], "app.example.com")
+        server.close()
+        assert [(r["requests"], r["errors"]) for r in warmup.rounds] == [(1, 1), (1, 1)]
+        assert warmup.settled is False
+
+    asyncio.run(run())
+
+
+def test_metrics_records_route_histograms_and_slow_requests():
+    from hostify.metrics import LatencyHistogram, Metrics
+
+    histogram = LatencyHistogram()
+    for ms in range(1, 1001):
+        histogram.record(ms / 1000)
+    assert abs(histogram.percentile(0.5) - 0.5) < 0.01
+    assert abs(histogram.percentile(0.99) - 0.99) < 0.02
+    assert histogram.max == 1.0 and histogram.count == 1000
+
+    async def origin(method, target, headers, body):
+        if target.startswith("/users/"):
+            await asyncio.sleep(0.05)
+            return 200, {}, b"user"
+        return 404, {}, b"missing"
+
+    async def run():
+        server, port = await start_origin(origin)
+        metrics = Metrics(slow_threshold=0.04, slow_capacity=2)
+        proxy = ReverseProxy(Backend(port), middleware=[metrics])
+        proxy_port = await proxy.start_async()
+
+        for user in (1, 2, 3):
+            await fetch(proxy_port, target=f"/users/{user}/profile?x=1")
+        await fetch(proxy_port, target="/nope")
+
+        snapshot = metrics.snapshot()
+        assert set(snapshot["routes"]) == {"/users/:id", "/nope"}
+        assert snapshot["routes"]["/users/:id"]["count"] == 3
+        assert snapshot["routes"]["/users/:id"]["p50_ms"] >= 45
+        assert snapshot["statuses"] == {"200": 3, "404": 1}
+        # Every fetch opens a new client connection, but upstream ones are pooled
+        assert snapshot["connect"]["count"] == 1 and snapshot["connect"]["reused"] == 3
+
+        assert metrics.slow_requests == 3 and len(snapshot["slow"]) == 2
+        slow = snapshot["slow"][-1]
+        assert slow["target"] == "/users/3/profile?x=1" and slow["status"] == 200
+        assert slow["backend"] == f"127.0.0.1:{port}" and slow["reused"] is True
+        assert slow["total_ms"] >= slow["head_ms"] >= 45
+        assert "over 4 requests" in metrics.summary()
+
+        await proxy.stop_async()
+        server.close()
+
+    asyncio.run(run())